@@ -1,61 +1,147 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Optional
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Optional, Literal
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+from app.services.completion_model import completion_predictor
+from app.services.engagement_rollups import engagement_rollups
+from app.services.learning_events import learning_event_store, to_utc
+from app.services.response_cache import response_cache
+import asyncio
+import json
 
 router = APIRouter()
 
-class PerformanceMetrics(BaseModel):
+# Average lesson quiz scores above/below which a lesson is a strength/weakness
+STRENGTH_SCORE = 0.8
+WEAKNESS_SCORE = 0.6
+
+# Cohort predictions serialized per streamed chunk
+COHORT_STREAM_BATCH = 500
+
+class LearningEvent(BaseModel):
+    type: Literal["lesson_view", "quiz_score", "time_spent"]
     userId: str
+    courseId: str = Field(..., pattern=r"^[\w-]+$")
+    lessonId: Optional[str] = None
+    timestamp: Optional[datetime] = None  # Now if omitted
+    score: Optional[float] = Field(default=None, ge=0.0, le=1.0)  # quiz_score events
+    durationSeconds: float = Field(default=0.0, ge=0.0)
+    completed: bool = False  # lesson_view events: the lesson was completed
+
+class EventBatch(BaseModel):
+    events: List[LearningEvent] = Field(..., max_length=10000)
+
+class PerformanceMetrics(BaseModel):
+    userId: Optional[str] = None
+    courseId: Optional[str] = None
     completionRate: float
     averageScore: float
     timeSpent: int  # minutes
     strengths: List[str]
     weaknesses: List[str]
     recommendations: List[str]
+    lessonsViewed: int = 0
+    lessonsCompleted: int = 0
+    quizzesTaken: int = 0
+    events: int = 0
 
 class AnalyticsRequest(BaseModel):
-    userId: str
+    userId: Optional[str] = None
     courseId: Optional[str] = None
     startDate: Optional[datetime] = None
     endDate: Optional[datetime] = None
+    
+    @model_validator(mode="after")
+    def check_scope(self):
+        if not self.userId and not self.courseId:
+            raise ValueError("userId or courseId is required")
+        return self
+
+@router.post("/events")
+async def ingest_events(batch: EventBatch):
+    """Record learner events (lesson views, quiz scores, time spent)"""
+    # Ingestion and its listeners (engagement rollups) take locks and do CPU work: keep them off the event loop
+    stored = await asyncio.to_thread(learning_event_store.ingest, [event.model_dump() for event in batch.events])
+    return {"success": True, "stored": stored}
+
+@router.get("/events/metrics")
+async def get_event_store_metrics():
+    """Ingestion and partition counters of the learner event store"""
+    return learning_event_store.get_metrics()
 
 @router.post("/performance", response_model=PerformanceMetrics)
 async def get_performance_analytics(request: AnalyticsRequest):
     """
-    Analyze student performance and provide insights.
-    Uses ML models to identify patterns and predict outcomes.
+    Performance of a user and/or course over a date range, aggregated from
+    recorded learner events. Lessons are strengths or weaknesses by their
+    average quiz score.
     """
-    # Mock implementation
-    metrics = PerformanceMetrics(
+    performance = await asyncio.to_thread(
+        learning_event_store.get_performance,
+        request.userId,
+        request.courseId,
+        request.startDate,
+        request.endDate
+    )
+    lesson_scores = sorted(performance["lessonScores"].items(), key=lambda item: item[1], reverse=True)
+    strengths = [lesson for lesson, score in lesson_scores if score >= STRENGTH_SCORE][:3]
+    weaknesses = [lesson for lesson, score in reversed(lesson_scores) if score < WEAKNESS_SCORE][:3]
+    
+    recommendations = [f"Review lesson {lesson}" for lesson in weaknesses]
+    if performance["lessonsViewed"] and performance["completionRate"] < 0.5:
+        recommendations.append("Complete the lessons already started before moving on")
+    if performance["lessonsViewed"] and not performance["quizzesTaken"]:
+        recommendations.append("Take the lesson quizzes to check your understanding")
+    
+    return PerformanceMetrics(
         userId=request.userId,
-        completionRate=0.75,
-        averageScore=0.82,
-        timeSpent=240,
-        strengths=["Problem solving", "Code implementation"],
-        weaknesses=["Theoretical concepts", "Time management"],
-        recommendations=[
-            "Review module 3 concepts",
-            "Practice more coding exercises",
-            "Consider additional study time"
-        ]
+        courseId=request.courseId,
+        completionRate=performance["completionRate"],
+        averageScore=performance["averageScore"],
+        timeSpent=int(performance["timeSpentSeconds"] // 60),
+        strengths=strengths,
+        weaknesses=weaknesses,
+        recommendations=recommendations,
+        lessonsViewed=performance["lessonsViewed"],
+        lessonsCompleted=performance["lessonsCompleted"],
+        quizzesTaken=performance["quizzesTaken"],
+        events=performance["events"]
     )
-    return metrics
 
 class EngagementMetrics(BaseModel):
     activeUsers: int
-    averageSessionDuration: float
+    averageSessionDuration: float  # minutes
     mostPopularCourses: List[str]
-    peakUsageHours: List[int]
+    peakUsageHours: List[int]  # UTC
+    events: int = 0
+    sessions: int = 0
+    granularity: Optional[str] = None  # Rollup buckets read: minute, hour or day
+    buckets: int = 0
 
 @router.get("/engagement", response_model=EngagementMetrics)
-async def get_engagement_analytics():
-    """Get platform-wide engagement analytics."""
-    return EngagementMetrics(
-        activeUsers=1234,
-        averageSessionDuration=45.5,
-        mostPopularCourses=["Python Basics", "Web Development", "Data Science"],
-        peakUsageHours=[9, 14, 19, 21]
+async def get_engagement_analytics(
+    request: Request,
+    startDate: Optional[datetime] = None,
+    endDate: Optional[datetime] = None
+):
+    """
+    Get platform-wide engagement analytics over a window (the last 7 days by
+    default), read from rollups maintained on event ingestion. Responses carry
+    an ETag of their content, re-rendered when the rollups change.
+    """
+    # Default windows end at the current minute, so that they can be cached. Naive dates are UTC.
+    end = to_utc(endDate) if endDate else datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    start = to_utc(startDate) if startDate else end - timedelta(days=7)
+    if start > end:
+        raise HTTPException(status_code=422, detail="startDate must be before endDate")
+    return response_cache.respond(
+        request,
+        key=f"engagement:{start.isoformat()}:{end.isoformat()}",
+        version=engagement_rollups.version,
+        render=lambda: EngagementMetrics(**engagement_rollups.get_engagement(start, end)),
+        max_age=settings.response_cache_analytics_max_age
     )
 
 class PredictionRequest(BaseModel):
@@ -69,9 +155,59 @@ class CompletionPrediction(BaseModel):
 
 @router.post("/predict-completion", response_model=CompletionPrediction)
 async def predict_course_completion(request: PredictionRequest):
-    """Predict likelihood of course completion using ML."""
+    """
+    Predict the likelihood that a learner completes a course, from their
+    recorded activity, with the factors lowering it the most.
+    """
+    if completion_predictor.model is None:
+        raise HTTPException(status_code=503, detail="Completion model not available")
+    predictions = await asyncio.to_thread(completion_predictor.predict, request.courseId, [request.userId])
+    prediction = predictions[0]
     return CompletionPrediction(
-        probability=0.78,
-        estimatedCompletionDate=datetime(2024, 6, 15),
-        riskFactors=["Low recent activity", "Multiple incomplete modules"]
+        probability=prediction["probability"],
+        estimatedCompletionDate=prediction["estimatedCompletionDate"],
+        riskFactors=prediction["riskFactors"]
     )
+
+class CohortPredictionRequest(BaseModel):
+    courseId: Optional[str] = None  # Every learner with recorded events in the course
+    learners: Optional[List[PredictionRequest]] = Field(default=None, max_length=50000)
+    asOf: Optional[datetime] = None  # Now if omitted
+    
+    @model_validator(mode="after")
+    def check_scope(self):
+        if (self.courseId is None) == (self.learners is None):
+            raise ValueError("Exactly one of courseId or learners is required")
+        return self
+
+@router.post("/predict-completion/batch")
+async def predict_cohort_completion(request: CohortPredictionRequest):
+    """
+    Predict completion for a cohort: every learner of a course, or a list of
+    (userId, courseId) pairs. Learners are scored in one model call and
+    streamed as NDJSON lines ordered by risk (lowest completion probability
+    first), then a "done" line with the counts.
+    """
+    if completion_predictor.model is None:
+        raise HTTPException(status_code=503, detail="Completion model not available")
+    if request.courseId is not None:
+        learners: Dict[str, Optional[List[str]]] = {request.courseId: None}
+    else:
+        learners = {}
+        for pair in request.learners:
+            learners.setdefault(pair.courseId, []).append(pair.userId)
+    
+    predictions = await asyncio.to_thread(completion_predictor.predict_cohort, learners, request.asOf)
+    
+    async def ndjson_stream():
+        for start in range(0, len(predictions), COHORT_STREAM_BATCH):
+            lines = []
+            for prediction in predictions[start:start + COHORT_STREAM_BATCH]:
+                estimated = prediction["estimatedCompletionDate"]
+                prediction["estimatedCompletionDate"] = estimated.isoformat() if estimated else None
+                lines.append(json.dumps(prediction, ensure_ascii=False))
+            yield "\n".join(lines) + "\n"
+        at_risk = sum(1 for prediction in predictions if prediction["atRisk"])
+        yield json.dumps({"done": True, "learners": len(predictions), "atRisk": at_risk}) + "\n"
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
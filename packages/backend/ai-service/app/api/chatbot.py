@@ -1,8 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple, Union
 from datetime import datetime
-import re
+from app.models.schemas import ChatSource
+from app.services.faq_matcher import faq_matcher
+from app.services.chatbot_service import chatbot_service, chunk_text
+from app.services.conversation_store import conversation_store
+from app.services.feedback_pipeline import feedback_pipeline
+from app.services.llm_provider import llm_service
+from app.services.response_cache import response_cache
+from app.services.writer_proxy import writer_proxy
+from app.config import settings
+import asyncio
+import json
+import uuid
 
 router = APIRouter()
 
@@ -15,98 +27,169 @@ class ChatRequest(BaseModel):
     userId: str
     courseId: Optional[str] = None
     message: str
-    conversationHistory: Optional[List[ChatMessage]] = []
+    conversationId: Optional[str] = None  # History is loaded server-side when set
+    startConversation: bool = False  # Store this exchange under a new conversationId
+    conversationHistory: Optional[List[ChatMessage]] = []  # Legacy: client-sent history
 
 class ChatResponse(BaseModel):
     message: str
-    sources: Optional[List[str]] = []
+    sources: Optional[List[Union[str, ChatSource]]] = []  # FAQ source names, or course excerpts
     confidence: float
-
-# FAQ Pattern matching (simplified, no RAG/ChromaDB)
-FAQ_PATTERNS = {
-    r'\b(what|qu\'est-ce que)\b.*\b(lms|platform|plateforme)\b': {
-        'answer': "HAR Academy is a Learning Management System (LMS) that offers interactive courses in web development, data science, mobile development, and more.",
-        'confidence': 0.95,
-        'sources': ["About HAR Academy"]
-    },
-    r'\b(how|comment)\b.*\b(enroll|inscription|register)\b': {
-        'answer': "To enroll in a course: 1) Browse the course catalog, 2) Click on a course you're interested in, 3) Click the 'Enroll' button, 4) Complete payment if required.",
-        'confidence': 0.92,
-        'sources': ["Enrollment Guide"]
-    },
-    r'\b(price|cost|prix|tarif)\b': {
-        'answer': "We offer three subscription plans: Basic (€9.99/month), Pro (€19.99/month), and Enterprise (€49.99/month). Individual courses can also be purchased separately.",
-        'confidence': 0.90,
-        'sources': ["Pricing Page"]
-    },
-    r'\b(certificate|certificat)\b': {
-        'answer': "Yes, you receive a certificate of completion after finishing a course with a passing grade. Certificates are verified and can be shared on LinkedIn.",
-        'confidence': 0.88,
-        'sources': ["Certificates FAQ"]
-    },
-    r'\b(refund|remboursement)\b': {
-        'answer': "We offer a 14-day money-back guarantee for all course purchases. If you're not satisfied, you can request a full refund within 14 days.",
-        'confidence': 0.85,
-        'sources': ["Refund Policy"]
-    },
-    r'\b(support|aide|help)\b': {
-        'answer': "You can get support through: 1) Our AI chatbot (this one!), 2) Course discussion forums, 3) Email support at support@har-academy.com, or 4) Live chat during business hours.",
-        'confidence': 0.87,
-        'sources': ["Support Options"]
-    },
-    r'\b(video|lecture|cours)\b.*\b(download|télécharger)\b': {
-        'answer': "Course videos are available for streaming only and cannot be downloaded. This protects instructor intellectual property. You have lifetime access to stream content.",
-        'confidence': 0.82,
-        'sources': ["Course Access FAQ"]
-    },
-}
+    messageId: str  # Identifies this answer in POST /feedback
+    conversationId: Optional[str] = None
 
 def find_best_match(message: str) -> Optional[Dict]:
-    """Find best matching FAQ pattern using regex"""
-    message_lower = message.lower()
-    best_match = None
-    best_score = 0
-    
-    for pattern, response in FAQ_PATTERNS.items():
-        if re.search(pattern, message_lower, re.IGNORECASE):
-            # Simple scoring based on pattern length
-            score = len(pattern) / 100
-            if score > best_score:
-                best_score = score
-                best_match = response
+    """Find best matching FAQ entry using the precompiled matcher"""
+    return faq_matcher.match(message)
+
+async def resolve_conversation(request: ChatRequest) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """
+    Return the conversation ID and recent history for a request.
+    With a conversationId the history comes from the server-side store;
+    otherwise the client-sent history is used, and a new conversation is
+    only started when the client asks for one (stateless requests get None
+    and are not stored).
+    """
+    if request.conversationId:
+        owner = conversation_store.get_owner(request.conversationId)
+        if owner is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        if owner != request.userId:
+            raise HTTPException(status_code=403, detail="Conversation belongs to another user")
+        
+        turns = await asyncio.to_thread(
+            conversation_store.get_recent, request.conversationId, settings.conversation_context_turns
+        )
+        history = [{"role": t["role"], "content": t["content"]} for t in turns]
+        return request.conversationId, history
     
-    return best_match
+    history = [{"role": m.role, "content": m.content} for m in request.conversationHistory or []]
+    conversation_id = conversation_store.new_conversation_id() if request.startConversation else None
+    return conversation_id, history
+
+def is_stateful(request: ChatRequest) -> bool:
+    """True if the request reads or writes a stored conversation"""
+    return bool(request.conversationId or request.startConversation)
 
 @router.post("/ask", response_model=ChatResponse)
-async def ask_question(request: ChatRequest):
+async def ask_question(request: ChatRequest, http_request: Request):
     """
-    FAQ-based chatbot using pattern matching (no RAG/ChromaDB for Phase 1).
-    Matches user questions against predefined patterns.
+    Answer a question. Course questions go through RAG over the course
+    content; others are matched against the FAQ (with a fallback answer).
     """
-    # Try to find matching FAQ
-    match = find_best_match(request.message)
+    if writer_proxy.enabled and is_stateful(request):
+        return await writer_proxy.forward(http_request)
     
-    if match:
-        return ChatResponse(
-            message=match['answer'],
-            sources=match['sources'],
-            confidence=match['confidence']
+    conversation_id, history = await resolve_conversation(request)
+    
+    if request.courseId:
+        result = await chatbot_service.answer_question(
+            request.message,
+            request.courseId,
+            history,
+            conversation_id=conversation_id
         )
+    else:
+        result = faq_answer(request.message, history)
     
-    # Fallback response for unmatched questions
-    fallback_responses = [
-        "I'm not sure I understand your question. Could you rephrase it?",
-        "That's a great question! For specific course content, please refer to the course materials or contact your instructor.",
-        "I don't have information about that yet. Please contact our support team at support@har-academy.com for assistance.",
-    ]
+    # ChatResponse fields, serialized directly without building and re-validating the model
+    response = {
+        "message": result["reply"],
+        "sources": result["sources"],
+        "confidence": result["confidence"],
+        "messageId": new_message_id(),
+        "conversationId": conversation_id
+    }
+    
+    if conversation_id:
+        await asyncio.to_thread(record_turns, conversation_id, request.userId, request.message, response["message"])
+    return ORJSONResponse(response)
+
+def new_message_id() -> str:
+    return uuid.uuid4().hex
+
+def record_turns(conversation_id: str, user_id: str, message: str, reply: str):
+    conversation_store.append(conversation_id, user_id, "user", message)
+    conversation_store.append(conversation_id, user_id, "assistant", reply)
+
+# Fallback responses for unmatched questions
+FALLBACK_RESPONSES = [
+    "I'm not sure I understand your question. Could you rephrase it?",
+    "That's a great question! For specific course content, please refer to the course materials or contact your instructor.",
+    "I don't have information about that yet. Please contact our support team at support@har-academy.com for assistance.",
+]
+
+def get_fallback_response(history: List[Dict[str, str]]) -> str:
+    """Use conversation history to provide context-aware fallback"""
+    return FALLBACK_RESPONSES[len(history) % len(FALLBACK_RESPONSES)]
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def faq_answer(message: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+    """FAQ answer, or a fallback, in the shape of ChatbotService.answer_question"""
+    match = find_best_match(message)
+    if match:
+        return {"reply": match['answer'], "sources": match['sources'], "confidence": match['confidence']}
+    return {"reply": get_fallback_response(history), "sources": [], "confidence": 0.3}
+
+async def faq_answer_events(message: str, history: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+    """FAQ/fallback answer as the same event sequence as ChatbotService.stream_answer"""
+    answer = faq_answer(message, history)
+    reply, sources, confidence = answer["reply"], answer["sources"], answer["confidence"]
+    
+    yield {"event": "sources", "data": {"sources": sources, "confidence": confidence}}
+    for chunk in chunk_text(reply):
+        yield {"event": "delta", "data": {"text": chunk}}
+    yield {"event": "done", "data": {"reply": reply}}
+
+@router.post("/ask/stream")
+async def ask_question_stream(request: ChatRequest, http_request: Request):
+    """
+    Streaming variant of /ask using server-sent events.
+    Sends the retrieved sources first, then the answer in increments.
+    Course questions go through RAG; others through the FAQ matcher.
+    Retrieval and generation stop as soon as the client disconnects.
+    """
+    if writer_proxy.enabled and is_stateful(request):
+        return await writer_proxy.forward(http_request)
+    
+    conversation_id, history = await resolve_conversation(request)
+    if conversation_id:
+        await asyncio.to_thread(conversation_store.append, conversation_id, request.userId, "user", request.message)
     
-    # Use conversation history to provide context-aware fallback
-    fallback = fallback_responses[len(request.conversationHistory or []) % len(fallback_responses)]
+    if request.courseId:
+        events = chatbot_service.stream_answer(
+            request.message,
+            request.courseId,
+            history,
+            conversation_id=conversation_id
+        )
+    else:
+        events = faq_answer_events(request.message, history)
+    
+    async def event_stream():
+        try:
+            async for event in events:
+                if await http_request.is_disconnected():
+                    break
+                if event["event"] == "done":
+                    event["data"]["messageId"] = new_message_id()
+                    if conversation_id:
+                        await asyncio.to_thread(
+                            conversation_store.append, conversation_id, request.userId, "assistant", event["data"]["reply"]
+                        )
+                        event["data"]["conversationId"] = conversation_id
+                yield format_sse(event["event"], event["data"])
+        finally:
+            # Stops the underlying retrieval/generation pipeline
+            await events.aclose()
     
-    return ChatResponse(
-        message=fallback,
-        sources=[],
-        confidence=0.3
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 class FeedbackRequest(BaseModel):
@@ -117,50 +200,115 @@ class FeedbackRequest(BaseModel):
 
 @router.post("/feedback")
 async def submit_feedback(request: FeedbackRequest):
-    """Submit feedback on chatbot responses for continuous improvement."""
+    """
+    Submit feedback on chatbot responses for continuous improvement.
+    Feedback is queued and written in batches; a full queue answers 503.
+    """
+    accepted = feedback_pipeline.submit(
+        message_id=request.messageId,
+        user_id=request.userId,
+        helpful=request.helpful,
+        comment=request.comment
+    )
+    
+    if not accepted:
+        raise HTTPException(
+            status_code=503,
+            detail="Feedback queue is full, please retry later",
+            headers={"Retry-After": "5"}
+        )
+    
     return {
         "success": True,
         "message": "Feedback recorded successfully. Thank you for helping us improve!"
     }
 
+@router.get("/feedback/metrics")
+async def get_feedback_metrics():
+    """Feedback pipeline metrics (queue depth, flushed and dropped counts)."""
+    return feedback_pipeline.get_metrics()
+
+@router.get("/feedback/{message_id}")
+async def get_feedback_stats(message_id: str):
+    """Helpful rate for a chatbot answer."""
+    return feedback_pipeline.get_answer_stats(message_id)
+
 @router.get("/history/{user_id}")
-async def get_conversation_history(user_id: str, limit: int = 20):
-    """Retrieve user's conversation history."""
-    # Mock implementation - in production, store in database
+async def get_conversation_history(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    conversationId: Optional[str] = None
+):
+    """
+    Retrieve user's conversation history.
+    Without conversationId, pages through the user's conversations (most recent first);
+    with it, pages through that conversation's turns (newest first).
+    """
+    if conversationId:
+        if conversation_store.get_owner(conversationId) != user_id:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        page = await asyncio.to_thread(conversation_store.get_turns, conversationId, limit, offset)
+        return {
+            "userId": user_id,
+            "conversationId": conversationId,
+            "turns": page["turns"],
+            "totalCount": page["totalCount"],
+            "limit": limit,
+            "offset": offset
+        }
+    
+    page = await asyncio.to_thread(conversation_store.list_conversations, user_id, limit, offset)
     return {
         "userId": user_id,
-        "conversations": [],
-        "totalCount": 0
+        "conversations": page["conversations"],
+        "totalCount": page["totalCount"],
+        "limit": limit,
+        "offset": offset
     }
 
+@router.get("/llm/stats")
+async def get_llm_stats():
+    """LLM provider usage: requests, tokens, latency and prefix cache hits."""
+    return llm_service.get_stats()
+
+# Topics of GET /faq
+FAQ_CATEGORIES = {
+    "categories": [
+        {
+            "title": "Getting Started",
+            "questions": [
+                "How do I enroll in a course?",
+                "What payment methods are accepted?",
+                "Do I get a certificate?"
+            ]
+        },
+        {
+            "title": "Account & Billing",
+            "questions": [
+                "How do I change my subscription?",
+                "What is the refund policy?",
+                "How do I cancel my subscription?"
+            ]
+        },
+        {
+            "title": "Technical Support",
+            "questions": [
+                "Video not playing?",
+                "Can I download course materials?",
+                "How do I contact support?"
+            ]
+        }
+    ]
+}
+
 @router.get("/faq")
-async def get_common_questions():
-    """Get list of common FAQ topics."""
-    return {
-        "categories": [
-            {
-                "title": "Getting Started",
-                "questions": [
-                    "How do I enroll in a course?",
-                    "What payment methods are accepted?",
-                    "Do I get a certificate?"
-                ]
-            },
-            {
-                "title": "Account & Billing",
-                "questions": [
-                    "How do I change my subscription?",
-                    "What is the refund policy?",
-                    "How do I cancel my subscription?"
-                ]
-            },
-            {
-                "title": "Technical Support",
-                "questions": [
-                    "Video not playing?",
-                    "Can I download course materials?",
-                    "How do I contact support?"
-                ]
-            }
-        ]
-    }
+async def get_common_questions(request: Request):
+    """Get list of common FAQ topics (cached by FAQ corpus version)."""
+    return response_cache.respond(
+        request,
+        key="faq",
+        version=faq_matcher.version,
+        render=lambda: FAQ_CATEGORIES
+    )
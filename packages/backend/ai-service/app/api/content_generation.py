@@ -1,11 +1,43 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+from typing import List, Dict, Any, Optional, Tuple
+from app.models.schemas import DifficultyLevel, QuizGenerationResponse
+from app.services.course_vocabulary import CourseVocabulary
+from app.services.learning_path import learning_path_service
+from app.services.llm_provider import llm_service
+from app.services.quiz_bank import quiz_bank_service
+from app.services.quiz_service import quiz_service
+from app.services.result_cache import result_cache, make_key
+from app.services.summarizer import summarizer
+from app.services.text_stream import decode_chunks
+from app.services.vector_db_service import vector_db_service
+from app.services.vocabulary_index import vocabulary_index
+import anyio
+import asyncio
+import json
 import re
 import random
+import time
+import zlib
 
 router = APIRouter()
 
+def request_body_chunks(request: Request):
+    """
+    The request body as a blocking iterator of byte chunks, for handlers running
+    in the threadpool: each chunk is awaited on the event loop as it is consumed,
+    so the body is never buffered as a whole.
+    """
+    chunks = request.stream().__aiter__()
+    while True:
+        try:
+            yield anyio.from_thread.run(chunks.__anext__)
+        except StopAsyncIteration:
+            return
+
 class QuizQuestion(BaseModel):
     question: str
     options: List[str]
@@ -18,6 +50,11 @@ class QuizGenerationRequest(BaseModel):
     difficulty: str = "medium"
     numQuestions: int = 5
 
+class QuizBankRequest(BaseModel):
+    numQuestions: int = Field(default=5, ge=1, le=20)
+    difficulty: DifficultyLevel = DifficultyLevel.MEDIUM
+    language: str = Field(default="fr", pattern="^(fr|en)$")
+
 class SummaryRequest(BaseModel):
     content: str
     maxLength: int = 200
@@ -25,6 +62,8 @@ class SummaryRequest(BaseModel):
 class SummaryResponse(BaseModel):
     summary: str
     keyPoints: List[str]
+    stats: Dict[str, Any] = {}  # Sentences, graph edges, iterations, summarization time
+    processingTimeMs: float = 0.0
 
 # Pattern-based quiz templates (no LLM)
 QUIZ_TEMPLATES = {
@@ -50,12 +89,69 @@ def extract_keywords(topic: str) -> List[str]:
     words = re.findall(r'\b\w+\b', topic.lower())
     return [w for w in words if w not in common_words and len(w) > 3]
 
+def load_course_content(request: QuizGenerationRequest) -> Tuple[str, Optional[CourseVocabulary]]:
+    """Course content matching the topic (empty if the course has no indexed content) and the course vocabulary"""
+    docs = vector_db_service.search(request.topic, course_id=request.courseId, top_k=5)
+    if not docs:
+        return "", None
+    return "\n".join(doc["content"] for doc in docs), vocabulary_index.get(request.courseId)
+
+async def generate_course_quiz(request: QuizGenerationRequest) -> List[Dict[str, Any]]:
+    """
+    Questions from the course content matching the topic: written by the
+    configured LLM provider when there is one, otherwise cloze questions with
+    distractors drawn from the course vocabulary (empty if the course has no
+    indexed content). Returned as QuizQuestion dicts; the rule-based ones are
+    built from the cached generator output without going through models.
+    """
+    content, vocabulary = await asyncio.to_thread(load_course_content, request)
+    if not content:
+        return []
+    
+    try:
+        difficulty = DifficultyLevel(request.difficulty)
+    except ValueError:
+        difficulty = DifficultyLevel.MEDIUM
+    
+    if llm_service.enabled:
+        generated = [
+            q.model_dump(by_alias=True, mode="json")
+            for q in await quiz_service.generate_quiz_with_llm(
+                content, request.numQuestions, difficulty, "en", vocabulary
+            )
+        ]
+    else:
+        generated = await asyncio.to_thread(
+            quiz_service.generate_quiz_data, content, request.numQuestions, difficulty, "en", vocabulary
+        )
+    
+    questions = []
+    for question in generated:
+        # Correct answer first, then moved to a position that is stable per question
+        options = sorted(question["options"], key=lambda option: not option["isCorrect"])
+        options = [option["text"] for option in options]
+        correct_idx = zlib.crc32(question["text"].encode("utf-8")) % len(options)
+        options = options[len(options) - correct_idx:] + options[:len(options) - correct_idx]
+        questions.append({
+            "question": question["text"],
+            "options": options,
+            "correctAnswer": correct_idx,
+            "explanation": question.get("explanation") or ""
+        })
+    return questions
+
 @router.post("/quiz", response_model=List[QuizQuestion])
 async def generate_quiz(request: QuizGenerationRequest):
     """
-    Generate quiz questions using pattern matching (no GPT-4).
-    Uses predefined templates and topic keywords.
+    Generate quiz questions.
+    Courses with indexed content get questions from the lessons matching the
+    topic (see generate_course_quiz); others fall back to predefined templates
+    and topic keywords.
     """
+    questions = await generate_course_quiz(request)
+    if questions:
+        return ORJSONResponse(questions)
+    
     keywords = extract_keywords(request.topic)
     if not keywords:
         keywords = ["concept", "topic", "subject"]
@@ -79,43 +175,133 @@ async def generate_quiz(request: QuizGenerationRequest):
         options = template[1].copy()
         correct_idx = random.randint(0, len(options) - 1)
         
-        questions.append(
-            QuizQuestion(
-                question=question_text,
-                options=options,
-                correctAnswer=correct_idx,
-                explanation=f"The correct answer explains {keyword} in the context of {request.topic}."
-            )
-        )
+        questions.append({
+            "question": question_text,
+            "options": options,
+            "correctAnswer": correct_idx,
+            "explanation": f"The correct answer explains {keyword} in the context of {request.topic}."
+        })
     
-    return questions
+    return ORJSONResponse(questions)
 
-@router.post("/summary", response_model=SummaryResponse)
-async def generate_summary(request: SummaryRequest):
+@router.post("/quiz-bank/{course_id}")
+async def generate_quiz_bank(course_id: str, request: Optional[QuizBankRequest] = None):
     """
-    Generate a basic summary using text extraction (no LLM).
+    Generate quiz questions for every lesson of a course across a process pool.
+    Streams one NDJSON line per lesson as it completes, then a "done" line once
+    the bank is stored (served by GET /quiz-bank/{course_id}).
     """
-    # Simple summarization: take first sentences
-    sentences = re.split(r'[.!?]+', request.content)
-    sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
+    request = request or QuizBankRequest()
+    # Claimed before any await, so a concurrent request for the course gets the 409
+    token = quiz_bank_service.claim(course_id)
+    if token is None:
+        raise HTTPException(status_code=409, detail="Quiz bank generation already in progress for this course")
     
-    # Take first 2-3 sentences as summary
-    summary_sentences = sentences[:min(3, len(sentences))]
-    summary = '. '.join(summary_sentences) + '.'
+    try:
+        lessons = await quiz_bank_service.load_lessons(course_id)
+        if lessons is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        if not lessons:
+            raise HTTPException(status_code=422, detail="Course has no lesson content")
+    except BaseException:
+        quiz_bank_service.release(course_id, token)
+        raise
     
-    # Extract key points (sentences with keywords)
-    keywords = ['important', 'key', 'main', 'essential', 'crucial', 'fundamental']
-    key_points = []
-    for sentence in sentences[:10]:
-        if any(kw in sentence.lower() for kw in keywords):
-            key_points.append(sentence.strip())
+    async def ndjson_stream():
+        async for item in quiz_bank_service.generate(
+            course_id,
+            lessons,
+            token,
+            num_questions=request.numQuestions,
+            difficulty=request.difficulty,
+            language=request.language
+        ):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
     
-    if not key_points:
-        key_points = sentences[:3]
+    # The generator releases the claim when it ends; the background task covers a stream that never starts
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(quiz_bank_service.release, course_id, token)
+    )
+
+@router.get("/quiz-bank/{course_id}")
+async def get_quiz_bank(course_id: str):
+    """Serve the stored quiz bank of a course"""
+    bank = await asyncio.to_thread(quiz_bank_service.get_bank, course_id)
+    if bank is None:
+        raise HTTPException(status_code=404, detail="No quiz bank generated for this course")
+    return bank
+
+@router.post("/quiz/stream", response_model=QuizGenerationResponse)
+async def generate_quiz_from_upload(
+    request: Request,
+    numQuestions: int = Query(default=5, ge=1, le=20),
+    difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
+    language: str = Query(default="fr", pattern="^(fr|en)$")
+):
+    """
+    Generate cloze questions from raw text content of any size (e.g. a video
+    transcript), sent as the request body, possibly chunked. The content is
+    processed as it arrives, with bounded memory.
+    """
+    questions = await run_in_threadpool(
+        quiz_service.generate_quiz_from_stream,
+        decode_chunks(request_body_chunks(request)),
+        numQuestions,
+        difficulty,
+        language
+    )
+    return QuizGenerationResponse(data={
+        "questions": [q.model_dump(by_alias=True, mode="json") for q in questions]
+    })
+
+@router.get("/cache/stats")
+async def get_result_cache_stats():
+    """Hit/miss counters and size of the generated quiz/summary cache"""
+    return result_cache.get_stats()
+
+@router.post("/summary", response_model=SummaryResponse)
+async def generate_summary(request: SummaryRequest):
+    """
+    Generate an extractive summary with TextRank (no LLM).
+    Results are cached by content hash and maximum length; the response
+    reports the time spent on this request.
+    """
+    started = time.perf_counter()
+    cache_key = make_key("summary", request.content, max_length=request.maxLength, algorithm="textrank")
+    result = result_cache.get(cache_key)
+    if result is None:
+        result = await asyncio.to_thread(summarizer.summarize, request.content, request.maxLength)
+        result_cache.set(cache_key, result)
     
     return SummaryResponse(
-        summary=summary[:request.maxLength],
-        keyPoints=key_points[:3]
+        summary=result["summary"],
+        keyPoints=result["keyPoints"],
+        stats=result["stats"],
+        processingTimeMs=round((time.perf_counter() - started) * 1000, 2)
+    )
+
+@router.post("/summary/stream", response_model=SummaryResponse)
+async def generate_summary_from_upload(
+    request: Request,
+    maxLength: int = Query(default=200, ge=1)
+):
+    """
+    Summarize raw text content of any size sent as the request body, possibly
+    chunked. The content is processed as it arrives, with bounded memory.
+    """
+    started = time.perf_counter()
+    result = await run_in_threadpool(
+        summarizer.summarize_stream,
+        decode_chunks(request_body_chunks(request)),
+        maxLength
+    )
+    return SummaryResponse(
+        summary=result["summary"],
+        keyPoints=result["keyPoints"],
+        stats=result["stats"],
+        processingTimeMs=round((time.perf_counter() - started) * 1000, 2)
     )
 
 class LearningPathRequest(BaseModel):
@@ -127,14 +313,33 @@ class LearningPathResponse(BaseModel):
     path: List[str]
     estimatedDuration: str
     milestones: List[str]
+    courses: List[Dict[str, Any]] = []  # Courses of the path, in order (empty for template paths)
+    totalDuration: float = 0.0  # Hours
 
 @router.post("/learning-path", response_model=LearningPathResponse)
 async def generate_learning_path(request: LearningPathRequest):
     """
-    Generate learning path using predefined templates.
+    Generate a learning path over the course prerequisite graph: the shortest
+    sequence of courses leading to the most advanced course matching the
+    target skill, skipping completed ones. Falls back to predefined templates
+    when no course matches.
     """
+    result = await learning_path_service.get_path(request.userId, request.targetSkill, request.currentLevel)
+    if result is not None:
+        courses = result["courses"]
+        milestones = []
+        for level in dict.fromkeys(course["level"] for course in courses):
+            titles = ", ".join(course["title"] for course in courses if course["level"] == level)
+            milestones.append(f"{level}: complete {titles}")
+        return LearningPathResponse(
+            path=[course["title"] for course in courses],
+            estimatedDuration=f"{result['totalDuration']:g} hours",
+            milestones=milestones,
+            courses=courses,
+            totalDuration=result["totalDuration"]
+        )
+    
     levels = ["beginner", "intermediate", "advanced"]
-    target_skill = request.targetSkill.lower()
     
     path = [
         f"{request.targetSkill} - {level.capitalize()}"
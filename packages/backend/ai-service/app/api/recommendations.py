@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from app.services.response_cache import response_cache, CATALOG
 import re
 
 router = APIRouter()
@@ -68,45 +70,62 @@ async def get_personalized_recommendations(request: RecommendationRequest):
         if course["id"] not in (request.completedCourses or []):
             score = calculate_match_score(request.userInterests, course["tags"])
             if score > 0.6:  # Only recommend if score is decent
-                recommendations.append(
-                    CourseRecommendation(
-                        courseId=course["id"],
-                        title=course["title"],
-                        score=score,
-                        reason=f"Matches your interests: {', '.join(request.userInterests[:2])}"
-                    )
-                )
+                # CourseRecommendation fields, serialized without a model round trip
+                recommendations.append({
+                    "courseId": course["id"],
+                    "title": course["title"],
+                    "score": score,
+                    "reason": f"Matches your interests: {', '.join(request.userInterests[:2])}"
+                })
     
     # Sort by score and limit
-    recommendations.sort(key=lambda x: x.score, reverse=True)
-    return recommendations[:request.limit]
+    recommendations.sort(key=lambda x: x["score"], reverse=True)
+    return ORJSONResponse(recommendations[:request.limit])
 
 @router.get("/trending", response_model=List[CourseRecommendation])
-async def get_trending_courses(limit: int = 10):
-    """Get trending courses (simplified without analytics)."""
-    # Mock trending - in production, based on enrollment metrics
-    trends = [
-        CourseRecommendation(
-            courseId=f"trending_{i}",
-            title=f"Popular Course {i}",
-            score=0.85,
-            reason="High enrollment this week"
-        )
-        for i in range(1, min(limit + 1, 11))
-    ]
-    return trends
+async def get_trending_courses(request: Request, limit: int = 10):
+    """Get trending courses (simplified without analytics). Cached by catalog version."""
+    def render():
+        # Mock trending - in production, based on enrollment metrics
+        return [
+            {
+                "courseId": f"trending_{i}",
+                "title": f"Popular Course {i}",
+                "score": 0.85,
+                "reason": "High enrollment this week"
+            }
+            for i in range(1, min(limit + 1, 11))
+        ]
+    
+    return response_cache.respond(
+        request,
+        key=f"trending:{limit}",
+        version=response_cache.version(CATALOG),
+        render=render
+    )
 
+@router.get("/similar/{course_id}", response_model=List[CourseRecommendation])
 @router.post("/similar/{course_id}", response_model=List[CourseRecommendation])
-async def get_similar_courses(course_id: str, limit: int = 5):
-    """Get courses similar to the specified course (pattern-based)."""
-    # Mock similar courses
-    similar = [
-        CourseRecommendation(
-            courseId=f"similar_{i}",
-            title=f"Related Course {i}",
-            score=0.80,
-            reason="Similar content and level"
-        )
-        for i in range(1, min(limit + 1, 6))
-    ]
-    return similar
+async def get_similar_courses(request: Request, course_id: str, limit: int = 5):
+    """
+    Get courses similar to the specified course (pattern-based). Cached by
+    catalog version; use GET for conditional requests (If-None-Match).
+    """
+    def render():
+        # Mock similar courses
+        return [
+            {
+                "courseId": f"similar_{i}",
+                "title": f"Related Course {i}",
+                "score": 0.80,
+                "reason": "Similar content and level"
+            }
+            for i in range(1, min(limit + 1, 6))
+        ]
+    
+    return response_cache.respond(
+        request,
+        key=f"similar:{course_id}:{limit}",
+        version=response_cache.version(CATALOG),
+        render=render
+    )
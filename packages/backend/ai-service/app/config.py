@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Dict
 
 class Settings(BaseSettings):
     # App
@@ -15,15 +15,126 @@ class Settings(BaseSettings):
     # Vector DB
     vector_db_path: str = "./data/chromadb"
     vector_db_collection: str = "har_academy_courses"
+    vector_db_read_only: bool = False  # Set by the launcher for its workers: no live collection, searches use the shared snapshot
+    vector_snapshot_path: str = ""  # Serve searches from a memory-mapped snapshot at startup
     
     # LLM (Optional)
     openai_api_key: str = ""
     anthropic_api_key: str = ""
-    llm_provider: str = "none"
+    llm_provider: str = "none"  # none, local, openai, anthropic
+    llm_model: str = ""  # Provider default when empty
+    llm_timeout: float = 30.0
+    llm_max_tokens: int = 512
+    llm_max_concurrency: int = 8  # Across all providers
+    llm_provider_max_concurrency: int = 4  # Per provider
+    llm_batch_window_ms: int = 10  # Micro-batching window (providers that support batching)
+    llm_max_batch_size: int = 8
+    llm_prefix_cache_size: int = 256
     
-    # Rate Limiting
-    rate_limit_requests: int = 100
-    rate_limit_window: int = 60
+    # Chatbot topic gate
+    topic_gate_enabled: bool = True
+    topic_gate_threshold: float = 0.2  # Minimum cosine similarity with a course centroid
+    topic_gate_clusters: int = 4  # K-means centroids per course (in addition to the mean)
+    topic_gate_course_thresholds: str = ""  # Per-course overrides: "courseId:0.3,otherId:0.15"
+    
+    # Chatbot answer assembly
+    chatbot_answer_max_chars: int = 600  # Budget for extracted sentences
+    chatbot_answer_max_sentences: int = 5
+    
+    # Chatbot semantic answer cache
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.92  # Cosine similarity required for a cache hit
+    semantic_cache_max_entries: int = 256  # Per course
+    semantic_cache_max_courses: int = 100
+    semantic_cache_ttl: int = 3600  # Seconds
+    
+    # Chatbot follow-up context (per conversation)
+    followup_context_enabled: bool = True
+    followup_context_threshold: float = 0.5  # Cosine similarity below which a follow-up goes back to the index
+    followup_context_pool_size: int = 8  # Chunks kept per conversation for re-ranking
+    followup_context_ttl: int = 600  # Seconds
+    followup_context_max_conversations: int = 5000
+    
+    # Chatbot FAQ
+    faq_corpus_path: str = ""  # JSON corpus, hot-reloaded when it changes (built-in FAQ if empty)
+    faq_reload_interval: float = 5.0  # Seconds between corpus file checks
+    
+    # Chatbot conversation history
+    conversation_log_path: str = "./data/conversations.log"
+    conversation_max_turns_in_memory: int = 50  # Ring buffer size per conversation
+    conversation_max_in_memory: int = 1000  # Conversations with a ring buffer held in memory
+    conversation_max_stored: int = 100000  # Conversations indexed; the least recently updated are forgotten beyond this
+    conversation_retained_turns: int = 500  # Turns kept per conversation when the log is compacted
+    conversation_compact_threshold_mb: int = 64
+    conversation_context_turns: int = 10  # Turns passed to the chatbot as context
+    
+    # Chatbot feedback ingestion
+    feedback_store_path: str = "./data/feedback"  # Directory of Parquet part files
+    feedback_queue_size: int = 10000
+    feedback_batch_size: int = 500
+    feedback_flush_interval: float = 5.0  # Seconds
+    feedback_compact_interval: float = 3600.0  # Seconds between merges of each past day's parts (0 disables)
+    feedback_max_tracked_answers: int = 100000  # Answers with an in-memory helpful rate; the least recently rated are evicted
+    
+    # Learner events (columnar store partitioned by course and day)
+    learning_events_path: str = "./data/learning_events"  # Parquet parts: course=<id>/day=<date>/
+    learning_events_hot_days: int = 7  # Older partitions are spilled to Parquet
+    learning_events_spill_interval: float = 60.0  # Seconds
+    engagement_snapshot_path: str = "./data/engagement_rollups.npz"  # Rollups saved on shutdown (disabled if empty)
+    engagement_session_gap: int = 1800  # Seconds of inactivity ending a session
+    engagement_max_future_skew: int = 300  # Seconds; events timestamped further ahead are not rolled up
+    
+    # Course completion prediction (model trained offline, see app/services/completion_model.py)
+    completion_model_path: str = "./data/models/completion_model.npz"
+    
+    # Generated quiz/summary result cache (keyed by content hash + parameters)
+    result_cache_enabled: bool = True
+    result_cache_max_entries: int = 1024
+    result_cache_max_mb: int = 64
+    result_cache_disk_path: str = ""  # Optional disk tier surviving restarts (disabled if empty)
+    result_cache_disk_max_mb: int = 512
+    
+    # HTTP caching of read-mostly endpoints (ETag / Cache-Control, serialized bodies kept in process)
+    response_cache_max_entries: int = 512
+    response_cache_max_age: int = 300  # Seconds browsers and the api-gateway may reuse a response
+    response_cache_analytics_max_age: int = 60
+    
+    # Extractive summaries (TextRank): sentences linked at most this many positions apart
+    summary_similarity_window: int = 40
+    
+    # Learning paths (course prerequisite graph, rebuilt from the catalog)
+    learning_path_refresh_interval: int = 600  # Seconds
+    learning_path_catalog_limit: int = 1000
+    
+    # Quiz distractor vocabularies
+    vocabulary_max_courses: int = 200
+    
+    # Quiz bank generation
+    quiz_bank_path: str = "./data/quiz_banks"  # One JSON file per course
+    quiz_bank_workers: int = 0  # Process pool size (CPU count if 0)
+    quiz_bank_lessons_per_task: int = 4  # Lessons per work unit sent to a worker
+    quiz_bank_max_in_memory: int = 64  # Stored banks kept in memory (LRU), others are read from disk
+    
+    # Rate Limiting (token bucket per user ID, API key or client IP). Buckets are per process:
+    # with N workers a client spread over them may get up to N times these limits
+    rate_limit_enabled: bool = True
+    rate_limit_requests: int = 100  # Bucket capacity (burst)
+    rate_limit_window: int = 60  # Seconds to refill an empty bucket
+    rate_limit_route_costs: str = (  # Tokens per request by path prefix (1 otherwise, 0 exempts): "prefix:cost,..."
+        "/api/v1/content/quiz-bank:20,/api/v1/content/quiz:5,/api/v1/content/summary:5,"
+        "/api/v1/content/learning-path:2,/api/v1/chatbot/ask:3,/api/v1/analytics/predict-completion/batch:10,"
+        "/health:0"
+    )
+    rate_limit_trusted_proxies: str = ""  # Addresses/networks (e.g. the api-gateway) whose identity headers are trusted
+    
+    # Multi-worker deployment (python -m app.launcher): read-mostly data built once, memory-mapped by workers
+    shared_data_path: str = ""  # Set by the launcher for its workers (disabled if empty)
+    shared_data_poll_interval: float = 5.0  # Seconds between worker checks for a new version
+    shared_data_refresh_interval: int = 600  # Seconds between rebuilds by the launcher (0 disables)
+    shared_data_keep_versions: int = 2  # Versions kept on disk (the current one included)
+    launcher_workers: int = 0  # Worker processes (CPU count if 0)
+    writer_url: str = ""  # Single-process instance owning write-side state; launcher workers forward its endpoints there
+    writer_timeout: float = 30.0  # Seconds
     
     # Recommendations
     recommendation_min_score: float = 0.5
@@ -36,6 +147,33 @@ class Settings(BaseSettings):
     def cors_origins_list(self) -> List[str]:
         return [origin.strip() for origin in self.cors_origins.split(",")]
     
+    @property
+    def topic_gate_course_thresholds_map(self) -> Dict[str, float]:
+        thresholds = {}
+        for item in self.topic_gate_course_thresholds.split(","):
+            if ":" in item:
+                course_id, threshold = item.rsplit(":", 1)
+                thresholds[course_id.strip()] = float(threshold)
+        return thresholds
+    
+    @property
+    def read_only_worker(self) -> bool:
+        """Launcher worker: write-side services are not started, their endpoints are forwarded to writer_url"""
+        return self.vector_db_read_only
+    
+    @property
+    def rate_limit_trusted_proxies_list(self) -> List[str]:
+        return [proxy.strip() for proxy in self.rate_limit_trusted_proxies.split(",") if proxy.strip()]
+    
+    @property
+    def rate_limit_route_costs_map(self) -> Dict[str, float]:
+        costs = {}
+        for item in self.rate_limit_route_costs.split(","):
+            if ":" in item:
+                prefix, cost = item.rsplit(":", 1)
+                costs[prefix.strip()] = float(cost)
+        return costs
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -0,0 +1,171 @@
+"""
+Production launcher: serves the app with several worker processes sharing
+the read-mostly data (vector index, course catalog, completion model).
+
+Only the read-mostly data is shared. Write-side state (learner events,
+engagement rollups, conversations, chatbot feedback, quiz banks) belongs to a
+single-process instance with its own data directory, the writer, whose URL is
+given with --writer-url (WRITER_URL). Workers do not start the services owning
+that state: they forward the endpoints served by it to the writer (see
+app/services/writer_proxy.py), and answer them with a 503 when no writer is
+configured. Rate limits remain per process.
+
+The data is built once, by the launcher, into the shared data path (see
+app/services/shared_data.py) before the workers start, then rebuilt every
+`shared_data_refresh_interval` seconds; workers memory-map it and pick up new
+versions on their own. A rebuild only publishes a version when the vectors,
+catalog or model changed. `build` publishes a new version on demand, e.g.
+after retraining the completion model.
+
+The launcher is the single writer of the vector DB: every build first
+re-ingests the published courses whose content is new or changed, then
+exports the collection if that changed it. Workers
+run read-only (VECTOR_DB_READ_ONLY): they never open the persistent
+collection and search the published snapshot only. `build` opens the
+collection itself, so it must not run while a `serve` launcher uses the same
+vector DB.
+
+Usage:
+    python -m app.launcher serve --workers 4 --port 8001 --writer-url http://ai-writer:8001
+    python -m app.launcher build
+"""
+from typing import List, Dict, Any, Optional
+from app.config import settings
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARED_DATA_PATH = "./data/shared"
+
+
+async def sync_courses(courses: List[Dict[str, Any]]) -> int:
+    """
+    Ingest the published courses whose content is new or changed (unchanged
+    documents are not embedded again); returns how many courses changed
+    """
+    from app.services.vector_db_service import vector_db_service
+
+    changed = 0
+    for course in courses:
+        course_id = str(course.get("_id") or course.get("id") or "")
+        if course_id:
+            changed += await vector_db_service.ingest_course(course_id)
+    if changed:
+        logger.info(f"Ingested {changed} new or changed courses into the vector DB")
+    return changed
+
+
+def publish(path: str, force: bool = False) -> Dict[str, Any]:
+    """
+    Fetch the catalog, ingest the new and changed courses into the vector DB,
+    and publish both as a new shared data version if anything changed
+    """
+    from app.services.backend_client import backend_client
+    from app.services.shared_data import build_version
+
+    async def sync() -> List[Dict[str, Any]]:
+        courses = await backend_client.get_courses(status="published", limit=settings.learning_path_catalog_limit)
+        if courses:
+            await sync_courses(courses)
+        return courses
+
+    courses = asyncio.run(sync())
+    return build_version(
+        path,
+        courses,
+        model_path=settings.completion_model_path,
+        keep_versions=settings.shared_data_keep_versions,
+        force=force
+    )
+
+
+def _refresh_loop(path: str, interval: float, stop: threading.Event):
+    while not stop.wait(interval):
+        try:
+            publish(path)
+        except Exception as e:
+            logger.error(f"Failed to rebuild shared data in {path}: {e}")
+
+
+def serve(path: str, workers: int, host: str, port: int, refresh_interval: float, writer_url: str = ""):
+    path = os.path.abspath(path)
+    try:
+        publish(path)
+    except Exception as e:
+        # Workers then attach to the last published version, if any
+        logger.error(f"Failed to build shared data in {path}: {e}")
+
+    # Spawned workers read it from the environment; a single worker runs in this process
+    from app.services.shared_data import shared_data
+    os.environ["SHARED_DATA_PATH"] = path
+    shared_data.path = path
+    if workers > 1:
+        # This process stays the only writer of the vector DB; write-side endpoints go to the writer instance
+        os.environ["VECTOR_DB_READ_ONLY"] = "true"
+        os.environ["WRITER_URL"] = writer_url
+        if not writer_url:
+            logger.warning(
+                f"Starting {workers} workers without --writer-url: "
+                "endpoints served by write-side state will answer 503 (see app/launcher.py)"
+            )
+
+    stop = threading.Event()
+    if refresh_interval > 0:
+        threading.Thread(
+            target=_refresh_loop, args=(path, refresh_interval, stop), name="shared-data-builder", daemon=True
+        ).start()
+    try:
+        uvicorn.run("app.main:app", host=host, port=port, workers=workers, log_level=settings.log_level)
+    finally:
+        stop.set()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the service with workers sharing read-mostly data")
+    parser.add_argument(
+        "--path", default=settings.shared_data_path or DEFAULT_SHARED_DATA_PATH, help="Shared data directory"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Build the shared data and start the workers")
+    serve_parser.add_argument("--workers", type=int, default=settings.launcher_workers or os.cpu_count() or 1)
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=settings.ai_service_port)
+    serve_parser.add_argument(
+        "--refresh-interval", type=float, default=settings.shared_data_refresh_interval,
+        help="Seconds between rebuilds (0 disables)"
+    )
+    serve_parser.add_argument(
+        "--writer-url", default=settings.writer_url,
+        help="Single-process instance the workers forward write-side endpoints to"
+    )
+
+    build_parser = subparsers.add_parser("build", help="Publish a new shared data version (picked up by running workers)")
+    build_parser.add_argument("--force", action="store_true", help="Publish even if nothing changed")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        try:
+            manifest = publish(args.path, force=args.force)
+        except Exception as e:
+            logger.error(f"Failed to build shared data in {args.path}: {e}")
+            return 1
+        print(json.dumps(manifest, indent=2))
+        return 0
+
+    serve(args.path, args.workers, args.host, args.port, args.refresh_interval, args.writer_url)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic_settings import BaseSettings
 import uvicorn
 
@@ -16,9 +17,28 @@ settings = Settings()
 app = FastAPI(
     title=settings.app_name,
     description="AI-powered features for HAR Academy: recommendations, content generation, RAG chatbot",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Rate limiting (added before CORS so that 429 responses carry CORS headers)
+from app.config import settings as service_settings
+from app.services.rate_limiter import RateLimitMiddleware, rate_limiter
+
+if service_settings.rate_limit_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=rate_limiter,
+        route_costs=service_settings.rate_limit_route_costs_map,
+        trusted_proxies=service_settings.rate_limit_trusted_proxies_list
+    )
+
+# Launcher workers forward the endpoints served by write-side state to the single writer
+from app.services.writer_proxy import WriterForwardMiddleware, writer_proxy
+
+if writer_proxy.enabled:
+    app.add_middleware(WriterForwardMiddleware, proxy=writer_proxy)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +56,36 @@ app.include_router(content_generation.router, prefix="/api/v1/content", tags=["c
 app.include_router(chatbot.router, prefix="/api/v1/chatbot", tags=["chatbot"])
 app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytics"])
 
+from app.services.feedback_pipeline import feedback_pipeline
+from app.services.learning_events import learning_event_store
+from app.services.engagement_rollups import engagement_rollups
+from app.services.completion_model import completion_predictor
+from app.services.quiz_bank import quiz_bank_service
+from app.services.shared_data import shared_data
+from app.services.conversation_store import conversation_store
+
+@app.on_event("startup")
+def start_background_workers():
+    # Launcher workers leave write-side state to the writer (see app/services/writer_proxy.py)
+    if not writer_proxy.enabled:
+        feedback_pipeline.start()
+        learning_event_store.start()
+        engagement_rollups.load()
+        conversation_store.start()
+    completion_predictor.load()
+    shared_data.start()  # Multi-worker deployments only (see app/launcher.py)
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    shared_data.stop()
+    if not writer_proxy.enabled:
+        feedback_pipeline.stop()
+        learning_event_store.stop()
+        engagement_rollups.save()
+        conversation_store.close()
+    quiz_bank_service.shutdown()
+    await writer_proxy.close()
+
 @app.get("/health")
 def health_check():
     return {
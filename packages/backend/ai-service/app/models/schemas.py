@@ -7,6 +7,7 @@ from enum import Enum
 
 class DifficultyLevel(str, Enum):
     BEGINNER = "beginner"
+    MEDIUM = "medium"
     INTERMEDIATE = "intermediate"
     ADVANCED = "advanced"
 
@@ -0,0 +1,109 @@
+from typing import List, Dict, Any
+from app.config import settings
+from sklearn.feature_extraction.text import TfidfVectorizer, ENGLISH_STOP_WORDS
+import numpy as np
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+[.!?]*")
+
+FRENCH_STOP_WORDS = {
+    "le", "la", "les", "un", "une", "des", "du", "de", "et", "ou", "en", "dans", "sur",
+    "pour", "par", "avec", "est", "sont", "que", "qui", "quoi", "ce", "cette", "ces",
+    "il", "elle", "ils", "elles", "on", "nous", "vous", "je", "tu", "au", "aux", "ne",
+    "pas", "plus", "se", "sa", "son", "ses", "leur", "leurs", "comment", "pourquoi", "qu"
+}
+
+STOP_WORDS = sorted(ENGLISH_STOP_WORDS | FRENCH_STOP_WORDS)
+
+
+class AnswerAssembler:
+    """
+    Extractive answer assembly.
+    Splits retrieved chunks into sentences, scores every sentence against the
+    question in one TF-IDF cosine pass, and keeps the best ones within a
+    character budget. Each kept sentence remembers which chunk it came from.
+    """
+
+    def __init__(
+        self,
+        max_chars: int = 600,
+        max_sentences: int = 5,
+        min_sentence_chars: int = 20,
+        min_relative_score: float = 0.3
+    ):
+        self.max_chars = max_chars
+        self.max_sentences = max_sentences
+        self.min_sentence_chars = min_sentence_chars
+        # Sentences scoring below this fraction of the best sentence are not kept
+        self.min_relative_score = min_relative_score
+
+    def split_sentences(self, text: str) -> List[str]:
+        sentences = (m.group(0).strip() for m in SENTENCE_PATTERN.finditer(text))
+        return [s for s in sentences if len(s) >= self.min_sentence_chars]
+
+    def assemble(self, question: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Select the sentences that best answer the question.
+
+        Returns sentences in reading order (by chunk rank, then position), each as
+        {"text": ..., "doc_index": ..., "score": ...}.
+        """
+        candidates = []
+        for doc_index, doc in enumerate(docs):
+            for position, sentence in enumerate(self.split_sentences(doc["content"])):
+                candidates.append({"text": sentence, "doc_index": doc_index, "position": position})
+
+        if not candidates:
+            # Chunks made only of very short fragments: keep the top chunk as is
+            return [{"text": docs[0]["content"][:self.max_chars], "doc_index": 0, "score": 0.0}] if docs else []
+
+        texts = [c["text"] for c in candidates]
+        try:
+            matrix = TfidfVectorizer(sublinear_tf=True, stop_words=STOP_WORDS).fit_transform(texts + [question])
+            # Rows are L2-normalized, so the dot product is the cosine similarity
+            scores = (matrix[:-1] @ matrix[-1].T).toarray().ravel()
+        except ValueError:
+            # Empty vocabulary (e.g. only stop-words or punctuation)
+            scores = np.zeros(len(candidates))
+
+        if not scores.any():
+            # No lexical overlap: fall back to the leading sentences of the best chunk
+            order = range(len(candidates))
+        else:
+            # Best score first; earlier chunks and positions break ties
+            order = np.lexsort((
+                [c["position"] for c in candidates],
+                [c["doc_index"] for c in candidates],
+                -scores
+            ))
+
+        min_score = scores.max() * self.min_relative_score
+        selected = []
+        used_chars = 0
+        for i in order:
+            if scores.any() and (scores[i] <= 0 or scores[i] < min_score):
+                break
+            length = len(texts[i]) + (1 if selected else 0)
+            if used_chars + length > self.max_chars:
+                if selected:
+                    continue
+                # Always answer with at least one (truncated) sentence
+                selected.append(dict(candidates[i], text=texts[i][:self.max_chars], score=float(scores[i])))
+                break
+            selected.append(dict(candidates[i], score=float(scores[i])))
+            used_chars += length
+            if len(selected) >= self.max_sentences:
+                break
+
+        selected.sort(key=lambda c: (c["doc_index"], c["position"]))
+        return [{"text": c["text"], "doc_index": c["doc_index"], "score": c["score"]} for c in selected]
+
+
+# Singleton instance
+answer_assembler = AnswerAssembler(
+    max_chars=settings.chatbot_answer_max_chars,
+    max_sentences=settings.chatbot_answer_max_sentences
+)
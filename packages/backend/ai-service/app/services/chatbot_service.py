@@ -1,82 +1,353 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from app.services.vector_db_service import vector_db_service
-from app.models.schemas import ChatSource
+from app.services.semantic_cache import semantic_answer_cache
+from app.services.answer_assembler import answer_assembler
+from app.services.topic_gate import topic_gate
+from app.services.followup_context import followup_context_cache
+from app.services.llm_provider import llm_service
+from app.config import settings
+import numpy as np
+import asyncio
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_REPLY = "Je n'ai pas trouvé d'informations pertinentes dans le contenu du cours pour répondre à cette question."
+OFF_TOPIC_REPLY = "Cette question ne semble pas liée au contenu du cours. Essayez de la reformuler en lien avec le cours."
+SYSTEM_PROMPT = (
+    "Tu es l'assistant pédagogique de HAR Academy. Réponds à la question de l'apprenant "
+    "uniquement à partir des extraits du cours fournis, de façon concise, dans la langue de la question. "
+    "Si les extraits ne permettent pas de répondre, dis-le."
+)
+ERROR_REPLY = "Désolé, une erreur s'est produite lors du traitement de votre question."
+RETRIEVAL_TOP_K = 3
+
+def chunk_text(text: str, words_per_chunk: int = 8) -> List[str]:
+    """Split text into chunks of a few words; the chunks concatenate back to the original text"""
+    tokens = re.findall(r"\S+\s*", text)
+    return [
+        "".join(tokens[i:i + words_per_chunk])
+        for i in range(0, len(tokens), words_per_chunk)
+    ] or [text]
+
 class ChatbotService:
     """
     RAG-based chatbot service that answers questions using course content.
-    Uses ChromaDB for retrieval and simple template-based responses.
+    Uses ChromaDB for retrieval, and the configured LLM provider (or extractive
+    template-based responses when none is configured) for generation.
     """
     
-    def answer_question(
+    async def answer_question(
         self,
         message: str,
         course_id: str,
-        conversation_history: List[Dict[str, str]] = None
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Answer a question using RAG (Retrieval-Augmented Generation).
         
         Steps:
-        1. Retrieve relevant context from vector DB
-        2. Generate answer based on context
-        3. Return answer with sources
+        1. Reuse the conversation's last retrieved chunks for a follow-up; otherwise
+           reject off-topic questions and return a cached answer if a near-identical
+           question was already asked
+        2. Retrieve relevant context from vector DB
+        3. Extract the sentences that best answer the question
+        4. Return answer with sources
         """
         try:
-            # Retrieve relevant content
-            relevant_docs = vector_db_service.search(
-                query=message,
-                course_id=course_id,
-                top_k=3
+            # Embedding and retrieval are blocking, keep them off the event loop
+            # Answers conditioned on the caller's history are theirs alone: keep them out of the shared cache
+            shareable = not self._history_in_prompt(conversation_history)
+            query_embedding, early_result, followup = await asyncio.to_thread(
+                self._precheck, message, course_id, conversation_id, shareable
             )
+            if early_result:
+                return early_result
+            
+            if followup:
+                relevant_docs, assemble_question = followup["docs"], followup["question"]
+            else:
+                relevant_docs = await asyncio.to_thread(
+                    self._retrieve, message, course_id, query_embedding, conversation_id
+                )
+                assemble_question = message
             
             if not relevant_docs:
                 return {
-                    "reply": "Je n'ai pas trouvé d'informations pertinentes dans le contenu du cours pour répondre à cette question.",
+                    "reply": NO_CONTEXT_REPLY,
                     "sources": [],
                     "confidence": 0.0
                 }
             
-            # Extract context
-            context_parts = []
-            sources = []
+            sentences = answer_assembler.assemble(assemble_question, relevant_docs)
+            answer = await self._complete_answer(message, relevant_docs, sentences, conversation_history)
             
-            for doc in relevant_docs:
-                context_parts.append(doc["content"])
-                metadata = doc.get("metadata", {})
-                
-                sources.append(
-                    ChatSource(
-                        lessonId=metadata.get("lesson_id", "unknown"),
-                        lessonTitle=metadata.get("title", "Unknown"),
-                        excerpt=doc["content"][:150] + "..."
-                    )
-                )
-            
-            # Generate answer (simple template-based approach)
-            answer = self._generate_answer(message, context_parts)
-            
-            # Calculate confidence based on relevance
-            avg_distance = sum(doc.get("distance", 1.0) for doc in relevant_docs) / len(relevant_docs)
-            confidence = max(0.0, 1.0 - avg_distance)
-            
-            return {
+            result = {
                 "reply": answer,
-                "sources": [s.dict(by_alias=True) for s in sources],
-                "confidence": round(confidence, 2)
+                "sources": self._build_sources(relevant_docs, sentences),
+                "confidence": self._confidence(relevant_docs)
             }
             
+            # Follow-up answers depend on the conversation, so they are not shared
+            if query_embedding is not None and not followup and shareable:
+                semantic_answer_cache.store(course_id, message, query_embedding, result)
+            
+            return result
+            
         except Exception as e:
             logger.error(f"Error answering question: {e}")
             return {
-                "reply": "Désolé, une erreur s'est produite lors du traitement de votre question.",
+                "reply": ERROR_REPLY,
                 "sources": [],
                 "confidence": 0.0
             }
     
+    async def stream_answer(
+        self,
+        message: str,
+        course_id: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of answer_question.
+        
+        Yields events in order:
+        - {"event": "sources", "data": {"sources": [...], "confidence": ...}}
+        - {"event": "delta", "data": {"text": ...}} (one per answer increment)
+        - {"event": "done", "data": {"reply": ...}}
+        
+        Closing the generator (e.g. on client disconnect) stops retrieval and
+        generation at the next step.
+        """
+        try:
+            # Embedding and retrieval are blocking, keep them off the event loop
+            # Answers conditioned on the caller's history are theirs alone: keep them out of the shared cache
+            shareable = not self._history_in_prompt(conversation_history)
+            query_embedding, cached, followup = await asyncio.to_thread(
+                self._precheck, message, course_id, conversation_id, shareable
+            )
+            
+            if cached:
+                yield {"event": "sources", "data": {"sources": cached["sources"], "confidence": cached["confidence"]}}
+                for chunk in chunk_text(cached["reply"]):
+                    yield {"event": "delta", "data": {"text": chunk}}
+                yield {"event": "done", "data": {"reply": cached["reply"]}}
+                return
+            
+            if followup:
+                relevant_docs, assemble_question = followup["docs"], followup["question"]
+            else:
+                relevant_docs = await asyncio.to_thread(
+                    self._retrieve, message, course_id, query_embedding, conversation_id
+                )
+                assemble_question = message
+            
+            if not relevant_docs:
+                yield {"event": "sources", "data": {"sources": [], "confidence": 0.0}}
+                yield {"event": "delta", "data": {"text": NO_CONTEXT_REPLY}}
+                yield {"event": "done", "data": {"reply": NO_CONTEXT_REPLY}}
+                return
+            
+            sentences = answer_assembler.assemble(assemble_question, relevant_docs)
+            sources = self._build_sources(relevant_docs, sentences)
+            confidence = self._confidence(relevant_docs)
+            yield {"event": "sources", "data": {"sources": sources, "confidence": confidence}}
+            
+            reply_parts = []
+            async for chunk in self._stream_answer_text(message, relevant_docs, sentences, conversation_history):
+                reply_parts.append(chunk)
+                yield {"event": "delta", "data": {"text": chunk}}
+            
+            reply = "".join(reply_parts)
+            if query_embedding is not None and not followup and shareable:
+                semantic_answer_cache.store(
+                    course_id,
+                    message,
+                    query_embedding,
+                    {"reply": reply, "sources": sources, "confidence": confidence}
+                )
+            
+            yield {"event": "done", "data": {"reply": reply}}
+            
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            yield {"event": "error", "data": {"message": ERROR_REPLY}}
+    
+    def _precheck(
+        self,
+        message: str,
+        course_id: str,
+        conversation_id: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Embed the question once (the embedding is reused for retrieval), then
+        resolve it against the conversation's follow-up context, or answer early
+        if it is off-topic or (with `use_cache`) already in the semantic cache.
+        
+        Returns (query_embedding, early_result, followup).
+        """
+        has_context = followup_context_cache.has_context(conversation_id, course_id)
+        
+        query_embedding = None
+        # Elliptic follow-ups are resolved from the context alone
+        if not (has_context and followup_context_cache.is_elliptic(message)):
+            if settings.topic_gate_enabled or semantic_answer_cache.enabled or followup_context_cache.enabled:
+                embedded = vector_db_service.embed([message])
+                if embedded is not None:
+                    query_embedding = embedded[0]
+        
+        if has_context:
+            followup = followup_context_cache.lookup(
+                conversation_id, course_id, message, query_embedding, top_k=RETRIEVAL_TOP_K
+            )
+            if followup:
+                return query_embedding, None, followup
+        
+        if not self.is_on_topic(message, course_id, query_embedding):
+            return query_embedding, {
+                "reply": OFF_TOPIC_REPLY,
+                "sources": [],
+                "confidence": 0.0
+            }, None
+        
+        if query_embedding is None or not use_cache:
+            return query_embedding, None, None
+        
+        return query_embedding, semantic_answer_cache.lookup(course_id, query_embedding), None
+    
+    def _retrieve(
+        self,
+        message: str,
+        course_id: str,
+        query_embedding: Optional[np.ndarray] = None,
+        conversation_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve relevant content from the vector DB.
+        Within a conversation, a larger pool is fetched and kept for follow-ups.
+        """
+        if not (followup_context_cache.enabled and conversation_id and query_embedding is not None):
+            return vector_db_service.search(
+                query=message,
+                course_id=course_id,
+                top_k=RETRIEVAL_TOP_K,
+                query_embedding=query_embedding
+            )
+        
+        pool = vector_db_service.search(
+            query=message,
+            course_id=course_id,
+            top_k=max(followup_context_cache.pool_size, RETRIEVAL_TOP_K),
+            query_embedding=query_embedding,
+            include_embeddings=True
+        )
+        followup_context_cache.store(conversation_id, course_id, message, query_embedding, pool)
+        return [
+            {k: v for k, v in doc.items() if k != "embedding"}
+            for doc in pool[:RETRIEVAL_TOP_K]
+        ]
+    
+    def _build_sources(
+        self,
+        relevant_docs: List[Dict[str, Any]],
+        sentences: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """One source per retrieved document the answer quotes, excerpting the quoted sentences"""
+        quoted: Dict[int, List[str]] = {}
+        for sentence in sentences:
+            quoted.setdefault(sentence["doc_index"], []).append(sentence["text"])
+        
+        sources = []
+        for doc_index, texts in sorted(quoted.items()):
+            metadata = relevant_docs[doc_index].get("metadata", {})
+            excerpt = " ".join(texts)
+            # ChatSource fields by alias, built directly: sources are only ever serialized
+            sources.append({
+                "lessonId": metadata.get("lesson_id", "unknown"),
+                "lessonTitle": metadata.get("title", "Unknown"),
+                "excerpt": excerpt if len(excerpt) <= 150 else excerpt[:150] + "..."
+            })
+        return sources
+    
+    def _confidence(self, relevant_docs: List[Dict[str, Any]]) -> float:
+        """Confidence based on average relevance of retrieved documents"""
+        avg_distance = sum(doc.get("distance", 1.0) for doc in relevant_docs) / len(relevant_docs)
+        return round(max(0.0, 1.0 - avg_distance), 2)
+    
+    @staticmethod
+    def _history_in_prompt(conversation_history: Optional[List[Dict[str, str]]]) -> bool:
+        """True if the answer is generated from the conversation history (only LLM prompts include it)"""
+        return llm_service.enabled and bool(conversation_history)
+    
+    def _build_prompt(self, question: str, conversation_history: Optional[List[Dict[str, str]]]) -> str:
+        """Question preceded by the last few conversation turns"""
+        lines = [
+            f"{'Apprenant' if turn.get('role') == 'user' else 'Assistant'} : {turn.get('content', '')}"
+            for turn in (conversation_history or [])[-6:]
+        ]
+        lines.append(f"Question : {question}")
+        return "\n".join(lines)
+    
+    async def _complete_answer(
+        self,
+        question: str,
+        relevant_docs: List[Dict[str, Any]],
+        sentences: List[Dict[str, Any]],
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """Generate the answer with the LLM provider, or extractively without one"""
+        if llm_service.enabled:
+            try:
+                result = await llm_service.complete(
+                    SYSTEM_PROMPT,
+                    [doc["content"] for doc in relevant_docs],
+                    self._build_prompt(question, conversation_history)
+                )
+                if result["text"].strip():
+                    return result["text"]
+            except Exception as e:
+                logger.error(f"LLM completion failed, using extractive answer: {e}")
+        
+        return self._generate_answer(question, [" ".join(s["text"] for s in sentences)])
+    
+    async def _stream_answer_text(
+        self,
+        question: str,
+        relevant_docs: List[Dict[str, Any]],
+        sentences: List[Dict[str, Any]],
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer in increments.
+        LLM output streams straight through; the extractive answer is assembled
+        at once, so it is re-chunked here.
+        """
+        if llm_service.enabled:
+            started = False
+            try:
+                async for chunk in llm_service.stream(
+                    SYSTEM_PROMPT,
+                    [doc["content"] for doc in relevant_docs],
+                    self._build_prompt(question, conversation_history)
+                ):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                logger.error(f"LLM streaming failed, using extractive answer: {e}")
+        
+        answer = self._generate_answer(question, [" ".join(s["text"] for s in sentences)])
+        for chunk in chunk_text(answer):
+            yield chunk
+            # Give the event loop a chance to flush and notice disconnects
+            await asyncio.sleep(0)
+    
     def _generate_answer(self, question: str, context_parts: List[str]) -> str:
         """
         Generate answer from context using template-based approach.
@@ -103,12 +374,22 @@ class ChatbotService:
         # Default: provide context
         return f"Basé sur le contenu du cours, voici les informations pertinentes : {context_parts[0]}"
     
-    def is_on_topic(self, message: str, course_id: str) -> bool:
+    def is_on_topic(
+        self,
+        message: str,
+        course_id: str,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> bool:
         """
         Check if a question is related to the course content.
-        Simple keyword-based approach.
+        Compares the question embedding with the course topic centroids; falls
+        back to a keyword blacklist when no embedding or centroid is available.
         """
-        # In production, use more sophisticated topic modeling
+        if settings.topic_gate_enabled and query_embedding is not None:
+            on_topic = topic_gate.is_on_topic(course_id, query_embedding)
+            if on_topic is not None:
+                return on_topic
+        
         off_topic_keywords = [
             "météo", "weather", "sport", "politique", "politics",
             "recette", "recipe", "film", "movie"
@@ -119,3 +400,7 @@ class ChatbotService:
 
 # Singleton instance
 chatbot_service = ChatbotService()
+
+# Cached answers are stale once a course is re-ingested
+vector_db_service.register_course_listener(semantic_answer_cache.invalidate)
+vector_db_service.register_course_listener(followup_context_cache.invalidate_course)
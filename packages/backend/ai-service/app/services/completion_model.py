@@ -0,0 +1,461 @@
+"""
+Course completion prediction.
+
+A logistic regression over learner activity features (lessons started and
+completed, quiz scores, time spent, activity recency), trained offline from
+enrollment outcomes and learner events, and served from an immutable model
+loaded once at startup. Features are built with vectorized group-bys over the
+event store columns, so scoring one learner or a whole cohort is one pass.
+
+Risk factors are the features pulling a learner's completion probability down
+the most (their standardized value times their coefficient).
+
+Labels are a CSV, JSON Lines or Parquet file of enrollments with userId,
+courseId, completed (or status == "completed"), and optionally asOf (features
+only use events up to then), enrolledAt and completedAt.
+
+Usage:
+    python -m app.services.completion_model train enrollments.csv --model ./data/models/completion_model.npz
+    python -m app.services.completion_model evaluate enrollments.csv --model ./data/models/completion_model.npz
+"""
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+from app.services.learning_events import LearningEventStore, learning_event_store, to_utc, to_utc_ms, LESSON_VIEW, QUIZ_SCORE, NO_LESSON
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MODEL_FORMAT = "har-completion-model"
+MODEL_VERSION = 1
+
+DAY_MS = 86_400_000
+MAX_INACTIVE_DAYS = 90.0  # Days since last activity of learners without events
+RECENT_DAYS = 7
+
+# (feature, risk factor shown when the feature lowers the completion probability)
+FEATURES = [
+    ("lessons_viewed", "Few lessons started"),
+    ("lessons_completed", "Few lessons completed"),
+    ("completion_ratio", "Multiple incomplete lessons"),
+    ("quizzes_taken", "Few quizzes taken"),
+    ("average_score", "Low quiz scores"),
+    ("time_spent_hours", "Little time spent on the course"),
+    ("active_days", "Few active days"),
+    ("days_since_last_activity", "Low recent activity"),
+    ("recent_activity_share", "Activity declining over the last week")
+]
+FEATURE_NAMES = tuple(name for name, _ in FEATURES)
+RISK_LABELS = {name: label for name, label in FEATURES}
+
+AT_RISK_PROBABILITY = 0.5  # Learners below are flagged at risk (and get no estimated completion date)
+RISK_MIN_CONTRIBUTION = 0.1  # Logit decrease for a feature to be reported as a risk factor
+
+
+@dataclass
+class LearnerFeatures:
+    matrix: np.ndarray  # (learners, len(FEATURES)) float64
+    first_activity_ms: np.ndarray  # -1 for learners without events
+
+
+def build_features(columns: Dict[str, np.ndarray], user_codes: np.ndarray, as_of_ms: int) -> LearnerFeatures:
+    """
+    Feature rows of learners (event store user codes, -1 for unknown users)
+    from the event columns of one course, up to `as_of_ms`.
+    """
+    n = len(user_codes)
+    sorter = np.argsort(user_codes, kind="stable")
+    sorted_codes = user_codes[sorter]
+
+    keep = columns["ts"] <= as_of_ms
+    users = columns["user"][keep]
+    position = np.minimum(np.searchsorted(sorted_codes, users), max(n - 1, 0))
+    matched = (sorted_codes[position] == users) if n else np.zeros(len(users), dtype=bool)
+    rows = sorter[position[matched]].astype(np.int64)
+    ts = columns["ts"][keep][matched]
+    lessons = columns["lesson"][keep][matched].astype(np.int64)
+    types = columns["type"][keep][matched]
+    scores = columns["score"][keep][matched].astype(np.float64)
+    duration = columns["duration"][keep][matched].astype(np.float64)
+    completed = columns["completed"][keep][matched]
+
+    def distinct_per_row(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        keys = np.unique((rows[mask] << 32) | values[mask])
+        return np.bincount(keys >> 32, minlength=n).astype(np.float64)
+
+    events = np.bincount(rows, minlength=n).astype(np.float64)
+    # Events without a lessonId count as activity, not as a lesson
+    has_lesson = lessons != NO_LESSON
+    viewed = distinct_per_row(lessons, ((types == LESSON_VIEW) | completed) & has_lesson)
+    done = distinct_per_row(lessons, completed & has_lesson)
+    quiz = (types == QUIZ_SCORE) & ~np.isnan(scores)
+    quizzes = np.bincount(rows[quiz], minlength=n).astype(np.float64)
+    score_sums = np.bincount(rows[quiz], weights=scores[quiz], minlength=n)
+    seconds = np.bincount(rows, weights=duration, minlength=n)
+    active_days = distinct_per_row(ts // DAY_MS, np.ones(len(rows), dtype=bool))
+    recent = np.bincount(rows[ts >= as_of_ms - RECENT_DAYS * DAY_MS], minlength=n).astype(np.float64)
+
+    last = np.full(n, -1, dtype=np.int64)
+    np.maximum.at(last, rows, ts)
+    first = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, rows, ts)
+    active = events > 0
+
+    matrix = np.column_stack([
+        np.log1p(viewed),
+        np.log1p(done),
+        np.divide(done, viewed, out=np.zeros(n), where=viewed > 0),
+        np.log1p(quizzes),
+        np.divide(score_sums, quizzes, out=np.zeros(n), where=quizzes > 0),
+        np.log1p(seconds / 3600),
+        np.log1p(active_days),
+        np.where(active, np.minimum((as_of_ms - last) / DAY_MS, MAX_INACTIVE_DAYS), MAX_INACTIVE_DAYS),
+        np.divide(recent, events, out=np.zeros(n), where=active)
+    ])
+    return LearnerFeatures(matrix=matrix, first_activity_ms=np.where(active, first, -1))
+
+
+def course_features(
+    store: LearningEventStore,
+    course_id: str,
+    user_ids: Optional[List[str]] = None,
+    as_of: Optional[datetime] = None
+) -> Tuple[List[str], LearnerFeatures]:
+    """
+    Feature rows of learners of a course from the event store (every learner
+    with events in the course if `user_ids` is None), with their user IDs.
+    """
+    as_of_ms = to_utc_ms(as_of)
+    # A single learner only needs their own partitions
+    user_id = user_ids[0] if user_ids is not None and len(user_ids) == 1 else None
+    columns = store.get_events(user_id=user_id, course_id=course_id, end=as_of)
+    if user_ids is None:
+        codes = np.unique(columns["user"][columns["ts"] <= as_of_ms])
+        user_ids = store.user_ids(codes)
+    else:
+        codes = store.user_codes(user_ids)
+    return user_ids, build_features(columns, codes, as_of_ms)
+
+
+@dataclass(frozen=True)
+class CompletionModel:
+    """
+    Standardized logistic regression, reduced to its arrays: scoring is a
+    matrix-vector product, with no estimator validation overhead per call.
+    Arrays are read-only, so the model is safe to share across threads.
+    """
+
+    feature_names: Tuple[str, ...]
+    mean: np.ndarray
+    scale: np.ndarray
+    coef: np.ndarray
+    intercept: float
+    median_completion_days: Optional[float] = None
+    trained_at: str = ""
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for name in ("mean", "scale", "coef"):
+            values = np.array(getattr(self, name), dtype=np.float64)
+            values.setflags(write=False)
+            object.__setattr__(self, name, values)
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, C: float = 1.0, median_completion_days: Optional[float] = None) -> "CompletionModel":
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.preprocessing import StandardScaler
+
+        scaler = StandardScaler().fit(X)
+        classifier = LogisticRegression(C=C, class_weight="balanced", max_iter=1000)
+        classifier.fit(scaler.transform(X), y)
+        return cls(
+            feature_names=FEATURE_NAMES,
+            mean=scaler.mean_,
+            scale=scaler.scale_,
+            coef=classifier.coef_[0],
+            intercept=float(classifier.intercept_[0]),
+            median_completion_days=median_completion_days,
+            trained_at=datetime.now(timezone.utc).isoformat()
+        )
+
+    def contributions(self, X: np.ndarray) -> np.ndarray:
+        """Logit contribution of every feature of every row"""
+        return (X - self.mean) / self.scale * self.coef
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        logits = self.contributions(X).sum(axis=1) + self.intercept
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def risk_factors(self, X: np.ndarray, limit: int = 3) -> List[List[str]]:
+        """Labels of the features lowering each row's probability the most"""
+        contributions = self.contributions(X)
+        order = np.argsort(contributions, axis=1)[:, :limit]
+        labels = np.array([RISK_LABELS[name] for name in self.feature_names], dtype=object)[order]
+        labels[np.take_along_axis(contributions, order, axis=1) > -RISK_MIN_CONTRIBUTION] = None
+        return [[label for label in row if label is not None] for row in labels.tolist()]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        metadata = {
+            "format": MODEL_FORMAT,
+            "version": MODEL_VERSION,
+            "featureNames": list(self.feature_names),
+            "intercept": self.intercept,
+            "medianCompletionDays": self.median_completion_days,
+            "trainedAt": self.trained_at,
+            "metrics": self.metrics
+        }
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, mean=self.mean, scale=self.scale, coef=self.coef, metadata=np.array(json.dumps(metadata)))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "CompletionModel":
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata.get("format") != MODEL_FORMAT or metadata.get("version") != MODEL_VERSION:
+                raise ValueError(f"Unsupported completion model format in {path}")
+            if tuple(metadata["featureNames"]) != FEATURE_NAMES:
+                raise ValueError(f"Completion model {path} was trained on other features")
+            return cls(
+                feature_names=tuple(metadata["featureNames"]),
+                mean=data["mean"],
+                scale=data["scale"],
+                coef=data["coef"],
+                intercept=metadata["intercept"],
+                median_completion_days=metadata.get("medianCompletionDays"),
+                trained_at=metadata.get("trainedAt", ""),
+                metrics=metadata.get("metrics", {})
+            )
+
+
+class CompletionPredictor:
+    """
+    Serves completion predictions from the model file (loaded at startup).
+    `model` is None when no model has been trained yet.
+    """
+
+    def __init__(self, model_path: str, store: LearningEventStore):
+        self.model_path = model_path
+        self.store = store
+        self.model: Optional[CompletionModel] = None
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """Load the model file (`model_path` unless another one is given)"""
+        path = path or self.model_path
+        if not path or not os.path.exists(path):
+            logger.warning(f"No completion model at {path}; predictions are disabled")
+            return False
+        try:
+            model = CompletionModel.load(path)
+        except Exception as e:
+            logger.error(f"Failed to load completion model {path}: {e}")
+            return False
+        self.model = model  # Swapped whole: requests see the previous or the new model
+        logger.info(f"Loaded completion model trained at {model.trained_at}")
+        return True
+
+    def predict(
+        self,
+        course_id: str,
+        user_ids: List[str],
+        as_of: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Probability, estimated completion date and risk factors of learners of a course"""
+        return self.predict_cohort({course_id: user_ids}, as_of, order_by_risk=False)
+
+    def predict_cohort(
+        self,
+        learners: Dict[str, Optional[List[str]]],
+        as_of: Optional[datetime] = None,
+        order_by_risk: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Predictions for learners grouped by course ID (every learner with events
+        in the course when None). Features are built once per course and all
+        rows are scored in one model call; results are ordered by increasing
+        completion probability.
+        """
+        model = self.model
+        if model is None:
+            raise RuntimeError("No completion model loaded")
+        as_of = to_utc(as_of) if as_of else datetime.now(timezone.utc)  # Naive as_of is UTC
+
+        course_ids: List[str] = []
+        user_ids: List[str] = []
+        matrices, first_activity = [], []
+        for course_id, course_users in learners.items():
+            course_users, features = course_features(self.store, course_id, course_users, as_of)
+            course_ids.extend([course_id] * len(course_users))
+            user_ids.extend(course_users)
+            matrices.append(features.matrix)
+            first_activity.append(features.first_activity_ms)
+        if not user_ids:
+            return []
+        matrix = np.concatenate(matrices)
+        first_activity_ms = np.concatenate(first_activity)
+
+        probabilities = model.predict_proba(matrix)
+        order = np.argsort(probabilities, kind="stable") if order_by_risk else np.arange(len(probabilities))
+        risk_factors = model.risk_factors(matrix[order])
+
+        results = []
+        for i, probability, first_ms, risks in zip(
+            order.tolist(), probabilities[order].tolist(), first_activity_ms[order].tolist(), risk_factors
+        ):
+            estimated = None
+            if model.median_completion_days is not None and probability >= AT_RISK_PROBABILITY and first_ms >= 0:
+                start = datetime.fromtimestamp(first_ms / 1000, tz=timezone.utc)
+                estimated = max(start + timedelta(days=model.median_completion_days), as_of + timedelta(days=1))
+            results.append({
+                "userId": user_ids[i],
+                "courseId": course_ids[i],
+                "probability": round(probability, 4),
+                "atRisk": probability < AT_RISK_PROBABILITY,
+                "estimatedCompletionDate": estimated,
+                "riskFactors": risks
+            })
+        return results
+
+
+# ---------- Training / evaluation ----------
+
+def read_labels(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    elif path.endswith((".jsonl", ".ndjson")):
+        frame = pd.read_json(path, lines=True)
+    else:
+        frame = pd.read_csv(path)
+    if "completed" not in frame:
+        frame["completed"] = frame["status"] == "completed"
+    frame["userId"] = frame["userId"].astype(str)
+    frame["courseId"] = frame["courseId"].astype(str)
+    frame["completed"] = frame["completed"].astype(bool)
+    return frame
+
+
+def labeled_features(store: LearningEventStore, labels: pd.DataFrame, as_of: Optional[datetime]) -> Tuple[np.ndarray, float]:
+    """Feature matrix of labeled enrollments (rows in label order) and the build time per enrollment (ms)"""
+    if "asOf" in labels:
+        cutoffs = pd.to_datetime(labels["asOf"], utc=True)
+    else:
+        cutoffs = pd.Series(pd.Timestamp(as_of or datetime.now(timezone.utc)), index=labels.index)
+
+    matrix = np.zeros((len(labels), len(FEATURES)))
+    started = time.perf_counter()
+    for (course_id, cutoff), group in labels.groupby([labels["courseId"], cutoffs], sort=False):
+        positions = labels.index.get_indexer(group.index)
+        _, features = course_features(store, course_id, group["userId"].tolist(), cutoff.to_pydatetime())
+        matrix[positions] = features.matrix
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return matrix, elapsed_ms / max(len(labels), 1)
+
+
+def median_completion_days(labels: pd.DataFrame) -> Optional[float]:
+    if "enrolledAt" not in labels or "completedAt" not in labels:
+        return None
+    days = (pd.to_datetime(labels["completedAt"], utc=True) - pd.to_datetime(labels["enrolledAt"], utc=True)).dt.days
+    days = days[labels["completed"] & days.notna()]
+    return float(days.median()) if len(days) else None
+
+
+def evaluate(model: CompletionModel, X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+    from sklearn.metrics import accuracy_score, brier_score_loss, roc_auc_score
+
+    probabilities = model.predict_proba(X)
+    metrics: Dict[str, Any] = {
+        "samples": int(len(y)),
+        "positiveRate": round(float(y.mean()), 4) if len(y) else 0.0,
+        "accuracy": round(float(accuracy_score(y, probabilities >= 0.5)), 4),
+        "brier": round(float(brier_score_loss(y, probabilities)), 4)
+    }
+    if len(np.unique(y)) == 2:
+        metrics["auc"] = round(float(roc_auc_score(y, probabilities)), 4)
+    return metrics
+
+
+def scoring_latency(model: CompletionModel, X: np.ndarray, repeat: int = 2000, batch_size: int = 10_000) -> Dict[str, Any]:
+    """Single-learner latency percentiles and batch throughput of scoring plus risk factors"""
+    row = X[:1] if len(X) else np.zeros((1, len(FEATURES)))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        model.predict_proba(row)
+        model.risk_factors(row)
+        timings.append(time.perf_counter() - started)
+    timings_us = np.array(timings) * 1e6
+
+    batch = np.resize(row if not len(X) else X, (batch_size, len(FEATURES)))
+    started = time.perf_counter()
+    model.predict_proba(batch)
+    model.risk_factors(batch)
+    batch_seconds = time.perf_counter() - started
+    return {
+        "singleP50Us": round(float(np.percentile(timings_us, 50)), 1),
+        "singleP99Us": round(float(np.percentile(timings_us, 99)), 1),
+        "batchSize": batch_size,
+        "batchMs": round(batch_seconds * 1000, 2),
+        "batchRowsPerSecond": int(batch_size / batch_seconds)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train or evaluate the course completion model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command, help_text in (("train", "Train a model from labeled enrollments"), ("evaluate", "Evaluate a model")):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("labels", help="CSV, JSON Lines or Parquet file of enrollments")
+        subparser.add_argument("--events", default=settings.learning_events_path, help="Learner event store directory")
+        subparser.add_argument("--as-of", type=datetime.fromisoformat, help="Feature cutoff when labels have no asOf column")
+        subparser.add_argument("--model", default=settings.completion_model_path, help="Model file")
+    subparsers.choices["train"].add_argument("--test-size", type=float, default=0.2)
+    subparsers.choices["train"].add_argument("--C", type=float, default=1.0, help="Inverse regularization strength")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    store = LearningEventStore(args.events)
+    store.start()
+    try:
+        labels = read_labels(args.labels)
+        X, build_ms = labeled_features(store, labels, args.as_of)
+    finally:
+        store.stop()
+    y = labels["completed"].to_numpy(dtype=np.int64)
+
+    if args.command == "evaluate":
+        model = CompletionModel.load(args.model)
+        report = {"evaluation": evaluate(model, X, y)}
+    else:
+        from sklearn.model_selection import train_test_split
+
+        stratify = y if len(np.unique(y)) == 2 else None
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42, stratify=stratify)
+        model = CompletionModel.fit(X_train, y_train, C=args.C, median_completion_days=median_completion_days(labels))
+        metrics = {"train": evaluate(model, X_train, y_train), "test": evaluate(model, X_test, y_test)}
+        model = replace(model, metrics=metrics)
+        model.save(args.model)
+        report = {"model": args.model, **metrics, "coefficients": dict(zip(FEATURE_NAMES, np.round(model.coef, 4).tolist()))}
+
+    report["latency"] = {"featureBuildMsPerEnrollment": round(build_ms, 4), **scoring_latency(model, X)}
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+# Singleton instance
+completion_predictor = CompletionPredictor(settings.completion_model_path, learning_event_store)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+from typing import List, Dict, Any, Optional
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime
+from app.config import settings
+import json
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class _Conversation:
+    """Metadata for one conversation, the log offsets of its turns and a ring buffer of the most recent ones"""
+
+    __slots__ = ("user_id", "turn_count", "updated_at", "recent", "offsets")
+
+    def __init__(self, user_id: str, max_turns: int):
+        self.user_id = user_id
+        self.turn_count = 0  # Turns ever appended (the next seq)
+        self.updated_at: Optional[str] = None
+        self.recent: deque = deque(maxlen=max_turns)
+        self.offsets = array("q")  # Byte offset in the log of every stored turn, oldest first
+
+
+class ConversationStore:
+    """
+    Server-side chatbot conversation history.
+
+    - Every turn is appended to an on-disk log (one JSON object per line), and its
+      byte offset is indexed per conversation, so any turn is read with one seek
+    - The last `max_turns_in_memory` turns of each conversation are kept in a ring buffer
+    - At most `max_conversations` ring buffers are held; the least recently used are
+      dropped and rebuilt from the log on demand
+    - At most `max_stored` conversations are indexed; the least recently updated
+      are forgotten beyond that, and dropped from the log at the next compaction
+    - Once the log grows past `compact_threshold_bytes`, a background thread rewrites
+      it keeping the last `retained_turns` turns of each conversation; appends go on
+      meanwhile and are carried over
+
+    The log is loaded by `start`, on startup of the instance owning the
+    conversations. Methods do blocking file I/O: call them from a thread
+    (asyncio.to_thread), not from the event loop.
+    """
+
+    def __init__(
+        self,
+        log_path: str,
+        max_turns_in_memory: int = 50,
+        max_conversations: int = 1000,
+        retained_turns: int = 500,
+        compact_threshold_bytes: int = 64 * 1024 * 1024,
+        max_stored: int = 100000
+    ):
+        self.log_path = log_path
+        self.max_turns_in_memory = max_turns_in_memory
+        self.max_conversations = max_conversations
+        self.retained_turns = retained_turns
+        self.compact_threshold_bytes = compact_threshold_bytes
+        self.max_stored = max_stored
+
+        self._lock = threading.RLock()
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()  # Least recently updated first
+        self._buffered: "OrderedDict[str, None]" = OrderedDict()
+        self._by_user: Dict[str, Dict[str, None]] = {}
+        self._log = None
+        self._loaded = False
+        self._log_size = 0
+        self._next_compaction = compact_threshold_bytes
+        self._compactor: Optional[threading.Thread] = None
+
+        self.forgotten = 0
+        self.compactions = 0
+
+    # ---------- Log I/O ----------
+
+    def start(self):
+        """Load the log and open it for appends (once)"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        """Rebuild conversation metadata, offsets and ring buffers from the log"""
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        offset = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        self._index_turn(json.loads(line), offset)
+                    except (ValueError, KeyError):
+                        logger.warning(f"Skipping malformed line at offset {offset} of {self.log_path}")
+                    offset += len(line)
+            if offset != os.path.getsize(self.log_path):
+                # Partial last line from an interrupted write: later appends must start on a new line
+                os.truncate(self.log_path, offset)
+            logger.info(f"Loaded {len(self._conversations)} conversations from {self.log_path}")
+
+        self._log = open(self.log_path, "ab")
+        self._log_size = offset
+        self._next_compaction = max(self.compact_threshold_bytes, 2 * offset)
+
+    def _index_turn(self, turn: Dict[str, Any], offset: int):
+        conversation_id = turn["conversationId"]
+        conversation = self._conversations.get(conversation_id)
+        is_new = conversation is None
+        if is_new:
+            conversation = _Conversation(turn["userId"], self.max_turns_in_memory)
+            self._conversations[conversation_id] = conversation
+            self._by_user.setdefault(turn["userId"], {})[conversation_id] = None
+        else:
+            self._conversations.move_to_end(conversation_id)
+
+        conversation.offsets.append(offset)
+        conversation.turn_count = max(conversation.turn_count, turn["seq"] + 1)
+        conversation.updated_at = turn["timestamp"]
+
+        # An evicted buffer would be incomplete; it is rebuilt from the log on next access
+        if is_new or conversation_id in self._buffered:
+            conversation.recent.append(turn)
+            self._touch(conversation_id)
+
+        while len(self._conversations) > self.max_stored:
+            self._forget(next(iter(self._conversations)))
+
+    def _forget(self, conversation_id: str):
+        conversation = self._conversations.pop(conversation_id)
+        self._buffered.pop(conversation_id, None)
+        user_conversations = self._by_user.get(conversation.user_id)
+        if user_conversations is not None:
+            user_conversations.pop(conversation_id, None)
+            if not user_conversations:
+                del self._by_user[conversation.user_id]
+        self.forgotten += 1
+
+    def _touch(self, conversation_id: str):
+        """Mark a ring buffer as recently used and drop the least recently used ones"""
+        self._buffered[conversation_id] = None
+        self._buffered.move_to_end(conversation_id)
+        while len(self._buffered) > self.max_conversations:
+            evicted, _ = self._buffered.popitem(last=False)
+            self._conversations[evicted].recent.clear()
+
+    def _ensure_buffered(self, conversation_id: str, conversation: _Conversation):
+        if conversation_id not in self._buffered and conversation.offsets:
+            conversation.recent.clear()
+            conversation.recent.extend(self._read_turns(conversation.offsets[-self.max_turns_in_memory:]))
+        self._touch(conversation_id)
+
+    def _read_turns(self, offsets) -> List[Dict[str, Any]]:
+        """Turns at the given log offsets (the lock must be held: compaction moves them)"""
+        self._log.flush()
+        turns = []
+        with open(self.log_path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                turns.append(json.loads(f.readline()))
+        return turns
+
+    # ---------- Compaction ----------
+
+    def _maybe_compact(self):
+        if self._log_size <= self._next_compaction or (self._compactor and self._compactor.is_alive()):
+            return
+        self._compactor = threading.Thread(target=self._compact, name="conversation-log-compactor", daemon=True)
+        self._compactor.start()
+
+    def _compact(self):
+        """
+        Rewrite the log keeping the last `retained_turns` turns of every indexed
+        conversation. The retained turns are copied without holding the lock;
+        turns appended meanwhile are then copied over as they are, and the
+        offsets remapped, before the new log replaces the old one.
+        """
+        try:
+            with self._lock:
+                self._log.flush()
+                size = self._log_size
+                kept = sorted(
+                    offset
+                    for conversation in self._conversations.values()
+                    for offset in conversation.offsets[-self.retained_turns:]
+                    if offset < size
+                )
+
+            tmp_path = f"{self.log_path}.compact"
+            moved: Dict[int, int] = {}
+            src, dst = open(self.log_path, "rb"), open(tmp_path, "wb")
+            try:
+                for offset in kept:
+                    src.seek(offset)
+                    moved[offset] = dst.tell()
+                    dst.write(src.readline())
+            except Exception:
+                src.close()
+                dst.close()
+                raise
+
+            with self._lock:
+                try:
+                    self._log.flush()
+                    tail_start = dst.tell()
+                    src.seek(size)
+                    for block in iter(lambda: src.read(1 << 20), b""):
+                        dst.write(block)
+                finally:
+                    src.close()
+                    dst.close()
+
+                for conversation in self._conversations.values():
+                    conversation.offsets = array("q", (
+                        moved[offset] if offset < size else tail_start + offset - size
+                        for offset in conversation.offsets
+                        if offset >= size or offset in moved
+                    ))
+                self._log.close()
+                os.replace(tmp_path, self.log_path)
+                self._log = open(self.log_path, "ab")
+                before, self._log_size = self._log_size, os.path.getsize(self.log_path)
+                self._next_compaction = max(self.compact_threshold_bytes, 2 * self._log_size)
+                self.compactions += 1
+
+            logger.info(f"Compacted conversation log {self.log_path}: {before} -> {self._log_size} bytes")
+        except Exception as e:
+            logger.error(f"Failed to compact conversation log {self.log_path}: {e}")
+
+    # ---------- Public API ----------
+
+    @staticmethod
+    def new_conversation_id() -> str:
+        return str(uuid.uuid4())
+
+    def get_owner(self, conversation_id: str) -> Optional[str]:
+        """User owning a conversation, None if it is unknown (never created, or forgotten)"""
+        conversation = self._conversations.get(conversation_id)
+        return conversation.user_id if conversation else None
+
+    def append(self, conversation_id: str, user_id: str, role: str, content: str) -> Dict[str, Any]:
+        """Append a turn to a conversation (created on first use)"""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                self._ensure_buffered(conversation_id, conversation)
+                seq = conversation.turn_count
+            else:
+                seq = 0
+
+            turn = {
+                "conversationId": conversation_id,
+                "userId": user_id,
+                "seq": seq,
+                "role": role,
+                "content": content,
+                "timestamp": datetime.utcnow().isoformat() + "Z"
+            }
+
+            line = (json.dumps(turn, ensure_ascii=False) + "\n").encode("utf-8")
+            self._log.write(line)
+            self._log.flush()
+            offset = self._log_size
+            self._log_size += len(line)
+
+            self._index_turn(turn, offset)
+            self._maybe_compact()
+            return turn
+
+    def get_recent(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent turns of a conversation, oldest first"""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return []
+            self._ensure_buffered(conversation_id, conversation)
+            turns = list(conversation.recent)
+        return turns[-limit:] if limit else turns
+
+    def get_turns(self, conversation_id: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Page through a conversation's stored turns, newest first.
+        Pages inside the ring buffer are served from memory, older ones are
+        read from the log at their indexed offsets.
+        """
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return {"turns": [], "totalCount": 0}
+
+            self._ensure_buffered(conversation_id, conversation)
+            total = len(conversation.offsets)
+            end = max(0, total - offset)
+            start = max(0, end - limit)
+            # The buffer may hold turns older than the ones kept by compaction
+            recent = list(conversation.recent)[-total:] if total else []
+            buffered_from = total - len(recent)
+            if start >= buffered_from:
+                page = recent[start - buffered_from:end - buffered_from]
+            else:
+                page = self._read_turns(conversation.offsets[start:end])
+
+        page.reverse()
+        return {"turns": page, "totalCount": total}
+
+    def list_conversations(self, user_id: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """A user's conversations, most recently updated first"""
+        with self._lock:
+            summaries = [
+                {
+                    "conversationId": conversation_id,
+                    "turnCount": self._conversations[conversation_id].turn_count,
+                    "updatedAt": self._conversations[conversation_id].updated_at
+                }
+                for conversation_id in self._by_user.get(user_id, {})
+            ]
+
+        summaries.sort(key=lambda s: s["updatedAt"] or "", reverse=True)
+        return {
+            "conversations": summaries[offset:offset + limit],
+            "totalCount": len(summaries)
+        }
+
+    def close(self, timeout: float = 30.0):
+        """Wait for a running compaction and close the log"""
+        if self._compactor:
+            self._compactor.join(timeout)
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "conversations": len(self._conversations),
+                "buffered": len(self._buffered),
+                "users": len(self._by_user),
+                "logBytes": self._log_size,
+                "forgotten": self.forgotten,
+                "compactions": self.compactions
+            }
+
+
+# Singleton instance
+conversation_store = ConversationStore(
+    log_path=settings.conversation_log_path,
+    max_turns_in_memory=settings.conversation_max_turns_in_memory,
+    max_conversations=settings.conversation_max_in_memory,
+    retained_turns=settings.conversation_retained_turns,
+    compact_threshold_bytes=settings.conversation_compact_threshold_mb * 1024 * 1024,
+    max_stored=settings.conversation_max_stored
+)
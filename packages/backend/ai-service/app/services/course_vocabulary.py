@@ -0,0 +1,157 @@
+from typing import List, Dict, Tuple, Iterable, Optional
+from collections import Counter
+from app.models.schemas import DifficultyLevel
+from app.services.answer_assembler import STOP_WORDS
+import hashlib
+import random
+import re
+import zlib
+
+WORD_PATTERN = re.compile(r"\w+(?:['’-]\w+)*")
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+AFFIXES_PATTERN = re.compile(r"^(\W*)(.*?)(\W*)$", re.DOTALL)
+
+_STOP_WORDS = frozenset(STOP_WORDS)
+
+# Part-of-speech-like classes by suffix (French and English), checked in order
+SUFFIX_CLASSES = [
+    ("adverb", ("ment", "ly")),
+    ("noun", ("tion", "sion", "ité", "ness", "ance", "ence", "isme", "ism", "age", "eur", "ure", "ship")),
+    ("adjective", ("ique", "able", "ible", "if", "ive", "al", "elle", "eux", "euse", "ous", "ful", "less", "ic")),
+    ("verb", ("er", "ir", "ing", "ed", "ize", "ise", "ate", "ent")),
+]
+
+# Word frequency band of the distractors for each quiz difficulty
+DIFFICULTY_BANDS = {
+    DifficultyLevel.BEGINNER: "common",
+    DifficultyLevel.MEDIUM: "mid",
+    DifficultyLevel.INTERMEDIATE: "mid",
+    DifficultyLevel.ADVANCED: "rare",
+}
+
+
+def length_bucket(term: str) -> str:
+    return "short" if len(term) <= 4 else "medium" if len(term) <= 7 else "long"
+
+
+def word_class(term: str, capitalized: bool) -> str:
+    """Part-of-speech-like bucket of a term"""
+    if NUMBER_PATTERN.fullmatch(term):
+        return "number"
+    if capitalized:
+        return "term"
+    lower = term.lower()
+    for name, suffixes in SUFFIX_CLASSES:
+        for suffix in suffixes:
+            # Keep a stem of at least 3 letters ("user" is not a verb)
+            if lower.endswith(suffix) and len(lower) >= len(suffix) + 3:
+                return name
+    return "word"
+
+
+class CourseVocabulary:
+    """
+    Vocabulary of a course, for quiz distractors.
+
+    Terms are counted once at build time, classified into part-of-speech-like
+    buckets (numbers, capitalized terms, nouns, verbs, ...), length buckets and
+    frequency bands, and every bucket combination used for sampling is
+    materialized as a list. Sampling distractors is then a few dict lookups and
+    random picks: O(1) per question regardless of the course size.
+    """
+
+    def __init__(self, counts: Dict[str, int], surfaces: Dict[str, str], capitalized: Dict[str, bool]):
+        self.counts = counts
+        self.surfaces = surfaces
+        self.buckets: Dict[Tuple[str, ...], List[str]] = {}
+
+        ranked = sorted(counts, key=lambda t: (-counts[t], t))
+        # Identifies the vocabulary's content, e.g. in cache keys
+        self.fingerprint = hashlib.sha256(
+            "\n".join(f"{surfaces[t]}\t{counts[t]}" for t in ranked).encode("utf-8")
+        ).hexdigest()[:16]
+        third = max(1, len(ranked) // 3)
+        self.bands = {
+            term: "common" if rank < third else "mid" if rank < 2 * third else "rare"
+            for rank, term in enumerate(ranked)
+        }
+        self.classes = {term: word_class(surfaces[term], capitalized[term]) for term in ranked}
+
+        for term in ranked:
+            cls, length, band = self.classes[term], length_bucket(surfaces[term]), self.bands[term]
+            for key in ((cls, length, band), (cls, band), (cls, length), (cls,), (band,)):
+                self.buckets.setdefault(key, []).append(surfaces[term])
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], min_length: int = 3) -> "CourseVocabulary":
+        # Count surface forms first (C-level), then merge the distinct ones by lowercase key
+        surface_counts: Counter = Counter()
+        for text in texts:
+            surface_counts.update(WORD_PATTERN.findall(text))
+
+        counts: Dict[str, int] = {}
+        variants: Dict[str, Dict[str, int]] = {}
+        for word, n in surface_counts.items():
+            key = word.lower()
+            if (len(word) < min_length and not word[0].isdigit()) or key in _STOP_WORDS or "_" in word:
+                continue
+            counts[key] = counts.get(key, 0) + n
+            variants.setdefault(key, {})[word] = n
+
+        surfaces = {key: max(forms, key=forms.get) for key, forms in variants.items()}
+        # Capitalized in most occurrences: a name or technical term, not a sentence start
+        capitalized = {
+            key: sum(n for w, n in forms.items() if w[0].isupper()) * 2 > counts[key]
+            for key, forms in variants.items()
+        }
+        return cls(counts, surfaces, capitalized)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def sample_distractors(
+        self,
+        answer: str,
+        difficulty: DifficultyLevel,
+        count: int = 3,
+        max_attempts: int = 4
+    ) -> List[str]:
+        """
+        Up to `count` distinct course terms resembling `answer`: same class, length
+        and difficulty band first, widening the bucket when it is too small.
+        The answer's surrounding punctuation is applied to the distractors, and
+        the choice is deterministic for a given answer.
+        """
+        prefix, core, suffix = AFFIXES_PATTERN.match(answer).groups()
+        if not core:
+            return []
+
+        key = core.lower()
+        cls = self.classes.get(key) or word_class(core, core[0].isupper() and not core[0].isdigit())
+        length = length_bucket(core)
+        band = DIFFICULTY_BANDS.get(difficulty, "mid")
+        rng = random.Random(zlib.crc32(answer.encode("utf-8")))
+
+        chosen: List[str] = []
+        seen = {key}
+        for bucket_key in ((cls, length, band), (cls, band), (cls, length), (cls,), (band,)):
+            # A number is only replaced by another number
+            if cls == "number" and bucket_key == (band,):
+                break
+            bucket = self.buckets.get(bucket_key)
+            if not bucket:
+                continue
+            for _ in range(count * max_attempts):
+                term = bucket[rng.randrange(len(bucket))]
+                if term.lower() not in seen:
+                    seen.add(term.lower())
+                    chosen.append(f"{prefix}{term}{suffix}")
+                    if len(chosen) == count:
+                        return chosen
+        return chosen
+
+
+def build_vocabulary(texts: Iterable[str]) -> Optional[CourseVocabulary]:
+    """Vocabulary of the given texts (None if they contain no usable term)"""
+    vocabulary = CourseVocabulary.from_texts(texts)
+    return vocabulary if len(vocabulary) else None
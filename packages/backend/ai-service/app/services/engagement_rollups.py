@@ -0,0 +1,261 @@
+from typing import List, Dict, Any, Tuple
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from app.config import settings
+from app.services.learning_events import learning_event_store, to_utc_ms
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = 11  # 2048 registers per bucket, ~2.3% standard error
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+# (name, bucket seconds, buckets retained)
+GRANULARITIES = [("minute", 60, 24 * 60), ("hour", 3600, 30 * 24), ("day", 86400, 365)]
+
+# Finer granularities are used for windows of at most this many of their buckets
+MAX_READ_BUCKETS = 720
+
+
+@lru_cache(maxsize=100_000)
+def hll_position(user_id: str) -> Tuple[int, int]:
+    """HyperLogLog register index and rank of a user ID"""
+    h = int.from_bytes(hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest(), "big")
+    index = h >> (64 - HLL_PRECISION)
+    rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+    return index, rank
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """Distinct count estimate of a register array"""
+    estimate = HLL_ALPHA * HLL_REGISTERS ** 2 / np.sum(np.ldexp(1.0, -registers.astype(np.int32)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * HLL_REGISTERS and zeros:
+        # Small range: linear counting
+        return HLL_REGISTERS * np.log(HLL_REGISTERS / zeros)
+    return float(estimate)
+
+
+class _Rollup:
+    """
+    Ring of fixed-width time buckets. A slot is reused (and reset) when a
+    newer bucket maps to it, so memory is bounded by the retention.
+    """
+
+    def __init__(self, seconds: int, retention: int):
+        self.seconds = seconds
+        self.retention = retention
+        self.starts = np.full(retention, -1, dtype=np.int64)  # Bucket number held by each slot
+        self.events = np.zeros(retention, dtype=np.int64)
+        self.sessions = np.zeros(retention, dtype=np.int64)
+        self.duration = np.zeros(retention, dtype=np.float64)  # Seconds
+        self.hours = np.zeros((retention, 24), dtype=np.int64)  # Events by UTC hour of day
+        self.registers = np.zeros((retention, HLL_REGISTERS), dtype=np.uint8)
+        self.courses: List[Counter] = [Counter() for _ in range(retention)]
+
+    def _claim(self, buckets: np.ndarray) -> np.ndarray:
+        """Slots of the buckets (resetting reused ones); -1 for buckets older than a slot's"""
+        slots = buckets % self.retention
+        for bucket in np.unique(buckets).tolist():
+            slot = bucket % self.retention
+            if self.starts[slot] < bucket:
+                self.starts[slot] = bucket
+                self.events[slot] = self.sessions[slot] = 0
+                self.duration[slot] = 0.0
+                self.hours[slot] = 0
+                self.registers[slot] = 0
+                self.courses[slot] = Counter()
+        return np.where(self.starts[slots] == buckets, slots, -1)
+
+    def add(self, ts: np.ndarray, index: np.ndarray, rank: np.ndarray, duration: np.ndarray, new_session: np.ndarray, courses: List[str]):
+        slots = self._claim(ts // (self.seconds * 1000))
+        kept = slots >= 0
+        slots = slots[kept]
+        np.add.at(self.events, slots, 1)
+        np.add.at(self.sessions, slots, new_session[kept])
+        np.add.at(self.duration, slots, duration[kept])
+        np.add.at(self.hours, (slots, (ts[kept] // 3_600_000) % 24), 1)
+        np.maximum.at(self.registers, (slots, index[kept]), rank[kept])
+        for slot, course in zip(slots.tolist(), (c for c, k in zip(courses, kept) if k)):
+            self.courses[slot][course] += 1
+
+    def select(self, first_bucket: int, last_bucket: int) -> np.ndarray:
+        return np.flatnonzero((self.starts >= first_bucket) & (self.starts <= last_bucket))
+
+
+class EngagementRollups:
+    """
+    Engagement aggregates maintained incrementally as learner events are
+    ingested, at minute, hour and day granularity: events, sessions, time
+    spent, events by hour of day and by course, and a HyperLogLog sketch of
+    active users per bucket (merged by register-wise max at read time).
+
+    A session is a run of a user's events less than `session_gap` seconds
+    apart. Reads only touch the buckets of the window, at the finest
+    granularity still retained for it, so their cost does not depend on
+    event volume. Rollups are saved on shutdown and reloaded at startup.
+
+    Events timestamped more than `max_future_skew` seconds ahead of the clock,
+    or older than the coarsest retention, are not rolled up (counted as
+    `rejected`): a single future timestamp would otherwise recycle ring slots
+    still holding current buckets.
+    """
+
+    def __init__(self, snapshot_path: str = "", session_gap: int = 1800, max_future_skew: int = 300):
+        self.snapshot_path = snapshot_path
+        self.session_gap_ms = session_gap * 1000
+        self.max_future_skew_ms = max_future_skew * 1000
+        self.rollups = {name: _Rollup(seconds, retention) for name, seconds, retention in GRANULARITIES}
+        self._last_seen: Dict[str, int] = {}  # User ID -> timestamp (ms) of their latest event
+        self._latest_ms = 0
+        self._recorded_since_prune = 0
+        self._lock = threading.Lock()
+        self.version = 0  # Incremented by every recorded batch
+        self.rejected = 0
+
+    def _accepted_range(self) -> Tuple[int, int]:
+        """Timestamps (ms) of events that can be rolled up: within the coarsest retention, not in the future"""
+        now_ms = to_utc_ms(None)
+        _, seconds, retention = GRANULARITIES[-1]
+        return now_ms - seconds * 1000 * (retention - 1), now_ms + self.max_future_skew_ms
+
+    def record(self, events: List[Dict[str, Any]]):
+        """Update the rollups with ingested events (blocking: called from the ingestion thread)"""
+        if not events:
+            return
+        oldest_ms, newest_ms = self._accepted_range()
+        stamped = [(to_utc_ms(e.get("timestamp")), e) for e in events]
+        ordered = sorted(((t, e) for t, e in stamped if oldest_ms <= t <= newest_ms), key=lambda item: item[0])
+        if len(ordered) < len(stamped):
+            with self._lock:
+                self.rejected += len(stamped) - len(ordered)
+            logger.warning(f"Skipped {len(stamped) - len(ordered)} events timestamped outside the engagement rollups range")
+        if not ordered:
+            return
+        ts = np.fromiter((t for t, _ in ordered), dtype=np.int64, count=len(ordered))
+        positions = [hll_position(e["userId"]) for _, e in ordered]
+        index = np.fromiter((p[0] for p in positions), dtype=np.int64, count=len(positions))
+        rank = np.fromiter((p[1] for p in positions), dtype=np.uint8, count=len(positions))
+        duration = np.fromiter((float(e.get("durationSeconds") or 0.0) for _, e in ordered), dtype=np.float64, count=len(ordered))
+        courses = [e["courseId"] for _, e in ordered]
+
+        with self._lock:
+            new_session = np.zeros(len(ordered), dtype=np.int64)
+            for i, (t, event) in enumerate(ordered):
+                user_id = event["userId"]
+                previous = self._last_seen.get(user_id)
+                if previous is None or t - previous >= self.session_gap_ms:
+                    new_session[i] = 1
+                if previous is None or t > previous:
+                    self._last_seen[user_id] = t
+            self._latest_ms = max(self._latest_ms, int(ts[-1]))
+
+            for rollup in self.rollups.values():
+                rollup.add(ts, index, rank, duration, new_session, courses)
+            self.version += 1
+
+            self._recorded_since_prune += len(ordered)
+            if self._recorded_since_prune >= 10_000:
+                # Users idle for longer than a session gap start a new session anyway
+                cutoff = self._latest_ms - self.session_gap_ms
+                self._last_seen = {u: t for u, t in self._last_seen.items() if t >= cutoff}
+                self._recorded_since_prune = 0
+
+    def get_engagement(self, start: datetime, end: datetime, top_courses: int = 3, peak_hours: int = 4) -> Dict[str, Any]:
+        """Engagement over [start, end], at the finest granularity retaining the whole window"""
+        start_ms, end_ms = to_utc_ms(start), to_utc_ms(end)
+        now_ms = max(self._latest_ms, to_utc_ms(None))
+        name = GRANULARITIES[-1][0]
+        for candidate, seconds, retention in GRANULARITIES[:-1]:
+            bucket_ms = seconds * 1000
+            oldest_ms = (now_ms // bucket_ms - retention + 1) * bucket_ms
+            if start_ms >= oldest_ms and end_ms - start_ms <= MAX_READ_BUCKETS * bucket_ms:
+                name = candidate
+                break
+        rollup = self.rollups[name]
+        bucket_ms = rollup.seconds * 1000
+
+        with self._lock:
+            slots = rollup.select(start_ms // bucket_ms, end_ms // bucket_ms)
+            events = int(rollup.events[slots].sum())
+            sessions = int(rollup.sessions[slots].sum())
+            duration = float(rollup.duration[slots].sum())
+            hours = rollup.hours[slots].sum(axis=0)
+            registers = rollup.registers[slots].max(axis=0) if len(slots) else np.zeros(HLL_REGISTERS, dtype=np.uint8)
+            courses: Counter = Counter()
+            for slot in slots.tolist():
+                courses.update(rollup.courses[slot])
+
+        return {
+            "activeUsers": int(round(hll_estimate(registers))) if len(slots) else 0,
+            "averageSessionDuration": round(duration / sessions / 60, 2) if sessions else 0.0,  # Minutes
+            "mostPopularCourses": [course for course, _ in courses.most_common(top_courses)],
+            "peakUsageHours": sorted(h for h in np.argsort(-hours, kind="stable")[:peak_hours].tolist() if hours[h]),
+            "events": events,
+            "sessions": sessions,
+            "granularity": name,
+            "buckets": int(len(slots))
+        }
+
+    # ---------- Persistence ----------
+
+    def save(self):
+        if not self.snapshot_path:
+            return
+        arrays = {}
+        with self._lock:
+            for name, rollup in self.rollups.items():
+                for field in ("starts", "events", "sessions", "duration", "hours", "registers"):
+                    arrays[f"{name}.{field}"] = getattr(rollup, field)
+                arrays[f"{name}.courses"] = np.array(json.dumps([dict(c) for c in rollup.courses]))
+            arrays["last_seen"] = np.array(json.dumps(self._last_seen))
+            try:
+                os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+                with open(self.snapshot_path + ".tmp", "wb") as f:
+                    np.savez_compressed(f, **arrays)
+                os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+            except OSError as e:
+                logger.error(f"Failed to save engagement rollups: {e}")
+
+    def load(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with np.load(self.snapshot_path) as data:
+                with self._lock:
+                    for name, rollup in self.rollups.items():
+                        if data[f"{name}.starts"].shape != rollup.starts.shape:
+                            continue  # Retention changed: start over
+                        for field in ("starts", "events", "sessions", "duration", "hours", "registers"):
+                            setattr(rollup, field, data[f"{name}.{field}"].copy())
+                        rollup.courses = [Counter(c) for c in json.loads(str(data[f"{name}.courses"]))]
+                    # Entries written before future timestamps were rejected must not move the clock ahead
+                    _, newest_ms = self._accepted_range()
+                    self._last_seen = {
+                        user: t for user, t in json.loads(str(data["last_seen"])).items() if t <= newest_ms
+                    }
+                    self._latest_ms = max(self._last_seen.values(), default=0)
+                    self.version += 1
+            logger.info(f"Loaded engagement rollups from {self.snapshot_path}")
+        except Exception as e:
+            logger.error(f"Failed to load engagement rollups: {e}")
+
+
+# Singleton instance
+engagement_rollups = EngagementRollups(
+    snapshot_path=settings.engagement_snapshot_path,
+    session_gap=settings.engagement_session_gap,
+    max_future_skew=settings.engagement_max_future_skew
+)
+
+# Rollups are updated with every ingested batch of learner events
+learning_event_store.register_ingest_listener(engagement_rollups.record)
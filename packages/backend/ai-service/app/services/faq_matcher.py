@@ -0,0 +1,191 @@
+from typing import List, Dict, Any, Optional, Tuple
+from app.config import settings
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Each entry matches when every keyword group has at least one phrase in the message.
+DEFAULT_FAQ_ENTRIES: List[Dict[str, Any]] = [
+    {
+        "id": "about",
+        "keywords": [["what", "qu'est-ce que"], ["lms", "platform", "plateforme"]],
+        "answer": "HAR Academy is a Learning Management System (LMS) that offers interactive courses in web development, data science, mobile development, and more.",
+        "confidence": 0.95,
+        "sources": ["About HAR Academy"]
+    },
+    {
+        "id": "enrollment",
+        "keywords": [["how", "comment"], ["enroll", "inscription", "register"]],
+        "answer": "To enroll in a course: 1) Browse the course catalog, 2) Click on a course you're interested in, 3) Click the 'Enroll' button, 4) Complete payment if required.",
+        "confidence": 0.92,
+        "sources": ["Enrollment Guide"]
+    },
+    {
+        "id": "pricing",
+        "keywords": [["price", "cost", "prix", "tarif"]],
+        "answer": "We offer three subscription plans: Basic (€9.99/month), Pro (€19.99/month), and Enterprise (€49.99/month). Individual courses can also be purchased separately.",
+        "confidence": 0.90,
+        "sources": ["Pricing Page"]
+    },
+    {
+        "id": "certificates",
+        "keywords": [["certificate", "certificat"]],
+        "answer": "Yes, you receive a certificate of completion after finishing a course with a passing grade. Certificates are verified and can be shared on LinkedIn.",
+        "confidence": 0.88,
+        "sources": ["Certificates FAQ"]
+    },
+    {
+        "id": "refund",
+        "keywords": [["refund", "remboursement"]],
+        "answer": "We offer a 14-day money-back guarantee for all course purchases. If you're not satisfied, you can request a full refund within 14 days.",
+        "confidence": 0.85,
+        "sources": ["Refund Policy"]
+    },
+    {
+        "id": "support",
+        "keywords": [["support", "aide", "help"]],
+        "answer": "You can get support through: 1) Our AI chatbot (this one!), 2) Course discussion forums, 3) Email support at support@har-academy.com, or 4) Live chat during business hours.",
+        "confidence": 0.87,
+        "sources": ["Support Options"]
+    },
+    {
+        "id": "video-download",
+        "keywords": [["video", "lecture", "cours"], ["download", "télécharger"]],
+        "answer": "Course videos are available for streaming only and cannot be downloaded. This protects instructor intellectual property. You have lifetime access to stream content.",
+        "confidence": 0.82,
+        "sources": ["Course Access FAQ"]
+    },
+]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class CompiledFAQ:
+    """
+    Immutable inverted index over FAQ keyword phrases.
+    Phrases are indexed by their first token, so a message is matched in a single
+    pass over its tokens regardless of how many entries the corpus holds.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]], version: int = 0):
+        self.entries = entries
+        self.version = version
+        self.full_masks: List[int] = []
+        self.index: Dict[str, List[Tuple[int, int, Tuple[str, ...]]]] = {}
+
+        for entry_idx, entry in enumerate(entries):
+            groups = entry.get("keywords") or []
+            if not groups:
+                raise ValueError(f"FAQ entry {entry.get('id', entry_idx)} has no keywords")
+            self.full_masks.append((1 << len(groups)) - 1)
+
+            for group_idx, phrases in enumerate(groups):
+                for phrase in phrases:
+                    tokens = tokenize(phrase)
+                    if not tokens:
+                        continue
+                    self.index.setdefault(tokens[0], []).append(
+                        (entry_idx, group_idx, tuple(tokens[1:]))
+                    )
+
+    def match(self, message: str) -> Optional[Dict[str, Any]]:
+        tokens = tokenize(message)
+        satisfied: Dict[int, int] = {}
+
+        for position, token in enumerate(tokens):
+            postings = self.index.get(token)
+            if not postings:
+                continue
+            for entry_idx, group_idx, tail in postings:
+                if tail and tuple(tokens[position + 1:position + 1 + len(tail)]) != tail:
+                    continue
+                satisfied[entry_idx] = satisfied.get(entry_idx, 0) | (1 << group_idx)
+
+        best_entry = None
+        best_score = None
+        for entry_idx, mask in satisfied.items():
+            if mask != self.full_masks[entry_idx]:
+                continue
+            entry = self.entries[entry_idx]
+            # More keyword groups = more specific entry; confidence breaks ties
+            score = (len(entry["keywords"]), entry.get("confidence", 0.0))
+            if best_score is None or score > best_score:
+                best_score = score
+                best_entry = entry
+
+        return best_entry
+
+
+class FAQMatcher:
+    """
+    FAQ matcher backed by a compiled corpus.
+    When `faq_corpus_path` is set, the corpus is loaded from that JSON file and
+    hot-reloaded (checked at most every `faq_reload_interval` seconds) when it changes.
+    """
+
+    def __init__(self, corpus_path: str = "", reload_interval: float = 5.0):
+        self.corpus_path = corpus_path
+        self.reload_interval = reload_interval
+        self._compiled = CompiledFAQ(DEFAULT_FAQ_ENTRIES)
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+        if corpus_path:
+            self._maybe_reload(force=True)
+
+    @property
+    def version(self) -> int:
+        return self._compiled.version
+
+    def _load_entries(self, path: str) -> List[Dict[str, Any]]:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data["entries"] if isinstance(data, dict) else data
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
+            return
+
+        with self._lock:
+            self._last_check = now
+            try:
+                mtime = os.stat(self.corpus_path).st_mtime
+            except OSError as e:
+                logger.error(f"FAQ corpus unavailable at {self.corpus_path}: {e}")
+                return
+
+            if not force and mtime == self._mtime:
+                return
+
+            try:
+                entries = self._load_entries(self.corpus_path)
+                self._compiled = CompiledFAQ(entries, version=self._compiled.version + 1)
+                self._mtime = mtime
+                logger.info(f"Loaded {len(entries)} FAQ entries from {self.corpus_path}")
+            except Exception as e:
+                # Keep serving the previous corpus
+                logger.error(f"Failed to reload FAQ corpus {self.corpus_path}: {e}")
+
+    def match(self, message: str) -> Optional[Dict[str, Any]]:
+        """Return the best matching FAQ entry for a message, if any"""
+        if self.corpus_path:
+            self._maybe_reload()
+        return self._compiled.match(message)
+
+
+# Singleton instance
+faq_matcher = FAQMatcher(
+    corpus_path=settings.faq_corpus_path,
+    reload_interval=settings.faq_reload_interval
+)
@@ -0,0 +1,307 @@
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from datetime import datetime
+from app.config import settings
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_COLUMNS = ["messageId", "userId", "helpful", "comment", "createdAt"]
+
+
+class FeedbackPipeline:
+    """
+    Batched, asynchronous ingestion of chatbot feedback.
+
+    Requests only enqueue into a bounded in-process queue. A background thread
+    drains it and writes one Parquet part file per batch, flushing when
+    `batch_size` records are pending or `flush_interval` seconds have passed.
+    When the queue is full, feedback is dropped (and counted) instead of blocking
+    the request, so callers can apply backpressure.
+
+    Parts are partitioned by the day the feedback was given
+    (`store_path/day=<createdAt date>/`), a batch spanning midnight being
+    split across days. Every
+    `compact_interval` seconds, the same thread merges the parts of each past
+    day into one, so the number of files (and the startup load) grows with
+    days, not batches. A day is swapped whole by directory renames, recovered
+    on start if interrupted.
+
+    Per-answer helpful rates are kept in memory for the `max_tracked_answers`
+    most recently rated answers; older ones report no stats.
+    """
+
+    def __init__(
+        self,
+        store_path: str,
+        max_queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        compact_interval: float = 3600.0,
+        max_tracked_answers: int = 100000
+    ):
+        self.store_path = store_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.max_tracked_answers = max_tracked_answers
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._part_seq = 0
+
+        # Per-answer aggregates: messageId -> [helpful_count, total_count], least recently rated first
+        self._aggregates: "OrderedDict[str, List[int]]" = OrderedDict()
+
+        self.accepted = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.batches = 0
+        self.flush_errors = 0
+        self.compacted_parts = 0
+        self.evicted_answers = 0
+        self.last_flush_at: Optional[str] = None
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        """Load existing aggregates and start the background flusher"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        os.makedirs(self.store_path, exist_ok=True)
+        self._recover_compactions()
+        self._load_aggregates()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="feedback-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush pending feedback and stop the background flusher"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _load_aggregates(self):
+        """Rebuild per-answer aggregates from the stored part files"""
+        parts = self._part_files()
+        if not parts:
+            return
+        try:
+            frame = pd.concat(
+                [pd.read_parquet(p, columns=["messageId", "helpful", "createdAt"]) for p in parts],
+                ignore_index=True
+            )
+            self._merge_aggregates(frame)
+            logger.info(f"Loaded feedback aggregates for {len(self._aggregates)} answers from {len(parts)} parts")
+        except Exception as e:
+            logger.error(f"Failed to load feedback aggregates: {e}")
+
+    def _day_dirs(self) -> List[str]:
+        if not os.path.isdir(self.store_path):
+            return []
+        return sorted(
+            name for name in os.listdir(self.store_path)
+            if name.startswith("day=") and "." not in name
+        )
+
+    def _part_files(self) -> List[str]:
+        """Parts of every day (and unpartitioned parts written by earlier versions)"""
+        if not os.path.isdir(self.store_path):
+            return []
+        directories = [self.store_path] + [os.path.join(self.store_path, day) for day in self._day_dirs()]
+        return sorted(
+            os.path.join(directory, name)
+            for directory in directories
+            for name in os.listdir(directory)
+            if name.endswith(".parquet")
+        )
+
+    # ---------- Compaction ----------
+
+    def _recover_compactions(self):
+        """Finish or roll back a day swap interrupted by a crash"""
+        for name in os.listdir(self.store_path):
+            path = os.path.join(self.store_path, name)
+            if name.endswith(".compacting"):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.endswith(".old"):
+                day_path = path[:-len(".old")]
+                if os.path.exists(day_path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.replace(path, day_path)
+
+    def compact(self):
+        """Merge the parts of every past day holding more than one into a single part"""
+        today = f"day={datetime.utcnow().date().isoformat()}"
+        for day in self._day_dirs():
+            if day >= today:
+                continue
+            day_path = os.path.join(self.store_path, day)
+            parts = sorted(name for name in os.listdir(day_path) if name.endswith(".parquet"))
+            if len(parts) < 2:
+                continue
+            try:
+                frame = pd.concat(
+                    [pd.read_parquet(os.path.join(day_path, name)) for name in parts],
+                    ignore_index=True
+                )
+                compacting_path = f"{day_path}.compacting"
+                shutil.rmtree(compacting_path, ignore_errors=True)
+                os.makedirs(compacting_path)
+                frame.to_parquet(os.path.join(compacting_path, f"feedback-{day[4:]}-compacted.parquet"), index=False)
+
+                # The old day directory is only removed once the compacted one is in place
+                os.replace(day_path, f"{day_path}.old")
+                os.replace(compacting_path, day_path)
+                shutil.rmtree(f"{day_path}.old", ignore_errors=True)
+            except Exception as e:
+                logger.error(f"Failed to compact feedback parts of {day}: {e}")
+                continue
+
+            with self._stats_lock:
+                self.compacted_parts += len(parts)
+            logger.info(f"Compacted {len(parts)} feedback parts of {day} ({len(frame)} records)")
+
+    # ---------- Ingestion ----------
+
+    def submit(self, message_id: str, user_id: str, helpful: bool, comment: Optional[str] = None) -> bool:
+        """Enqueue feedback without blocking. Returns False if it was dropped."""
+        record = {
+            "messageId": message_id,
+            "userId": user_id,
+            "helpful": bool(helpful),
+            "comment": comment,
+            "createdAt": datetime.utcnow()
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+
+        with self._stats_lock:
+            self.accepted += 1
+        return True
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        deadline = 0.0
+        next_compaction = time.monotonic()
+
+        while True:
+            try:
+                batch.append(self._queue.get(timeout=0.2))
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                if self._stop.is_set():
+                    # Queue drained: final flush before exiting
+                    if batch:
+                        self._flush(batch)
+                    return
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+
+            if self.compact_interval > 0 and time.monotonic() >= next_compaction:
+                self.compact()
+                next_compaction = time.monotonic() + self.compact_interval
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        frame = pd.DataFrame.from_records(batch, columns=FEEDBACK_COLUMNS)
+        written = 0
+
+        for day, records in frame.groupby(frame["createdAt"].dt.date, sort=True):
+            self._part_seq += 1
+            name = f"feedback-{int(time.time() * 1000)}-{os.getpid()}-{self._part_seq:06d}.parquet"
+            directory = os.path.join(self.store_path, f"day={day.isoformat()}")
+            path = os.path.join(directory, name)
+
+            try:
+                # Write then rename so readers never see partial part files
+                os.makedirs(directory, exist_ok=True)
+                records.to_parquet(path + ".tmp", index=False)
+                os.replace(path + ".tmp", path)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(records)} feedback records of {day}: {e}")
+                with self._stats_lock:
+                    self.flush_errors += 1
+                    self.dropped += len(records)
+                continue
+
+            self._merge_aggregates(records)
+            written += len(records)
+
+        if not written:
+            return
+        with self._stats_lock:
+            self.flushed += written
+            self.batches += 1
+            self.last_flush_at = datetime.utcnow().isoformat() + "Z"
+
+    def _merge_aggregates(self, frame: pd.DataFrame):
+        grouped = frame.groupby("messageId").agg(
+            helpful=("helpful", "sum"), total=("helpful", "count"), last=("createdAt", "max")
+        ).sort_values("last")
+        with self._stats_lock:
+            for message_id, helpful, total in zip(grouped.index, grouped["helpful"], grouped["total"]):
+                aggregate = self._aggregates.setdefault(message_id, [0, 0])
+                aggregate[0] += int(helpful)
+                aggregate[1] += int(total)
+                self._aggregates.move_to_end(message_id)
+            while len(self._aggregates) > self.max_tracked_answers:
+                self._aggregates.popitem(last=False)
+                self.evicted_answers += 1
+
+    # ---------- Queries ----------
+
+    def get_answer_stats(self, message_id: str) -> Dict[str, Any]:
+        """Helpful rate for one answer (flushed feedback only)"""
+        with self._stats_lock:
+            helpful, total = self._aggregates.get(message_id, (0, 0))
+        return {
+            "messageId": message_id,
+            "helpfulCount": helpful,
+            "totalCount": total,
+            "helpfulRate": round(helpful / total, 4) if total else None
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "accepted": self.accepted,
+                "dropped": self.dropped,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "flushErrors": self.flush_errors,
+                "compactedParts": self.compacted_parts,
+                "queueDepth": self._queue.qsize(),
+                "queueCapacity": self._queue.maxsize,
+                "answersTracked": len(self._aggregates),
+                "answersEvicted": self.evicted_answers,
+                "lastFlushAt": self.last_flush_at
+            }
+
+
+# Singleton instance
+feedback_pipeline = FeedbackPipeline(
+    store_path=settings.feedback_store_path,
+    max_queue_size=settings.feedback_queue_size,
+    batch_size=settings.feedback_batch_size,
+    flush_interval=settings.feedback_flush_interval,
+    compact_interval=settings.feedback_compact_interval,
+    max_tracked_answers=settings.feedback_max_tracked_answers
+)
@@ -0,0 +1,199 @@
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from app.config import settings
+from app.services.answer_assembler import STOP_WORDS
+import numpy as np
+import threading
+import time
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_STOP_WORDS = frozenset(STOP_WORDS)
+
+
+class _ConversationContext:
+    """Chunks retrieved for a conversation's last standalone question"""
+
+    def __init__(self, course_id: str, question: str, embedding: np.ndarray, docs: List[Dict[str, Any]]):
+        self.course_id = course_id
+        self.question = question
+        self.docs = docs
+        # Normalized rows: the anchor question, then every chunk of the pool (order-independent)
+        self.matrix = np.vstack([embedding] + [FollowUpContextCache._normalize(doc["embedding"]) for doc in docs])
+        self.touched_at = time.monotonic()
+
+
+class FollowUpContextCache:
+    """
+    Per-conversation cache of the chunks retrieved for the last turn.
+
+    Fresh retrievals fetch a slightly larger pool than needed, with embeddings.
+    A follow-up question in the same conversation is answered from that pool:
+    - elliptic follow-ups ("and why?", "pourquoi ?") with no content words keep
+      the previous ranking, and are assembled against the anchor question too;
+    - other questions are re-ranked against the pool when their best cosine
+      similarity with the anchor question or a pooled chunk reaches the
+      threshold; below it the question has drifted and goes back to the index.
+    Entries expire after a short TTL and the number of conversations is LRU-bounded.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        pool_size: int = 8,
+        ttl_seconds: int = 600,
+        max_conversations: int = 5000,
+        enabled: bool = True
+    ):
+        self.threshold = threshold
+        self.pool_size = pool_size
+        self.ttl_seconds = ttl_seconds
+        self.max_conversations = max_conversations
+        self.enabled = enabled
+        self._contexts: "OrderedDict[str, _ConversationContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.drifted = 0
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _public_copy(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a pooled chunk without its embedding (the metadata dict is copied, not shared)"""
+        copied = {k: v for k, v in doc.items() if k != "embedding"}
+        if isinstance(copied.get("metadata"), dict):
+            copied["metadata"] = dict(copied["metadata"])
+        return copied
+
+    @staticmethod
+    def is_elliptic(message: str) -> bool:
+        """True for follow-ups made only of stop-words, which cannot be retrieved on their own"""
+        words = re.findall(r"\w+", message.lower())
+        return not any(word not in _STOP_WORDS and len(word) > 1 for word in words)
+
+    def _get(self, conversation_id: str, course_id: str) -> Optional[_ConversationContext]:
+        """Live context for the conversation and course (caller holds the lock)"""
+        context = self._contexts.get(conversation_id)
+        if context is None:
+            return None
+        if time.monotonic() - context.touched_at > self.ttl_seconds or context.course_id != course_id:
+            del self._contexts[conversation_id]
+            return None
+        return context
+
+    def has_context(self, conversation_id: Optional[str], course_id: str) -> bool:
+        if not self.enabled or not conversation_id:
+            return False
+        with self._lock:
+            return self._get(conversation_id, course_id) is not None
+
+    def lookup(
+        self,
+        conversation_id: Optional[str],
+        course_id: str,
+        message: str,
+        embedding: Optional[np.ndarray],
+        top_k: int = 3
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Chunks for a follow-up question, or None when the index must be searched.
+        Returns {"docs": [...], "question": <text to assemble the answer against>}.
+        """
+        if not self.enabled or not conversation_id:
+            return None
+
+        with self._lock:
+            context = self._get(conversation_id, course_id)
+            if context is None:
+                return None
+
+            if self.is_elliptic(message):
+                docs = context.docs[:top_k]
+                question = f"{context.question} {message}"
+            else:
+                if embedding is None:
+                    return None
+                query = self._normalize(embedding)
+                if float((context.matrix @ query).max()) < self.threshold:
+                    self.drifted += 1
+                    return None
+                pool = np.vstack([doc["embedding"] for doc in context.docs])
+                raw = np.asarray(embedding, dtype=np.float32).ravel()
+                # Same squared L2 distance as the index reports
+                distances = np.einsum("ij,ij->i", pool - raw, pool - raw)
+                order = np.argsort(distances, kind="stable")
+                # The re-ranked pool and this question become the reference for the next follow-up
+                context.docs = [dict(context.docs[i], distance=float(distances[i])) for i in order]
+                context.matrix[0] = query
+                context.question = message
+                docs = context.docs[:top_k]
+                question = message
+
+            context.touched_at = time.monotonic()
+            self._contexts.move_to_end(conversation_id)
+            self.reused += 1
+
+        return {
+            "docs": [self._public_copy(doc) for doc in docs],
+            "question": question
+        }
+
+    def store(
+        self,
+        conversation_id: Optional[str],
+        course_id: str,
+        question: str,
+        embedding: Optional[np.ndarray],
+        docs: List[Dict[str, Any]]
+    ):
+        """Remember the pool retrieved for a standalone question (docs must carry embeddings)"""
+        if not self.enabled or not conversation_id or embedding is None:
+            return
+        pool = [doc for doc in docs if doc.get("embedding") is not None]
+        if not pool:
+            return
+
+        context = _ConversationContext(
+            course_id,
+            question,
+            self._normalize(embedding),
+            [dict(doc, embedding=np.asarray(doc["embedding"], dtype=np.float32).ravel()) for doc in pool]
+        )
+        with self._lock:
+            self._contexts[conversation_id] = context
+            self._contexts.move_to_end(conversation_id)
+            while len(self._contexts) > self.max_conversations:
+                self._contexts.popitem(last=False)
+
+    def invalidate_course(self, course_id: str):
+        """Drop contexts built from a course's previous content"""
+        with self._lock:
+            stale = [cid for cid, context in self._contexts.items() if context.course_id == course_id]
+            for conversation_id in stale:
+                del self._contexts[conversation_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "conversations": len(self._contexts),
+                "reused": self.reused,
+                "drifted": self.drifted,
+                "threshold": self.threshold
+            }
+
+
+# Singleton instance
+followup_context_cache = FollowUpContextCache(
+    threshold=settings.followup_context_threshold,
+    pool_size=settings.followup_context_pool_size,
+    ttl_seconds=settings.followup_context_ttl,
+    max_conversations=settings.followup_context_max_conversations,
+    enabled=settings.followup_context_enabled
+)
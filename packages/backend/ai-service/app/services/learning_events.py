@@ -0,0 +1,465 @@
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from collections import OrderedDict
+from datetime import datetime, date, timedelta, timezone
+from app.config import settings
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ["lesson_view", "quiz_score", "time_spent"]
+LESSON_VIEW, QUIZ_SCORE, TIME_SPENT = range(len(EVENT_TYPES))
+NO_LESSON = 0  # Lesson code of events without a lessonId
+
+# Column dtypes of a partition
+COLUMNS = {
+    "ts": np.int64,  # Milliseconds since the epoch (UTC)
+    "user": np.int32,  # Codes of _Codes
+    "lesson": np.int32,  # Codes of _Codes, NO_LESSON for events without a lessonId
+    "type": np.int8,  # Index in EVENT_TYPES
+    "score": np.float32,  # Quiz score in [0, 1], NaN for other events
+    "duration": np.float32,  # Seconds
+    "completed": np.bool_
+}
+
+PartitionKey = Tuple[str, date]  # (course ID, UTC day)
+
+
+def to_utc(timestamp: datetime) -> datetime:
+    """Timestamp as an aware UTC datetime (naive timestamps are UTC)"""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def to_utc_ms(timestamp: Optional[datetime]) -> int:
+    if timestamp is None:
+        return int(time.time() * 1000)
+    return int(to_utc(timestamp).timestamp() * 1000)
+
+
+def _day_of(ms: int) -> date:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).date()
+
+
+class _Codes:
+    """Dictionary encoding of user and lesson IDs into int32 codes"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode_many(self, values: pd.Series) -> np.ndarray:
+        """Codes of a column (factorized first, so each distinct value is looked up once)"""
+        indices, uniques = pd.factorize(values)
+        return np.array([self.encode(v) for v in uniques], dtype=np.int32)[indices]
+
+
+class _Partition:
+    """Events of one course and day: consolidated column arrays plus appended rows"""
+
+    __slots__ = ("arrays", "pending")
+
+    def __init__(self):
+        self.arrays: Dict[str, np.ndarray] = {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        self.pending: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.arrays["ts"]) + len(self.pending)
+
+    def consolidate(self) -> Dict[str, np.ndarray]:
+        """Column arrays of every row. Arrays are replaced, never mutated, so callers may keep them."""
+        if self.pending:
+            rows = list(zip(*self.pending))
+            self.arrays = {
+                name: np.concatenate([self.arrays[name], np.asarray(values, dtype=dtype)])
+                for (name, dtype), values in zip(COLUMNS.items(), rows)
+            }
+            self.pending = []
+        return self.arrays
+
+    def drop_first(self, count: int):
+        arrays = self.consolidate()
+        self.arrays = {name: values[count:] for name, values in arrays.items()}
+
+
+class LearningEventStore:
+    """
+    In-memory columnar store of learner events (lesson views, quiz scores,
+    time spent), partitioned by course and UTC day.
+
+    Ingestion appends rows to the partition under a lock; rows are turned into
+    NumPy column arrays when a partition is first queried or spilled. Queries
+    select partitions by course, day range and user, then aggregate with
+    vectorized masks. Users are indexed to their in-memory partitions and to
+    the spilled parts holding their events (the users of a part found on disk
+    at startup are read, from its userId column only, the first time a user
+    query covers it), so per-user queries only decode the parts they need.
+
+    Partitions older than `hot_days` are spilled by a background thread to
+    Parquet part files (`store_path/course=<id>/day=<date>/`), and every
+    partition is spilled on shutdown. Spilled parts are read back for queries
+    covering their days, through a small cache of decoded parts.
+    """
+
+    def __init__(
+        self,
+        store_path: str,
+        hot_days: int = 7,
+        spill_interval: float = 60.0,
+        cold_cache_parts: int = 256
+    ):
+        self.store_path = store_path
+        self.hot_days = hot_days
+        self.spill_interval = spill_interval
+        self.cold_cache_parts = cold_cache_parts
+        self._partitions: Dict[PartitionKey, _Partition] = {}
+        self._user_partitions: Dict[int, set] = {}
+        self._disk_parts: Dict[PartitionKey, List[str]] = {}
+        self._part_users: Dict[str, np.ndarray] = {}  # Part path -> sorted codes of its users
+        self._cold_cache: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+        self._users = _Codes()
+        self._lessons = _Codes()
+        self._lessons.encode("")  # NO_LESSON
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._part_seq = 0
+        self._ingest_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+        self.ingested = 0
+        self.spilled = 0
+        self.spill_errors = 0
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        """Index spilled parts and start the background spiller"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._scan_disk_parts()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="learning-events-spiller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the spiller and spill every in-memory partition"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.spill(older_than=None)
+
+    def _run(self):
+        while not self._stop.wait(self.spill_interval):
+            self.spill(older_than=datetime.now(timezone.utc).date() - timedelta(days=self.hot_days))
+
+    def _scan_disk_parts(self):
+        if not os.path.isdir(self.store_path):
+            return
+        parts: Dict[PartitionKey, List[str]] = {}
+        for course_dir in os.listdir(self.store_path):
+            if not course_dir.startswith("course="):
+                continue
+            for day_dir in os.listdir(os.path.join(self.store_path, course_dir)):
+                try:
+                    day = date.fromisoformat(day_dir[len("day="):])
+                except ValueError:
+                    continue
+                directory = os.path.join(self.store_path, course_dir, day_dir)
+                paths = sorted(
+                    os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".parquet")
+                )
+                if paths:
+                    parts[(course_dir[len("course="):], day)] = paths
+        with self._lock:
+            for key, paths in parts.items():
+                self._disk_parts[key] = sorted(set(self._disk_parts.get(key, [])) | set(paths))
+        logger.info(f"Indexed {sum(len(p) for p in parts.values())} spilled learning event parts")
+
+    # ---------- Ingestion ----------
+
+    def register_ingest_listener(self, callback: Callable[[List[Dict[str, Any]]], None]):
+        """Register a callback invoked with every batch of ingested events"""
+        self._ingest_listeners.append(callback)
+
+    def ingest(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Append events: dicts with type, userId, courseId, lessonId and optional
+        timestamp, score, durationSeconds, completed. Returns the number stored.
+        """
+        rows = []
+        for event in events:
+            ts = to_utc_ms(event.get("timestamp"))
+            score = event.get("score")
+            rows.append((
+                (event["courseId"], _day_of(ts)),
+                ts,
+                event["userId"],
+                event.get("lessonId") or "",
+                EVENT_TYPES.index(event["type"]),
+                np.nan if score is None else float(score),
+                float(event.get("durationSeconds") or 0.0),
+                bool(event.get("completed", False))
+            ))
+
+        with self._lock:
+            for key, ts, user_id, lesson_id, event_type, score, duration, completed in rows:
+                partition = self._partitions.get(key)
+                if partition is None:
+                    partition = self._partitions[key] = _Partition()
+                user = self._users.encode(user_id)
+                partition.pending.append((ts, user, self._lessons.encode(lesson_id), event_type, score, duration, completed))
+                self._user_partitions.setdefault(user, set()).add(key)
+            self.ingested += len(rows)
+
+        for callback in self._ingest_listeners:
+            try:
+                callback(events)
+            except Exception as e:
+                logger.error(f"Learning event listener failed: {e}")
+        return len(rows)
+
+    # ---------- Spilling ----------
+
+    def spill(self, older_than: Optional[date]):
+        """Write partitions of days before `older_than` (all if None) to Parquet and drop them from memory"""
+        with self._lock:
+            keys = [k for k in self._partitions if older_than is None or k[1] < older_than]
+            snapshots = [(k, self._partitions[k], self._partitions[k].consolidate()) for k in keys]
+
+        for key, partition, arrays in snapshots:
+            count = len(arrays["ts"])
+            if not count:
+                continue
+            course_id, day = key
+            directory = os.path.join(self.store_path, f"course={course_id}", f"day={day.isoformat()}")
+            self._part_seq += 1
+            path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._part_seq:06d}.parquet")
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._to_frame(arrays).to_parquet(path + ".tmp", index=False)
+            except Exception as e:
+                logger.error(f"Failed to spill learning events of {course_id} on {day}: {e}")
+                self.spill_errors += 1
+                continue
+
+            with self._lock:
+                # Published and dropped from memory together, so queries never count rows twice
+                os.replace(path + ".tmp", path)
+                self._disk_parts.setdefault(key, []).append(path)
+                self._part_users[path] = np.unique(arrays["user"])
+                if len(partition) == count:
+                    del self._partitions[key]
+                else:
+                    # Rows appended while writing stay in memory
+                    partition.drop_first(count)
+                self.spilled += count
+
+    def _to_frame(self, arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+        users = np.array(self._users.values, dtype=object)
+        lessons = np.array(self._lessons.values, dtype=object)
+        return pd.DataFrame({
+            "timestamp": pd.to_datetime(arrays["ts"], unit="ms"),
+            "userId": pd.Categorical(users[arrays["user"]]),
+            "lessonId": pd.Categorical(lessons[arrays["lesson"]]),
+            "type": pd.Categorical.from_codes(arrays["type"], categories=EVENT_TYPES),
+            "score": arrays["score"],
+            "durationSeconds": arrays["duration"],
+            "completed": arrays["completed"]
+        })
+
+    def _read_part(self, path: str) -> Dict[str, np.ndarray]:
+        """Column arrays of a spilled part (parts are immutable, so they are cached by path)"""
+        with self._lock:
+            arrays = self._cold_cache.get(path)
+            if arrays is not None:
+                self._cold_cache.move_to_end(path)
+                return arrays
+
+        frame = pd.read_parquet(path)
+        with self._lock:
+            arrays = {
+                "ts": frame["timestamp"].to_numpy(dtype="datetime64[ms]").astype(np.int64),
+                "user": self._users.encode_many(frame["userId"].astype(str)),
+                "lesson": self._lessons.encode_many(frame["lessonId"].astype(str)),
+                "type": pd.Categorical(frame["type"], categories=EVENT_TYPES).codes.astype(np.int8),
+                "score": frame["score"].to_numpy(dtype=np.float32),
+                "duration": frame["durationSeconds"].to_numpy(dtype=np.float32),
+                "completed": frame["completed"].to_numpy(dtype=np.bool_)
+            }
+            self._cold_cache[path] = arrays
+            self._part_users.setdefault(path, np.unique(arrays["user"]))
+            while len(self._cold_cache) > self.cold_cache_parts:
+                self._cold_cache.popitem(last=False)
+        return arrays
+
+    def _users_of_part(self, path: str) -> np.ndarray:
+        """Sorted codes of the users with events in a spilled part"""
+        with self._lock:
+            users = self._part_users.get(path)
+        if users is None:
+            frame = pd.read_parquet(path, columns=["userId"])
+            with self._lock:
+                users = self._part_users[path] = np.unique(self._users.encode_many(frame["userId"].astype(str)))
+        return users
+
+    def _parts_with_user(self, paths: List[str], user_id: str) -> List[str]:
+        """Spilled parts (among `paths`) holding events of a user"""
+        part_users = [(path, self._users_of_part(path)) for path in paths]
+        # Looked up after the parts' users are encoded: a user may only have spilled events
+        with self._lock:
+            code = self._users.codes.get(user_id)
+        if code is None:
+            return []
+        selected = []
+        for path, users in part_users:
+            i = int(np.searchsorted(users, code))
+            if i < len(users) and users[i] == code:
+                selected.append(path)
+        return selected
+
+    # ---------- Queries ----------
+
+    def _select(
+        self,
+        user_id: Optional[str],
+        course_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> Dict[str, np.ndarray]:
+        """Columns of the events matching the filters"""
+        start_ms = to_utc_ms(start) if start else None
+        end_ms = to_utc_ms(end) if end else None
+        first_day = _day_of(start_ms) if start_ms is not None else None
+        last_day = _day_of(end_ms) if end_ms is not None else None
+
+        def in_range(key: PartitionKey) -> bool:
+            return (
+                (course_id is None or key[0] == course_id)
+                and (first_day is None or key[1] >= first_day)
+                and (last_day is None or key[1] <= last_day)
+            )
+
+        with self._lock:
+            if user_id is not None:
+                memory_keys = self._user_partitions.get(self._users.codes.get(user_id), set())
+            else:
+                memory_keys = self._partitions.keys()
+            chunks = [self._partitions[k].consolidate() for k in memory_keys if k in self._partitions and in_range(k)]
+            disk_paths = [p for k, paths in self._disk_parts.items() if in_range(k) for p in paths]
+
+        if user_id is not None:
+            disk_paths = self._parts_with_user(disk_paths, user_id)
+        chunks.extend(self._read_part(path) for path in disk_paths)
+        if not chunks:
+            return {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        columns = {name: np.concatenate([c[name] for c in chunks]) for name in COLUMNS}
+
+        mask = np.ones(len(columns["ts"]), dtype=bool)
+        if user_id is not None:
+            mask &= columns["user"] == self._users.codes.get(user_id, -1)
+        if start_ms is not None:
+            mask &= columns["ts"] >= start_ms
+        if end_ms is not None:
+            mask &= columns["ts"] <= end_ms
+        return {name: values[mask] for name, values in columns.items()}
+
+    def get_events(
+        self,
+        user_id: Optional[str] = None,
+        course_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, np.ndarray]:
+        """Column arrays of the matching events (users and lessons as int32 codes, see `user_ids`)"""
+        return self._select(user_id, course_id, start, end)
+
+    def user_codes(self, user_ids: List[str]) -> np.ndarray:
+        """Codes of user IDs (-1 for users without events)"""
+        with self._lock:
+            return np.array([self._users.codes.get(u, -1) for u in user_ids], dtype=np.int32)
+
+    def user_ids(self, codes: np.ndarray) -> List[str]:
+        """User IDs of codes returned by `get_events`"""
+        with self._lock:
+            values = self._users.values
+            return [values[code] for code in codes.tolist()]
+
+    def get_performance(
+        self,
+        user_id: Optional[str] = None,
+        course_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Completion rate (lessons completed / lessons viewed), average quiz score,
+        time spent, and average quiz score per lesson, for a user and/or course
+        over a date range.
+        """
+        columns = self._select(user_id, course_id, start, end)
+        lessons, types = columns["lesson"], columns["type"]
+        has_lesson = lessons != NO_LESSON
+
+        viewed = np.unique(lessons[(types == LESSON_VIEW) & has_lesson])
+        completed = np.unique(lessons[columns["completed"] & has_lesson])
+        lessons_seen = np.union1d(viewed, completed)
+
+        quiz = types == QUIZ_SCORE
+        scores = columns["score"][quiz]
+        scores_valid = ~np.isnan(scores)
+        lesson_scores: Dict[str, float] = {}
+        if scores_valid.any():
+            quiz_lessons, inverse = np.unique(lessons[quiz][scores_valid], return_inverse=True)
+            sums = np.bincount(inverse, weights=scores[scores_valid])
+            counts = np.bincount(inverse)
+            lesson_scores = {
+                self._lessons.values[code]: round(float(total / n), 4)
+                for code, total, n in zip(quiz_lessons.tolist(), sums, counts)
+                if code != NO_LESSON
+            }
+
+        return {
+            "events": int(len(types)),
+            "lessonsViewed": int(len(lessons_seen)),
+            "lessonsCompleted": int(len(completed)),
+            "completionRate": round(len(completed) / len(lessons_seen), 4) if len(lessons_seen) else 0.0,
+            "quizzesTaken": int(scores_valid.sum()),
+            "averageScore": round(float(scores[scores_valid].mean()), 4) if scores_valid.any() else 0.0,
+            "timeSpentSeconds": float(columns["duration"].sum()),
+            "lessonScores": lesson_scores
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ingested": self.ingested,
+                "spilled": self.spilled,
+                "spillErrors": self.spill_errors,
+                "memoryPartitions": len(self._partitions),
+                "memoryEvents": sum(len(p) for p in self._partitions.values()),
+                "diskParts": sum(len(p) for p in self._disk_parts.values()),
+                "users": len(self._users.values),
+                "lessons": len(self._lessons.values) - 1
+            }
+
+
+# Singleton instance
+learning_event_store = LearningEventStore(
+    store_path=settings.learning_events_path,
+    hot_days=settings.learning_events_hot_days,
+    spill_interval=settings.learning_events_spill_interval
+)
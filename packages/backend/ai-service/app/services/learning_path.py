@@ -0,0 +1,308 @@
+from typing import List, Dict, Any, Optional, Set, FrozenSet, Iterable
+from app.config import settings
+from app.services.backend_client import backend_client
+import asyncio
+import heapq
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+LEVELS = {"beginner": 1, "intermediate": 2, "advanced": 3}
+LEVEL_NAMES = {value: name.capitalize() for name, value in LEVELS.items()}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _course_id(value: Any) -> Optional[str]:
+    """ID of a course reference (plain ID or populated document)"""
+    if isinstance(value, dict):
+        value = value.get("_id", value.get("id"))
+    return str(value) if value else None
+
+
+def _course_level(course: Dict[str, Any]) -> int:
+    level = course.get("level", course.get("difficultyLevel", course.get("difficulty_level")))
+    return LEVELS.get(str(level or "beginner").lower(), 1)
+
+
+def _course_duration(course: Dict[str, Any]) -> float:
+    duration = course.get("total_duration_hours", course.get("duration", 0))
+    try:
+        return max(float(duration or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _course_terms(course: Dict[str, Any]) -> Set[str]:
+    parts = [course.get("title") or "", course.get("domain") or ""]
+    for field in ("stack", "keywords", "tags"):
+        values = course.get(field) or []
+        parts.extend(values if isinstance(values, list) else [values])
+    return set(TOKEN_PATTERN.findall(" ".join(str(p) for p in parts).lower()))
+
+
+class CourseGraph:
+    """
+    Compiled prerequisite DAG of the course catalog (immutable).
+
+    A course requires all its declared prerequisites and, unless one of them is
+    a lower-level course of its domain, any one course of the level below in
+    its domain. Cyclic declared prerequisites are dropped. Built once per
+    catalog refresh: topological order, ancestor sets, the term index used to
+    find target courses and the shortest-duration plan of every course, so a
+    request only searches the target's ancestors when the user has completed
+    some of them.
+    """
+
+    def __init__(self, courses: List[Dict[str, Any]], version: int = 0):
+        self.version = version
+        self.courses: Dict[str, Dict[str, Any]] = {}
+        terms: Dict[str, Set[str]] = {}
+        for course in courses:
+            course_id = _course_id(course)
+            if not course_id:
+                continue
+            self.courses[course_id] = {
+                "courseId": course_id,
+                "title": course.get("title", "Unknown Course"),
+                "domain": course.get("domain"),
+                "level": _course_level(course),
+                "duration": _course_duration(course)
+            }
+            terms[course_id] = _course_terms(course)
+
+        self.term_index: Dict[str, List[str]] = {}
+        for course_id, course_terms in terms.items():
+            for term in course_terms:
+                self.term_index.setdefault(term, []).append(course_id)
+
+        self.requires_all: Dict[str, List[str]] = {
+            course_id: [
+                p for p in dict.fromkeys(_course_id(p) for p in course.get("prerequisites") or [])
+                if p in self.courses and p != course_id
+            ]
+            for course in courses
+            if (course_id := _course_id(course)) in self.courses
+        }
+        self.order = self._topological_order()
+        self.position = {course_id: i for i, course_id in enumerate(self.order)}
+        for options in self.requires_any.values():
+            options.sort(key=lambda p: (self.courses[p]["duration"], self.position[p]))
+
+        self.ancestors: Dict[str, FrozenSet[str]] = {}
+        for course_id in self.order:
+            ancestors = set()
+            for p in self.requires_all[course_id] + self.requires_any[course_id]:
+                ancestors.add(p)
+                ancestors |= self.ancestors[p]
+            self.ancestors[course_id] = frozenset(ancestors)
+
+        # Courses below each level (known to users at that level), and the plans of every course for them
+        self.below_level: Dict[int, FrozenSet[str]] = {
+            level: frozenset(c for c, course in self.courses.items() if course["level"] < level)
+            for level in LEVEL_NAMES
+        }
+        self.plans = {level: self._plan(self.order, known) for level, known in self.below_level.items()}
+        self.plan_durations = {
+            level: {c: self.duration(plan) for c, plan in plans.items()} for level, plans in self.plans.items()
+        }
+
+    def _level_options(self, course_id: str, by_domain_level: Dict[tuple, List[str]]) -> List[str]:
+        """Courses of the level below in the domain, unless a declared prerequisite is one"""
+        course = self.courses[course_id]
+        for p in self.requires_all[course_id]:
+            if self.courses[p]["domain"] == course["domain"] and self.courses[p]["level"] < course["level"]:
+                return []
+        return list(by_domain_level.get((course["domain"], course["level"] - 1), []))
+
+    def _topological_order(self) -> List[str]:
+        """
+        Kahn's algorithm over declared and level prerequisites, easiest and
+        shortest courses first. Declared prerequisites of courses left in a
+        cycle are dropped (level prerequisites alone cannot form one).
+        """
+        by_domain_level: Dict[tuple, List[str]] = {}
+        for course_id, course in self.courses.items():
+            by_domain_level.setdefault((course["domain"], course["level"]), []).append(course_id)
+        key = lambda c: (self.courses[c]["level"], self.courses[c]["duration"], c)
+
+        while True:
+            self.requires_any = {c: self._level_options(c, by_domain_level) for c in self.courses}
+            dependents: Dict[str, List[str]] = {course_id: [] for course_id in self.courses}
+            pending: Dict[str, int] = {}
+            for course_id in self.courses:
+                prerequisites = self.requires_all[course_id] + self.requires_any[course_id]
+                pending[course_id] = len(prerequisites)
+                for p in prerequisites:
+                    dependents[p].append(course_id)
+
+            ready = [key(c) for c, n in pending.items() if n == 0]
+            heapq.heapify(ready)
+            order = []
+            while ready:
+                course_id = heapq.heappop(ready)[2]
+                order.append(course_id)
+                for dependent in dependents[course_id]:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        heapq.heappush(ready, key(dependent))
+
+            if len(order) == len(self.courses):
+                return order
+            cyclic = set(self.courses) - set(order)
+            logger.warning(f"Dropping cyclic prerequisites of {len(cyclic)} courses")
+            for course_id in cyclic:
+                self.requires_all[course_id] = [p for p in self.requires_all[course_id] if p not in cyclic]
+
+    def _plan(
+        self,
+        course_ids: Iterable[str],
+        known: FrozenSet[str],
+        base_level: Optional[int] = None
+    ) -> Dict[str, FrozenSet[str]]:
+        """
+        Courses to take for each given course (itself included), skipping known
+        ones, choosing the shortest option of every "any one" requirement.
+        `course_ids` must be in topological order; plans of prerequisites not
+        among them are the precomputed ones of `base_level`.
+        """
+        plans: Dict[str, FrozenSet[str]] = {}
+        durations: Dict[str, float] = {}
+        base_plans = self.plans[base_level] if base_level else {}
+        base_durations = self.plan_durations[base_level] if base_level else {}
+        lookup = lambda p: plans[p] if p in plans else base_plans[p]
+        lookup_duration = lambda p: durations[p] if p in durations else base_durations[p]
+        for course_id in course_ids:
+            if course_id in known:
+                plans[course_id], durations[course_id] = frozenset(), 0.0
+                continue
+            plan = {course_id}
+            for p in self.requires_all[course_id]:
+                plan |= lookup(p)
+            options = self.requires_any[course_id]
+            if options and not any(p in known for p in options):
+                # Added duration of an option: its plan minus what is already planned
+                best = min(options, key=lambda p: lookup_duration(p) - self.duration(lookup(p) & plan))
+                plan |= lookup(best)
+            plans[course_id], durations[course_id] = frozenset(plan), self.duration(plan)
+        return plans
+
+    def duration(self, course_ids: Iterable[str]) -> float:
+        return sum(self.courses[c]["duration"] for c in course_ids)
+
+    def find_targets(self, skill: str) -> List[str]:
+        """Courses matching the most terms of the skill"""
+        matches: Dict[str, int] = {}
+        for term in set(TOKEN_PATTERN.findall(skill.lower())):
+            for course_id in self.term_index.get(term, ()):
+                matches[course_id] = matches.get(course_id, 0) + 1
+        if not matches:
+            return []
+        best = max(matches.values())
+        return [course_id for course_id, n in matches.items() if n == best]
+
+    def plan(self, target: str, level: int = 1, completed: FrozenSet[str] = frozenset()) -> List[str]:
+        """
+        Courses to take to complete the target, in topological order, for a
+        user at `level` who completed the `completed` courses.
+        """
+        if completed.isdisjoint(self.ancestors[target]) and target not in completed:
+            plan = self.plans[level][target]
+        else:
+            # Only the target's ancestors depending on a completed course are searched again
+            course_ids = sorted(
+                (
+                    c for c in self.ancestors[target] | {target}
+                    if c in completed or not completed.isdisjoint(self.ancestors[c])
+                ),
+                key=self.position.__getitem__
+            )
+            plan = self._plan(course_ids, self.below_level[level] | completed, level)[target]
+        return sorted(plan, key=self.position.__getitem__)
+
+
+class LearningPathService:
+    """
+    Learning paths over the course prerequisite graph.
+    The graph is compiled from the published catalog and refreshed at most
+    every `refresh_interval` seconds (the previous graph is kept if the
+    catalog cannot be fetched); requests only run the search. In multi-worker
+    deployments the catalog is supplied by the shared data instead.
+    """
+
+    def __init__(self, refresh_interval: float = 600.0, catalog_limit: int = 1000):
+        self.refresh_interval = refresh_interval
+        self.catalog_limit = catalog_limit
+        self._graph: Optional[CourseGraph] = None
+        self._built_at = 0.0
+        self._pinned = False  # Catalog supplied by use_catalog, never fetched
+        self._lock = asyncio.Lock()
+
+    def use_catalog(self, courses: List[Dict[str, Any]], version: int):
+        """Serve a graph of this catalog from now on instead of fetching it from the backend"""
+        self._graph = CourseGraph(courses, version)
+        self._pinned = True
+        logger.info(f"Built course graph v{version} with {len(self._graph.courses)} courses from shared data")
+
+    async def get_graph(self) -> Optional[CourseGraph]:
+        if self._graph is not None and (self._pinned or time.monotonic() - self._built_at < self.refresh_interval):
+            return self._graph
+
+        async with self._lock:
+            if self._graph is not None and (self._pinned or time.monotonic() - self._built_at < self.refresh_interval):
+                return self._graph
+            courses = await backend_client.get_courses(status="published", limit=self.catalog_limit)
+            self._built_at = time.monotonic()
+            if courses:
+                version = self._graph.version + 1 if self._graph else 1
+                self._graph = await asyncio.to_thread(CourseGraph, courses, version)
+                logger.info(f"Built course graph v{version} with {len(self._graph.courses)} courses")
+            else:
+                logger.warning("Course catalog unavailable, keeping the previous course graph")
+            return self._graph
+
+    async def get_path(self, user_id: str, target_skill: str, current_level: str = "beginner") -> Optional[Dict[str, Any]]:
+        """
+        Shortest-duration path to the most advanced course matching the skill,
+        skipping completed courses and courses below the user's current level.
+        None if no course matches.
+        """
+        graph, enrollments = await asyncio.gather(
+            self.get_graph(),
+            backend_client.get_user_enrollments(user_id)
+        )
+        if graph is None:
+            return None
+        targets = graph.find_targets(target_skill)
+        if not targets:
+            return None
+
+        level = LEVELS.get(current_level.lower(), 1)
+        completed = frozenset(
+            course_id for e in enrollments
+            if (e.get("status") == "completed" or e.get("completed"))
+            and (course_id := _course_id(e.get("course", e.get("courseId", e.get("course_id")))))
+        )
+
+        # Most advanced target not completed yet, then shortest path
+        targets = [c for c in targets if c not in completed] or targets
+        best_level = max(graph.courses[c]["level"] for c in targets)
+        plans = [graph.plan(c, level, completed) for c in targets if graph.courses[c]["level"] == best_level]
+        path = min(plans, key=lambda p: (graph.duration(p), len(p), p))
+        courses = [graph.courses[c] for c in path]
+        return {
+            "courses": [
+                {**course, "level": LEVEL_NAMES[course["level"]]} for course in courses
+            ],
+            "totalDuration": graph.duration(path),
+            "graphVersion": graph.version
+        }
+
+
+# Singleton instance
+learning_path_service = LearningPathService(
+    refresh_interval=settings.learning_path_refresh_interval,
+    catalog_limit=settings.learning_path_catalog_limit
+)
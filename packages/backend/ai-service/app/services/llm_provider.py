@@ -0,0 +1,483 @@
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from app.config import settings
+import asyncio
+import hashlib
+import logging
+import re
+import time
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+    openai = None
+
+try:
+    import anthropic
+    ANTHROPIC_AVAILABLE = True
+except ImportError:
+    ANTHROPIC_AVAILABLE = False
+    anthropic = None
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 3/4 of a word per token) for providers without usage data"""
+    return max(1, int(len(text.split()) * 4 / 3)) if text else 0
+
+
+class LLMProvider(ABC):
+    """
+    Base class for LLM providers.
+
+    A request is split into a stable prefix (system prompt + course context),
+    which providers can cache, and the variable prompt (question).
+    Results are dicts: {"text", "prompt_tokens", "completion_tokens", "cached_tokens"}.
+    """
+
+    name = "base"
+    supports_batching = False
+
+    @abstractmethod
+    async def complete(self, system: str, prefix: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        """Complete one request"""
+
+    @abstractmethod
+    async def complete_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Complete several requests ({"system", "prefix", "prompt", "max_tokens"}).
+        Only providers with supports_batching get micro-batches from LLMService;
+        others may just run the requests concurrently.
+        """
+
+    async def stream(self, system: str, prefix: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        """Stream the completion text; defaults to a single chunk"""
+        result = await self.complete(system, prefix, prompt, max_tokens)
+        yield result["text"]
+
+
+class LocalProvider(LLMProvider):
+    """
+    Offline stand-in provider.
+    By default it answers with the context sentences sharing the most words with
+    the prompt; tests can pass a `responder(system, prefix, prompt) -> str`.
+    """
+
+    name = "local"
+    supports_batching = True
+
+    def __init__(self, responder: Optional[Callable[[str, str, str], str]] = None):
+        self.responder = responder or self._extractive_response
+
+    @staticmethod
+    def _extractive_response(system: str, prefix: str, prompt: str) -> str:
+        words = set(re.findall(r"\w{3,}", prompt.lower()))
+        context = re.sub(r"^\[[^\]\n]*\]$", "", prefix, flags=re.MULTILINE)
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", context) if s.strip()]
+        ranked = sorted(
+            sentences,
+            key=lambda s: len(words & set(re.findall(r"\w{3,}", s.lower()))),
+            reverse=True
+        )
+        return " ".join(ranked[:2])
+
+    def _result(self, system: str, prefix: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        text = " ".join(self.responder(system, prefix, prompt).split()[:max_tokens])
+        return {
+            "text": text,
+            "prompt_tokens": estimate_tokens(system) + estimate_tokens(prefix) + estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(text),
+            "cached_tokens": 0
+        }
+
+    async def complete(self, system: str, prefix: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        return self._result(system, prefix, prompt, max_tokens)
+
+    async def complete_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            self._result(r["system"], r["prefix"], r["prompt"], r["max_tokens"])
+            for r in requests
+        ]
+
+    async def stream(self, system: str, prefix: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        result = self._result(system, prefix, prompt, max_tokens)
+        for token in re.findall(r"\S+\s*", result["text"]):
+            yield token
+            await asyncio.sleep(0)
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    OpenAI chat completions.
+    The prefix is sent first and byte-identical across requests, so OpenAI's
+    automatic prompt caching can reuse it.
+    """
+
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", timeout: float = 30.0):
+        if not OPENAI_AVAILABLE:
+            raise RuntimeError("openai package is not installed")
+        self.client = openai.AsyncOpenAI(api_key=api_key, timeout=timeout)
+        self.model = model
+
+    def _messages(self, system: str, prefix: str, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": f"{system}\n\n{prefix}" if prefix else system},
+            {"role": "user", "content": prompt}
+        ]
+
+    async def complete(self, system: str, prefix: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(system, prefix, prompt),
+            max_tokens=max_tokens
+        )
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "text": response.choices[0].message.content or "",
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0,
+            "cached_tokens": getattr(details, "cached_tokens", 0) or 0
+        }
+
+    async def complete_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return list(await asyncio.gather(*(
+            self.complete(r["system"], r["prefix"], r["prompt"], r["max_tokens"]) for r in requests
+        )))
+
+    async def stream(self, system: str, prefix: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(system, prefix, prompt),
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class AnthropicProvider(LLMProvider):
+    """
+    Anthropic messages API.
+    The prefix is sent as a separate system block marked for prompt caching.
+    """
+
+    name = "anthropic"
+
+    def __init__(self, api_key: str, model: str = "claude-3-5-haiku-latest", timeout: float = 30.0):
+        if not ANTHROPIC_AVAILABLE:
+            raise RuntimeError("anthropic package is not installed")
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, timeout=timeout)
+        self.model = model
+
+    def _system(self, system: str, prefix: str) -> List[Dict[str, Any]]:
+        blocks = [{"type": "text", "text": system}]
+        if prefix:
+            blocks.append({"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}})
+        return blocks
+
+    async def complete(self, system: str, prefix: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        response = await self.client.messages.create(
+            model=self.model,
+            system=self._system(system, prefix),
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens
+        )
+        usage = response.usage
+        return {
+            "text": "".join(block.text for block in response.content if block.type == "text"),
+            "prompt_tokens": usage.input_tokens,
+            "completion_tokens": usage.output_tokens,
+            "cached_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0
+        }
+
+    async def complete_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return list(await asyncio.gather(*(
+            self.complete(r["system"], r["prefix"], r["prompt"], r["max_tokens"]) for r in requests
+        )))
+
+    async def stream(self, system: str, prefix: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        async with self.client.messages.stream(
+            model=self.model,
+            system=self._system(system, prefix),
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+
+class _ProviderStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def record(self, result: Dict[str, Any], latency_ms: float):
+        self.requests += 1
+        self.prompt_tokens += result.get("prompt_tokens", 0)
+        self.completion_tokens += result.get("completion_tokens", 0)
+        self.cached_tokens += result.get("cached_tokens", 0)
+        self.total_latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "batchedRequests": self.batched_requests,
+            "promptTokens": self.prompt_tokens,
+            "completionTokens": self.completion_tokens,
+            "cachedTokens": self.cached_tokens,
+            "avgLatencyMs": round(self.total_latency_ms / self.requests, 2) if self.requests else None,
+            "maxLatencyMs": round(self.max_latency_ms, 2)
+        }
+
+
+class LLMService:
+    """
+    Entry point for LLM calls from the chatbot and quiz services.
+
+    - Global and per-provider concurrency limits (semaphores)
+    - Micro-batching: for providers that support it, requests arriving within
+      `batch_window_ms` are sent together (up to `max_batch_size`)
+    - Prompt-prefix cache: the rendered prefix for a given system prompt and
+      context is reused, keeping it byte-identical for provider-side caching
+    - Token and latency accounting per provider
+    """
+
+    def __init__(
+        self,
+        provider: Optional[LLMProvider] = None,
+        max_concurrency: int = 8,
+        provider_max_concurrency: int = 4,
+        batch_window_ms: int = 10,
+        max_batch_size: int = 8,
+        prefix_cache_size: int = 256,
+        max_tokens: int = 512
+    ):
+        self.provider = provider
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.prefix_cache_size = prefix_cache_size
+        self.max_tokens = max_tokens
+        self.provider_max_concurrency = provider_max_concurrency
+
+        self._global_semaphore = asyncio.Semaphore(max_concurrency)
+        self._provider_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, _ProviderStats] = {}
+
+        self._prefix_cache: "OrderedDict[str, str]" = OrderedDict()
+        self.prefix_cache_hits = 0
+        self.prefix_cache_misses = 0
+
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.provider is not None
+
+    def _semaphore(self, provider: LLMProvider) -> asyncio.Semaphore:
+        if provider.name not in self._provider_semaphores:
+            self._provider_semaphores[provider.name] = asyncio.Semaphore(self.provider_max_concurrency)
+        return self._provider_semaphores[provider.name]
+
+    def _stats_for(self, provider: LLMProvider) -> _ProviderStats:
+        return self._stats.setdefault(provider.name, _ProviderStats())
+
+    def render_prefix(self, context_parts: List[str]) -> str:
+        """Render (or reuse) the context block shared by requests over the same chunks"""
+        key = hashlib.sha256("\x1e".join(context_parts).encode("utf-8")).hexdigest()
+        prefix = self._prefix_cache.get(key)
+        if prefix is not None:
+            self._prefix_cache.move_to_end(key)
+            self.prefix_cache_hits += 1
+            return prefix
+
+        self.prefix_cache_misses += 1
+        prefix = "\n\n".join(
+            f"[Extrait {i + 1}]\n{part.strip()}" for i, part in enumerate(context_parts)
+        )
+        self._prefix_cache[key] = prefix
+        while len(self._prefix_cache) > self.prefix_cache_size:
+            self._prefix_cache.popitem(last=False)
+        return prefix
+
+    async def complete(
+        self,
+        system: str,
+        context_parts: List[str],
+        prompt: str,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Complete a prompt with the configured provider"""
+        if not self.provider:
+            raise RuntimeError("No LLM provider configured")
+
+        request = {
+            "system": system,
+            "prefix": self.render_prefix(context_parts),
+            "prompt": prompt,
+            "max_tokens": max_tokens or self.max_tokens
+        }
+
+        if self.provider.supports_batching and self.batch_window_ms > 0:
+            return await self._enqueue(request)
+
+        provider = self.provider
+        stats = self._stats_for(provider)
+        async with self._global_semaphore, self._semaphore(provider):
+            started = time.perf_counter()
+            try:
+                result = await provider.complete(
+                    request["system"], request["prefix"], request["prompt"], request["max_tokens"]
+                )
+            except Exception:
+                stats.errors += 1
+                raise
+            stats.record(result, (time.perf_counter() - started) * 1000)
+        return result
+
+    async def stream(
+        self,
+        system: str,
+        context_parts: List[str],
+        prompt: str,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Stream a completion; the concurrency slot is held until the stream ends or is closed"""
+        if not self.provider:
+            raise RuntimeError("No LLM provider configured")
+
+        provider = self.provider
+        stats = self._stats_for(provider)
+        prefix = self.render_prefix(context_parts)
+        max_tokens = max_tokens or self.max_tokens
+        system_tokens = estimate_tokens(system) + estimate_tokens(prefix) + estimate_tokens(prompt)
+
+        async with self._global_semaphore, self._semaphore(provider):
+            started = time.perf_counter()
+            parts = []
+            failed = False
+            try:
+                async for chunk in provider.stream(system, prefix, prompt, max_tokens):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception:
+                failed = True
+                stats.errors += 1
+                raise
+            finally:
+                # Failed calls only count as errors; streams closed by the client still used their tokens
+                if not failed:
+                    stats.record(
+                        {"prompt_tokens": system_tokens, "completion_tokens": estimate_tokens("".join(parts))},
+                        (time.perf_counter() - started) * 1000
+                    )
+
+    # ---------- Micro-batching ----------
+
+    async def _enqueue(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append({"request": request, "future": future})
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush_now()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.batch_window_ms / 1000)
+        self._flush_task = None
+        self._flush_now()
+
+    def _flush_now(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if batch:
+            asyncio.create_task(self._run_batch(batch))
+        if self._pending:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+
+    async def _run_batch(self, batch: List[Dict[str, Any]]):
+        provider = self.provider
+        stats = self._stats_for(provider)
+        async with self._global_semaphore, self._semaphore(provider):
+            started = time.perf_counter()
+            try:
+                results = await provider.complete_batch([item["request"] for item in batch])
+            except Exception as e:
+                stats.errors += 1
+                for item in batch:
+                    if not item["future"].done():
+                        item["future"].set_exception(e)
+                return
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        stats.batches += 1
+        stats.batched_requests += len(batch)
+        for item, result in zip(batch, results):
+            stats.record(result, latency_ms)
+            if not item["future"].done():
+                item["future"].set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider.name if self.provider else None,
+            "prefixCache": {
+                "size": len(self._prefix_cache),
+                "hits": self.prefix_cache_hits,
+                "misses": self.prefix_cache_misses
+            },
+            "providers": {name: stats.to_dict() for name, stats in self._stats.items()}
+        }
+
+
+def create_provider(name: str) -> Optional[LLMProvider]:
+    """Build the provider selected by `llm_provider` ("none", "local", "openai", "anthropic")"""
+    name = (name or "none").lower()
+    try:
+        if name == "local":
+            return LocalProvider()
+        if name == "openai":
+            return OpenAIProvider(settings.openai_api_key, model=settings.llm_model or "gpt-4o-mini", timeout=settings.llm_timeout)
+        if name == "anthropic":
+            return AnthropicProvider(settings.anthropic_api_key, model=settings.llm_model or "claude-3-5-haiku-latest", timeout=settings.llm_timeout)
+    except Exception as e:
+        logger.error(f"Failed to initialize LLM provider {name}: {e}")
+        return None
+
+    if name != "none":
+        logger.warning(f"Unknown LLM provider: {name}")
+    return None
+
+
+# Singleton instance
+llm_service = LLMService(
+    provider=create_provider(settings.llm_provider),
+    max_concurrency=settings.llm_max_concurrency,
+    provider_max_concurrency=settings.llm_provider_max_concurrency,
+    batch_window_ms=settings.llm_batch_window_ms,
+    max_batch_size=settings.llm_max_batch_size,
+    prefix_cache_size=settings.llm_prefix_cache_size,
+    max_tokens=settings.llm_max_tokens
+)
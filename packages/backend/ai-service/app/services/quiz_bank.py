@@ -0,0 +1,248 @@
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from app.config import settings
+from app.models.schemas import DifficultyLevel
+from app.services.backend_client import backend_client
+from app.services.quiz_service import quiz_service
+from app.services.course_vocabulary import CourseVocabulary, build_vocabulary
+import multiprocessing
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def generate_lesson_questions(
+    lessons: List[Tuple[Dict[str, Any], str]],
+    num_questions: int,
+    difficulty: str,
+    language: str,
+    vocabulary: Optional[CourseVocabulary] = None
+) -> List[Dict[str, Any]]:
+    """
+    Worker entry point: generate questions for a chunk of lessons.
+    Runs in a pool process, so it takes and returns plain picklable data.
+    """
+    results = []
+    for lesson, content in lessons:
+        questions = quiz_service.generate_quiz_data(
+            content, num_questions, DifficultyLevel(difficulty), language, vocabulary
+        )
+        results.append(dict(lesson, questions=questions))
+    return results
+
+
+def extract_lessons(course_id: str, course: Dict[str, Any]) -> List[Tuple[Dict[str, Any], str]]:
+    """(lesson info, content) for every lesson with content, in course order"""
+    lessons = []
+    for i, module in enumerate(course.get("modules", [])):
+        for j, lesson in enumerate(module.get("lessons", [])):
+            content = lesson.get("content", "")
+            if not content:
+                continue
+            lessons.append(({
+                "lessonId": str(lesson.get("_id") or lesson.get("id") or f"{course_id}_module_{i}_lesson_{j}"),
+                "lessonTitle": lesson.get("title", f"Lesson {j+1}"),
+                "moduleIndex": i,
+                "lessonIndex": j
+            }, content))
+    return lessons
+
+
+class QuizBankService:
+    """
+    Whole-course quiz bank generation.
+
+    Lessons are grouped into work units of `lessons_per_task` and generated
+    across a process pool, so large courses use every core and never block the
+    event loop. Results are streamed per lesson as they complete, and the
+    finished bank is stored as one JSON file per course for serving; the last
+    `max_in_memory` banks served are kept in memory.
+
+    A course is claimed (`claim`) before its lessons are fetched, so concurrent
+    requests cannot both start a generation; the claim is released when the
+    generation ends, or by the caller if it never starts.
+    """
+
+    def __init__(self, store_path: str, max_workers: int = 0, lessons_per_task: int = 4, max_in_memory: int = 64):
+        self.store_path = store_path
+        self.max_workers = max_workers or None
+        self.lessons_per_task = max(1, lessons_per_task)
+        self.max_in_memory = max(0, max_in_memory)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._claims: Dict[str, object] = {}
+        self._banks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._banks_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: the service process runs background threads, which fork does not handle safely
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def is_generating(self, course_id: str) -> bool:
+        return course_id in self._claims
+
+    def claim(self, course_id: str) -> Optional[object]:
+        """Reserve a course for generation: a token to pass to generate/release, None if already claimed"""
+        if course_id in self._claims:
+            return None
+        token = self._claims[course_id] = object()
+        return token
+
+    def release(self, course_id: str, token: object):
+        """Release a claim (no-op if it was already released, or belongs to a later generation)"""
+        if self._claims.get(course_id) is token:
+            del self._claims[course_id]
+
+    async def load_lessons(self, course_id: str) -> Optional[List[Tuple[Dict[str, Any], str]]]:
+        """Fetch the course's lessons from the backend (None if the course does not exist)"""
+        course = await backend_client.get_course_by_id(course_id)
+        if not course:
+            return None
+        return extract_lessons(course_id, course)
+
+    async def generate(
+        self,
+        course_id: str,
+        lessons: List[Tuple[Dict[str, Any], str]],
+        token: object,
+        num_questions: int = 5,
+        difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
+        language: str = "fr"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate the bank, yielding one {"type": "lesson", ...} item per lesson as
+        it completes, then a {"type": "done", ...} summary. The bank is stored
+        only if every work unit succeeded.
+        `token` is the course's claim, released when the generation ends.
+        Work units not yet started are cancelled if the consumer stops early.
+        """
+        futures = []
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            started = datetime.utcnow()
+            # Distractors are drawn from the whole course, not just the lesson
+            vocabulary = await asyncio.to_thread(build_vocabulary, [content for _, content in lessons])
+            futures = [
+                loop.run_in_executor(
+                    executor,
+                    generate_lesson_questions,
+                    lessons[start:start + self.lessons_per_task],
+                    num_questions,
+                    difficulty.value,
+                    language,
+                    vocabulary
+                )
+                for start in range(0, len(lessons), self.lessons_per_task)
+            ]
+
+            results = []
+            failed = 0
+            for future in asyncio.as_completed(futures):
+                try:
+                    chunk = await future
+                except Exception as e:
+                    logger.error(f"Quiz bank work unit failed for course {course_id}: {e}")
+                    if isinstance(e, BrokenProcessPool):
+                        # A worker died: the next generation starts a fresh pool
+                        self.shutdown()
+                    failed += 1
+                    continue
+                for lesson in chunk:
+                    results.append(lesson)
+                    yield dict(lesson, type="lesson")
+
+            results.sort(key=lambda l: (l["moduleIndex"], l["lessonIndex"]))
+            bank = {
+                "courseId": course_id,
+                "generatedAt": started.isoformat() + "Z",
+                "numQuestions": num_questions,
+                "difficulty": difficulty.value,
+                "language": language,
+                "lessons": results,
+                "totalQuestions": sum(len(l["questions"]) for l in results)
+            }
+            # A partial bank never replaces the stored one
+            if not failed:
+                await asyncio.to_thread(self._store, course_id, bank)
+            yield {
+                "type": "done",
+                "courseId": course_id,
+                "lessons": len(results),
+                "failedChunks": failed,
+                "totalQuestions": bank["totalQuestions"],
+                "stored": not failed
+            }
+        finally:
+            for future in futures:
+                future.cancel()
+            self.release(course_id, token)
+
+    def _bank_path(self, course_id: str) -> str:
+        safe_id = re.sub(r"[^\w\-]", "_", course_id)
+        return os.path.join(self.store_path, f"{safe_id}.json")
+
+    def _store(self, course_id: str, bank: Dict[str, Any]):
+        os.makedirs(self.store_path, exist_ok=True)
+        path = self._bank_path(course_id)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(bank, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        self._remember(course_id, bank)
+        logger.info(f"Stored quiz bank for course {course_id}: {bank['totalQuestions']} questions")
+
+    def _remember(self, course_id: str, bank: Dict[str, Any]):
+        with self._banks_lock:
+            self._banks[course_id] = bank
+            self._banks.move_to_end(course_id)
+            while len(self._banks) > self.max_in_memory:
+                self._banks.popitem(last=False)
+
+    def get_bank(self, course_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Stored bank for a course (None if it was never generated).
+        May read the bank file: call it from a thread, not from the event loop.
+        """
+        with self._banks_lock:
+            bank = self._banks.get(course_id)
+            if bank is not None:
+                self._banks.move_to_end(course_id)
+                return bank
+
+        path = self._bank_path(course_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                bank = json.load(f)
+        except FileNotFoundError:
+            return None
+        self._remember(course_id, bank)
+        return bank
+
+
+# Singleton instance
+quiz_bank_service = QuizBankService(
+    store_path=settings.quiz_bank_path,
+    max_workers=settings.quiz_bank_workers,
+    lessons_per_task=settings.quiz_bank_lessons_per_task,
+    max_in_memory=settings.quiz_bank_max_in_memory
+)
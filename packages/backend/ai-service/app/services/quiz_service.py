@@ -1,11 +1,37 @@
-from typing import List
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
 from app.models.schemas import QuizQuestion, QuizOption, DifficultyLevel, QuestionType
+from app.services.llm_provider import llm_service
+from app.services.course_vocabulary import CourseVocabulary, build_vocabulary
+from app.services.result_cache import result_cache, make_key
+from app.services.text_stream import iter_segments
+import asyncio
+import heapq
+import json
 import re
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
+QUIZ_SYSTEM_PROMPT = (
+    "You write multiple-choice quiz questions from course content. "
+    "Reply with a JSON array only. Each item: "
+    '{"question": str, "options": [4 str], "correct": index of the correct option, "explanation": str}.'
+)
+
+SENTENCE_BOUNDARY = re.compile(r"[.!?]+")
+TOKEN = re.compile(r"\S+")
+DIGIT = re.compile(r"\d")
+
+# Sentence importance: medium length + contains a number + capitalized words (capped)
+LENGTH_SCORE = 2
+DIGIT_SCORE = 1
+MAX_CAPITALIZED_SCORE = 3
+MAX_SENTENCE_SCORE = LENGTH_SCORE + DIGIT_SCORE + MAX_CAPITALIZED_SCORE
+
+# Without a course vocabulary, distractors come from (the beginning of) the content
+CONTENT_VOCABULARY_CHARS = 200_000
+
 class QuizGenerationService:
     """
     Quiz generation service using rule-based NLP techniques.
@@ -17,99 +43,304 @@ class QuizGenerationService:
         content: str, 
         num_questions: int = 5,
         difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
-        language: str = "fr"
+        language: str = "fr",
+        vocabulary: Optional[CourseVocabulary] = None
     ) -> List[QuizQuestion]:
         """
         Generate quiz questions from content using:
         1. Sentence extraction
         2. Key term identification
         3. Cloze test generation
-        4. Distractor generation
+        4. Distractor generation (terms of the course vocabulary, or of the
+           content itself when no vocabulary is given)
+        
+        Results are cached by content hash and parameters.
         """
+        return [
+            QuizQuestion.model_validate(question)
+            for question in self.generate_quiz_data(content, num_questions, difficulty, language, vocabulary)
+        ]
+    
+    def generate_quiz_data(
+        self,
+        content: str,
+        num_questions: int = 5,
+        difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
+        language: str = "fr",
+        vocabulary: Optional[CourseVocabulary] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Same as generate_quiz, as the JSON-ready dicts (by alias) that are cached:
+        callers that only serialize the questions skip building models on hits.
+        """
+        cache_key = make_key(
+            "quiz",
+            content,
+            num_questions=num_questions,
+            difficulty=difficulty.value,
+            language=language,
+            vocabulary=vocabulary.fingerprint if vocabulary else None
+        )
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            # Split content into sentences
-            sentences = self._split_into_sentences(content)
-            
-            if len(sentences) < num_questions:
-                logger.warning(f"Not enough sentences ({len(sentences)}) for {num_questions} questions")
-                num_questions = min(num_questions, len(sentences))
+            # Split content into sentences and select the important ones
+            important_sentences = self._select_important_sentences(content, num_questions)
+            questions = self._build_questions(
+                important_sentences,
+                num_questions,
+                difficulty,
+                language,
+                vocabulary,
+                content[:CONTENT_VOCABULARY_CHARS]
+            )
             
-            # Select important sentences
-            important_sentences = self._select_important_sentences(sentences, num_questions)
+            data = [q.model_dump(by_alias=True, mode="json") for q in questions]
+            result_cache.set(cache_key, data)
+            return data
             
-            # Generate questions
-            questions = []
-            for i, sentence in enumerate(important_sentences[:num_questions]):
-                question = self._generate_question_from_sentence(
-                    sentence, 
-                    i, 
-                    difficulty,
-                    language
-                )
-                if question:
-                    questions.append(question)
+        except Exception as e:
+            logger.error(f"Error generating quiz: {e}")
+            return []
+    
+    def generate_quiz_from_stream(
+        self,
+        texts: Iterable[str],
+        num_questions: int = 5,
+        difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
+        language: str = "fr",
+        vocabulary: Optional[CourseVocabulary] = None
+    ) -> List[QuizQuestion]:
+        """
+        Same as generate_quiz, for content arriving as a stream of text chunks.
+        
+        Chunks are split into sentences and scored as they arrive, keeping only
+        the current partial sentence, the best candidates and the beginning of
+        the content (for distractors): memory is bounded whatever the input size.
+        Reading stops early once the best possible candidates are found.
+        """
+        prefix: List[str] = []
+        kept = 0
+        
+        def keep_prefix(chunks: Iterable[str]) -> Iterator[str]:
+            nonlocal kept
+            for chunk in chunks:
+                if kept < CONTENT_VOCABULARY_CHARS:
+                    prefix.append(chunk[:CONTENT_VOCABULARY_CHARS - kept])
+                    kept += len(prefix[-1])
+                yield chunk
+        
+        try:
+            chunks = keep_prefix(texts)
+            segments = (
+                segment.rstrip(".!?")
+                for segment in iter_segments(chunks, SENTENCE_BOUNDARY)
+            )
+            important_sentences = self._select_from_segments(segments, num_questions)
             
-            return questions
+            # Selection stopped early: read on up to the end of the vocabulary prefix
+            if vocabulary is None and important_sentences:
+                while kept < CONTENT_VOCABULARY_CHARS and next(chunks, None) is not None:
+                    pass
             
+            return self._build_questions(
+                important_sentences,
+                num_questions,
+                difficulty,
+                language,
+                vocabulary,
+                "".join(prefix)
+            )
         except Exception as e:
-            logger.error(f"Error generating quiz: {e}")
+            logger.error(f"Error generating quiz from stream: {e}")
             return []
     
-    def _split_into_sentences(self, content: str) -> List[str]:
-        """Split text into sentences"""
-        # Simple sentence splitting (can be improved with spaCy)
-        sentences = re.split(r'[.!?]+', content)
-        sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
-        return sentences
+    def _build_questions(
+        self,
+        important_sentences: List[Tuple[str, List[str], List[Tuple[int, int]]]],
+        num_questions: int,
+        difficulty: DifficultyLevel,
+        language: str,
+        vocabulary: Optional[CourseVocabulary],
+        vocabulary_text: str
+    ) -> List[QuizQuestion]:
+        """Questions from the selected sentences (vocabulary built from `vocabulary_text` if none)"""
+        if len(important_sentences) < num_questions:
+            logger.warning(f"Not enough sentences ({len(important_sentences)}) for {num_questions} questions")
+        
+        if vocabulary is None and important_sentences:
+            vocabulary = build_vocabulary([vocabulary_text])
+        
+        questions = []
+        for i, (sentence, words, spans) in enumerate(important_sentences):
+            question = self._generate_question_from_sentence(
+                sentence, 
+                i, 
+                difficulty,
+                language,
+                words,
+                vocabulary,
+                spans
+            )
+            if question:
+                questions.append(question)
+        return questions
     
-    def _select_important_sentences(self, sentences: List[str], count: int) -> List[str]:
+    async def generate_quiz_with_llm(
+        self,
+        content: str,
+        num_questions: int = 5,
+        difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
+        language: str = "fr",
+        vocabulary: Optional[CourseVocabulary] = None
+    ) -> List[QuizQuestion]:
         """
-        Select most important sentences based on:
+        Generate quiz questions with the configured LLM provider.
+        Falls back to the rule-based generator when no provider is configured
+        or its output cannot be parsed.
+        """
+        if llm_service.enabled:
+            prompt = (
+                f"Write {num_questions} {difficulty.value} questions "
+                f"in {'French' if language == 'fr' else 'English'} from the course content above."
+            )
+            try:
+                result = await llm_service.complete(QUIZ_SYSTEM_PROMPT, [content], prompt, max_tokens=256 * num_questions)
+                questions = self._parse_llm_questions(result["text"], difficulty)
+                if questions:
+                    return questions[:num_questions]
+                logger.warning("LLM quiz output could not be parsed, using rule-based generation")
+            except Exception as e:
+                logger.error(f"LLM quiz generation failed, using rule-based generation: {e}")
+        
+        return await asyncio.to_thread(self.generate_quiz, content, num_questions, difficulty, language, vocabulary)
+    
+    def _parse_llm_questions(self, text: str, difficulty: DifficultyLevel) -> Optional[List[QuizQuestion]]:
+        """Parse the JSON array returned by the LLM into QuizQuestion models"""
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end <= start:
+            return None
+        
+        try:
+            items = json.loads(text[start:end + 1])
+            questions = []
+            for item in items:
+                options = [str(o) for o in item["options"]][:4]
+                correct = int(item["correct"])
+                if len(options) < 2 or not 0 <= correct < len(options):
+                    continue
+                questions.append(QuizQuestion(
+                    id=str(uuid.uuid4()),
+                    text=str(item["question"]),
+                    type=QuestionType.MULTIPLE_CHOICE,
+                    options=[
+                        QuizOption(id=chr(65 + i), text=option, isCorrect=(i == correct))
+                        for i, option in enumerate(options)
+                    ],
+                    difficulty=difficulty,
+                    explanation=item.get("explanation")
+                ))
+            return questions
+        except (ValueError, KeyError, TypeError):
+            return None
+    
+    def _select_important_sentences(self, content: str, count: int) -> List[Tuple[str, List[str], List[Tuple[int, int]]]]:
+        """Select the most important sentences of the content (see _select_from_segments)"""
+        return self._select_from_segments(SENTENCE_BOUNDARY.split(content), count)
+    
+    def _select_from_segments(self, segments: Iterable[str], count: int) -> List[Tuple[str, List[str], List[Tuple[int, int]]]]:
+        """
+        Select the most important sentences of a sequence of segments (text
+        between sentence boundaries, possibly streamed), as (sentence, words,
+        word spans), based on:
         - Length (prefer medium-length sentences)
         - Contains numbers or technical terms
         - Not too short or too long
+        
+        Sentences are tokenized once, in a single pass that keeps the
+        best `count` in a heap. Features that cannot lift a sentence above the
+        worst kept one are not computed, and the pass stops once every kept
+        sentence has the maximum score. Ties keep document order. Word spans,
+        used to blank a single word, are only recorded for kept sentences.
         """
-        scored_sentences = []
-        for sentence in sentences:
-            score = 0
+        if count <= 0:
+            return []
+        
+        best: List[Tuple[int, int, str, List[str], List[Tuple[int, int]]]] = []  # Min-heap of (score, -index, sentence, words, spans)
+        floor = -1  # Lowest kept score once the heap is full
+        index = -1
+        
+        for segment in segments:
+            sentence = segment.strip()
+            if len(sentence) <= 20:
+                continue
+            index += 1
             words = sentence.split()
             
             # Prefer medium-length sentences (10-25 words)
-            if 10 <= len(words) <= 25:
-                score += 2
+            score = LENGTH_SCORE if 10 <= len(words) <= 25 else 0
+            if score + DIGIT_SCORE + MAX_CAPITALIZED_SCORE <= floor:
+                continue
             
             # Contains numbers (likely factual)
-            if re.search(r'\d+', sentence):
-                score += 1
+            if DIGIT.search(sentence):
+                score += DIGIT_SCORE
+            if score + MAX_CAPITALIZED_SCORE <= floor:
+                continue
             
             # Contains capitalized words (likely important terms)
-            capitalized = sum(1 for w in words if w[0].isupper() and len(w) > 1)
-            score += min(capitalized, 3)
+            capitalized = 0
+            for word in words:
+                if word[0].isupper() and len(word) > 1:
+                    capitalized += 1
+                    if capitalized == MAX_CAPITALIZED_SCORE:
+                        break
+            score += capitalized
             
-            scored_sentences.append((sentence, score))
+            if len(best) < count:
+                heapq.heappush(best, (score, -index, sentence, words, self._word_spans(sentence)))
+                if len(best) == count:
+                    floor = best[0][0]
+            elif score > floor:
+                heapq.heapreplace(best, (score, -index, sentence, words, self._word_spans(sentence)))
+                floor = best[0][0]
+                if floor == MAX_SENTENCE_SCORE:
+                    break
         
-        # Sort by score and return top N
-        scored_sentences.sort(key=lambda x: x[1], reverse=True)
-        return [s[0] for s in scored_sentences[:count]]
+        best.sort(reverse=True)
+        return [(sentence, words, spans) for _, _, sentence, words, spans in best]
+    
+    @staticmethod
+    def _word_spans(sentence: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the whitespace-separated words of a sentence"""
+        return [match.span() for match in TOKEN.finditer(sentence)]
     
     def _generate_question_from_sentence(
         self, 
         sentence: str, 
         index: int,
         difficulty: DifficultyLevel,
-        language: str
+        language: str,
+        words: Optional[List[str]] = None,
+        vocabulary: Optional[CourseVocabulary] = None,
+        spans: Optional[List[Tuple[int, int]]] = None
     ) -> QuizQuestion:
-        """Generate a cloze-style question from a sentence"""
-        words = sentence.split()
+        """Generate a cloze-style question from a sentence (and its words and their spans, if already split)"""
+        if not words or spans is None:
+            words = sentence.split()
         
         # Find a good word to blank out (noun, verb, or number)
-        blank_word = self._find_blank_word(words)
+        blank_index = self._find_blank_index(words)
         
-        if not blank_word:
-            blank_word = words[len(words) // 2]  # Fallback: middle word
+        if blank_index < 0:
+            blank_index = len(words) // 2  # Fallback: middle word
+        blank_word = words[blank_index]
         
-        # Create question text
-        question_text = sentence.replace(blank_word, "______")
+        # Create question text: only the chosen word is blanked, not other occurrences of it
+        start, end = spans[blank_index]
+        question_text = sentence[:start] + "______" + sentence[end:]
         
         # Generate options
         correct_option = QuizOption(
@@ -119,7 +350,7 @@ class QuizGenerationService:
         )
         
         # Generate distractors (simple approach)
-        distractors = self._generate_distractors(blank_word, difficulty)
+        distractors = self._generate_distractors(blank_word, difficulty, vocabulary)
         
         options = [correct_option] + [
             QuizOption(id=chr(66 + i), text=d, isCorrect=False)
@@ -139,42 +370,55 @@ class QuizGenerationService:
             explanation=explanation_text
         )
     
-    def _find_blank_word(self, words: List[str]) -> str:
-        """Find a good word to blank out (prefer nouns, numbers, or important terms)"""
+    def _find_blank_index(self, words: List[str]) -> int:
+        """Index of a good word to blank out (prefer nouns, numbers, or important terms), -1 if none"""
         # Prefer capitalized words (likely proper nouns or important terms)
-        for word in words:
+        for i, word in enumerate(words):
             if len(word) > 3 and word[0].isupper() and word.isalpha():
-                return word
+                return i
         
         # Prefer words with numbers
-        for word in words:
-            if re.search(r'\d', word):
-                return word
+        for i, word in enumerate(words):
+            if DIGIT.search(word):
+                return i
         
         # Prefer longer words (likely more meaningful)
-        long_words = [w for w in words if len(w) > 6 and w.isalpha()]
-        if long_words:
-            return long_words[0]
-        
-        return ""
+        return next((i for i, w in enumerate(words) if len(w) > 6 and w.isalpha()), -1)
     
-    def _generate_distractors(self, correct_answer: str, difficulty: DifficultyLevel) -> List[str]:
-        """Generate plausible wrong answers"""
-        distractors = []
+    def _generate_distractors(
+        self,
+        correct_answer: str,
+        difficulty: DifficultyLevel,
+        vocabulary: Optional[CourseVocabulary] = None
+    ) -> List[str]:
+        """
+        Generate plausible wrong answers: course terms of the same kind, length
+        and difficulty band when a vocabulary is available, completed with
+        simple variations of the answer.
+        """
+        distractors = vocabulary.sample_distractors(correct_answer, difficulty, 3) if vocabulary else []
+        if len(distractors) == 3:
+            return distractors
         
-        # Strategy 1: Similar words (simple approach)
+        # Strategy 2: Similar words (simple approach)
         if correct_answer.isdigit():
             # For numbers, generate nearby numbers
             num = int(correct_answer)
-            distractors = [str(num - 1), str(num + 1), str(num * 2)]
+            variations = [str(num - 1), str(num + 1), str(num * 2)]
         else:
             # For text, generate variations
-            distractors = [
+            variations = [
                 correct_answer + "s",  # Plural
                 correct_answer.lower() if correct_answer[0].isupper() else correct_answer.capitalize(),
                 correct_answer[::-1][:len(correct_answer)]  # Reversed (placeholder)
             ]
         
+        for variation in variations:
+            if len(distractors) == 3:
+                break
+            if variation != correct_answer and variation not in distractors:
+                distractors.append(variation)
+        
         # Ensure we have at least 3 distractors
         while len(distractors) < 3:
             distractors.append(f"Option {len(distractors) + 1}")
@@ -0,0 +1,198 @@
+from typing import List, Dict, Any, Optional, Tuple
+from app.config import settings
+import ipaddress
+import json
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# Paths whose cost has been resolved, and addresses checked against the trusted proxies, are memoized up to this many
+MAX_CACHED_PATHS = 4096
+MAX_CACHED_HOSTS = 4096
+
+# Headers identifying a client, by precedence (ASGI header names are lowercase)
+CLIENT_KEY_HEADERS = {b"x-user-id": 0, b"x-api-key": 1, b"authorization": 1, b"x-forwarded-for": 2}
+CLIENT_KEY_PREFIXES = [b"user:", b"key:", b"ip:"]
+FORWARDED_RANK = 2
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket per client key: buckets hold up to `capacity` tokens and
+    refill continuously at `capacity / window` tokens per second. A request
+    costing more tokens than are left is rejected without consuming any.
+
+    A bucket untouched for `window` seconds is full again, so it carries no
+    state: such buckets are swept lazily, at most once per window, from the
+    request path instead of by a background task.
+
+    Not thread-safe: meant to be called from the event loop only.
+    """
+
+    def __init__(self, capacity: float, window: float):
+        self.capacity = float(capacity)
+        self.window = float(window)
+        self.rate = self.capacity / self.window
+        self._buckets: Dict[bytes, List[float]] = {}  # Key -> [tokens, last update (monotonic)]
+        self._next_sweep = time.monotonic() + self.window
+
+        self.limited = 0
+        self.swept = 0
+
+    def acquire(self, key: bytes, cost: float = 1.0) -> float:
+        """Take `cost` tokens from the key's bucket: 0 if allowed, else seconds until it could be"""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [self.capacity - min(cost, self.capacity), now]
+            return 0.0
+
+        tokens = bucket[0] + (now - bucket[1]) * self.rate
+        if tokens > self.capacity:
+            tokens = self.capacity
+        bucket[1] = now
+        # Costs above the capacity need a full bucket
+        if tokens >= cost or tokens == self.capacity:
+            bucket[0] = tokens - cost if tokens >= cost else 0.0
+            return 0.0
+        bucket[0] = tokens
+        self.limited += 1
+        return (min(cost, self.capacity) - tokens) / self.rate
+
+    def _sweep(self, now: float):
+        cutoff = now - self.window
+        before = len(self._buckets)
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[1] > cutoff}
+        self.swept += before - len(self._buckets)
+        self._next_sweep = now + self.window
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "buckets": len(self._buckets),
+            "limited": self.limited,
+            "swept": self.swept,
+            "capacity": self.capacity,
+            "window": self.window
+        }
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware charging every HTTP request to its client's token bucket.
+
+    Identity headers are only trusted from `trusted_proxies` (addresses or
+    networks, e.g. the api-gateway): for requests they forward, clients are
+    identified by the X-User-Id header, then the X-API-Key or Authorization
+    header, then the rightmost X-Forwarded-For address that is not itself a
+    trusted proxy (the one the gateway appended). Any other request is keyed on
+    its peer address, whatever headers it sends. Requests cost the tokens of the
+    longest matching path prefix in `route_costs` (`default_cost` otherwise; 0
+    exempts a route). Rejected requests get a 429 with Retry-After.
+
+    Implemented as a raw ASGI callable rather than BaseHTTPMiddleware, so
+    allowed requests pass through without extra tasks or response wrapping.
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: TokenBucketLimiter,
+        route_costs: Optional[Dict[str, float]] = None,
+        default_cost: float = 1.0,
+        trusted_proxies: Optional[List[str]] = None
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.default_cost = default_cost
+        # Longest prefixes first
+        self._prefixes: List[Tuple[str, float]] = sorted((route_costs or {}).items(), key=lambda item: -len(item[0]))
+        self._path_costs: Dict[str, float] = {}
+        self._trusted_networks = [ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies or []]
+        self._trusted_hosts: Dict[str, bool] = {}
+
+    def route_cost(self, path: str) -> float:
+        cost = self._path_costs.get(path)
+        if cost is None:
+            cost = next((c for prefix, c in self._prefixes if path.startswith(prefix)), self.default_cost)
+            if len(self._path_costs) >= MAX_CACHED_PATHS:
+                self._path_costs.clear()
+            self._path_costs[path] = cost
+        return cost
+
+    def is_trusted(self, host: str) -> bool:
+        """True if the address belongs to a trusted proxy"""
+        trusted = self._trusted_hosts.get(host)
+        if trusted is None:
+            try:
+                address = ipaddress.ip_address(host)
+                trusted = any(address in network for network in self._trusted_networks)
+            except ValueError:
+                trusted = False
+            if len(self._trusted_hosts) >= MAX_CACHED_HOSTS:
+                self._trusted_hosts.clear()
+            self._trusted_hosts[host] = trusted
+        return trusted
+
+    def _forwarded_client(self, forwarded: bytes) -> bytes:
+        """Rightmost X-Forwarded-For hop that is not a trusted proxy (the leftmost one if they all are)"""
+        hops = [hop.strip() for hop in forwarded.split(b",")]
+        for hop in reversed(hops):
+            if hop and not self.is_trusted(hop.decode("latin-1")):
+                return hop
+        return hops[0]
+
+    def client_key(self, scope: Dict[str, Any]) -> bytes:
+        client = scope.get("client")
+        # uvicorn's proxy headers middleware leaves the host None when every forwarded hop is trusted
+        peer = (client[0] if client and client[0] else "unknown").encode()
+        if not self._trusted_networks or not self.is_trusted(peer.decode()):
+            return b"ip:" + peer
+
+        best_rank, best = len(CLIENT_KEY_PREFIXES), b""
+        for name, value in scope["headers"]:
+            rank = CLIENT_KEY_HEADERS.get(name, best_rank)
+            if rank < best_rank and value:
+                best_rank, best = rank, value
+        if best_rank == FORWARDED_RANK:
+            best = self._forwarded_client(best) or peer
+        elif best_rank == len(CLIENT_KEY_PREFIXES):
+            return b"ip:" + peer
+        return CLIENT_KEY_PREFIXES[best_rank] + best
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        cost = self._path_costs.get(scope["path"])
+        if cost is None:
+            cost = self.route_cost(scope["path"])
+        if cost > 0:
+            retry_after = self.limiter.acquire(self.client_key(scope), cost)
+            if retry_after:
+                return await self._reject(send, retry_after)
+        return await self.app(scope, receive, send)
+
+    async def _reject(self, send, retry_after: float):
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Singleton instance
+rate_limiter = TokenBucketLimiter(
+    capacity=settings.rate_limit_requests,
+    window=settings.rate_limit_window
+)
@@ -1,5 +1,6 @@
 from typing import List, Dict, Any, Set
 from app.services.backend_client import backend_client
+from app.services.shared_data import shared_data
 from app.models.schemas import CourseRecommendation
 from app.config import settings
 import logging
@@ -28,7 +29,10 @@ class RecommendationService:
         try:
             # Fetch user data
             enrollments = await backend_client.get_user_enrollments(user_id)
-            all_courses = await backend_client.get_courses(status="published")
+            # Multi-worker deployments share the catalog instead of fetching it per request
+            all_courses = shared_data.catalog
+            if all_courses is None:
+                all_courses = await backend_client.get_courses(status="published")
             
             # Get enrolled course IDs
             enrolled_ids: Set[str] = {e.get("courseId", e.get("course_id")) for e in enrollments}
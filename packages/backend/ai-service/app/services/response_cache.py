@@ -0,0 +1,124 @@
+from typing import Dict, Any, Callable, Optional, Tuple
+from collections import OrderedDict
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.config import settings
+from app.services.vector_db_service import vector_db_service
+import hashlib
+import logging
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Data version namespaces bumped by the services owning the data
+CATALOG = "catalog"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """
+    HTTP caching of read-mostly GET endpoints.
+
+    The strong ETag of a response is a hash of its serialized body, so it is
+    the same in every worker and across restarts for the same content, and
+    never matches a client's copy of different content. Bodies (and their
+    ETags) are kept in an LRU keyed by the route key (route and parameters)
+    and the version of the data they are computed from: while the version is
+    unchanged, a request whose If-None-Match holds the ETag is answered 304
+    without computing or serializing anything. Responses carry Cache-Control
+    so browsers and the api-gateway can reuse them for `max_age` seconds.
+
+    Data versions are either passed by the route (e.g. the FAQ corpus
+    version) or kept here as counters per namespace, bumped by listeners on
+    the owning service. They are local to the process: they only decide when
+    a body must be rendered again, not what the client sees.
+    """
+
+    def __init__(self, max_entries: int = 512, max_age: int = 300):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._bodies: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()  # Cache key -> (ETag, body)
+        self._versions: Dict[str, int] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace: str):
+        """Invalidate every response computed from a namespace"""
+        self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def set_version(self, namespace: str, version: int):
+        """Pin a namespace to an externally managed version (e.g. the shared data version)"""
+        self._versions[namespace] = version
+
+    @staticmethod
+    def cache_key(key: str, version: Any) -> str:
+        return hashlib.blake2b(f"{key}\0{version}".encode("utf-8"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    def respond(
+        self,
+        request: Request,
+        key: str,
+        version: Any,
+        render: Callable[[], Any],
+        max_age: Optional[int] = None
+    ) -> Response:
+        """Cached JSON response of `render()` for the route key and data version"""
+        cache_key = self.cache_key(key, version)
+        entry = self._bodies.get(cache_key)
+        if entry is not None:
+            self._bodies.move_to_end(cache_key)
+            self.hits += 1
+            etag, body = entry
+        else:
+            # Models and other types orjson does not know go through FastAPI's encoder
+            body = orjson.dumps(render(), default=jsonable_encoder, option=orjson.OPT_SERIALIZE_NUMPY)
+            etag = self.etag(body)
+            self._bodies[cache_key] = (etag, body)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+            self.misses += 1
+
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={self.max_age if max_age is None else max_age}"}
+        if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._bodies),
+            "bytes": sum(len(body) for _, body in self._bodies.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "notModified": self.not_modified,
+            "versions": dict(self._versions)
+        }
+
+
+# Singleton instance
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    max_age=settings.response_cache_max_age
+)
+
+
+# Course catalog responses depend on every ingested course
+vector_db_service.register_course_listener(lambda course_id: response_cache.bump(CATALOG))
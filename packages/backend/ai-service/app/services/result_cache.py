@@ -0,0 +1,200 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+from app.config import settings
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(kind: str, content: str, **params: Any) -> str:
+    """Cache key from a hash of the content plus the generation parameters"""
+    content_digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    canonical = json.dumps({"kind": kind, "content": content_digest, "params": params}, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of generated results (quizzes, summaries) keyed by content hash.
+
+    Values are stored as JSON text, so hits are independent copies and memory
+    is accounted in bytes. The memory tier is an LRU bounded by entry count and
+    total size. The optional disk tier keeps one file per entry (sharded by key
+    prefix, written atomically) so results survive restarts and are shared with
+    worker processes; it is bounded in size, evicting least recently used files.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        disk_path: str = "",
+        disk_max_bytes: int = 512 * 1024 * 1024,
+        enabled: bool = True
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes: Optional[int] = None  # Scanned on first disk write
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ---------- Memory tier ----------
+
+    def _remember(self, key: str, text: str):
+        """Insert into the memory tier (caller holds the lock)"""
+        if len(text) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = text
+        self._bytes += len(text)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(text)
+
+        text = self._read_disk(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, text)
+        return json.loads(text)
+
+    def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        # ASCII-escaped, so the text length is its size in bytes
+        text = json.dumps(value)
+        with self._lock:
+            self._remember(key, text)
+        self._write_disk(key, text)
+
+    # ---------- Disk tier ----------
+
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if not self.disk_path:
+            return None
+        path = self._disk_file(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            # Recency for disk eviction
+            os.utime(path)
+            return text
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to read cached result {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, text: str):
+        if not self.disk_path:
+            return
+        path = self._disk_file(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existing = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cached result {key}: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            else:
+                self._disk_bytes += os.path.getsize(path) - existing
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        """(mtime, size, path) of every cached file"""
+        files = []
+        for root, _, names in os.walk(self.disk_path):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier is back to 90% of its bound"""
+        files = sorted(self._scan_disk())
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    # ---------- Management ----------
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "diskBytes": self._disk_bytes,
+                "diskEnabled": bool(self.disk_path)
+            }
+
+
+# Singleton instance
+result_cache = ResultCache(
+    max_entries=settings.result_cache_max_entries,
+    max_bytes=settings.result_cache_max_mb * 1024 * 1024,
+    disk_path=settings.result_cache_disk_path,
+    disk_max_bytes=settings.result_cache_disk_max_mb * 1024 * 1024,
+    enabled=settings.result_cache_enabled
+)
@@ -0,0 +1,155 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from app.config import settings
+import numpy as np
+import threading
+import time
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _CourseCache:
+    """Cached answers for one course, with their question embeddings stacked in a matrix"""
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, Tuple[np.ndarray, Dict[str, Any], float]]" = OrderedDict()
+        self._keys = []
+        self._matrix: Optional[np.ndarray] = None
+        self._created_at: Optional[np.ndarray] = None
+
+    def matrix(self) -> Tuple[list, np.ndarray, np.ndarray]:
+        """Keys, stacked embeddings and creation times of the entries"""
+        if self._matrix is None:
+            self._keys = list(self.entries.keys())
+            self._matrix = np.vstack([self.entries[k][0] for k in self._keys])
+            self._created_at = np.array([self.entries[k][2] for k in self._keys])
+        return self._keys, self._matrix, self._created_at
+
+    def invalidate_matrix(self):
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    """
+    Per-course cache of chatbot answers keyed by question embedding.
+    A question hits the cache when its cosine similarity with a cached question
+    is above the threshold. Memory is bounded per course (LRU) and across
+    courses (LRU), and entries expire after a TTL.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries_per_course: int = 256,
+        max_courses: int = 100,
+        ttl_seconds: int = 3600,
+        enabled: bool = True
+    ):
+        self.threshold = threshold
+        self.max_entries_per_course = max_entries_per_course
+        self.max_courses = max_courses
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._courses: "OrderedDict[str, _CourseCache]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, course_id: str, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached answer for the most similar question, if close enough"""
+        if not self.enabled:
+            return None
+
+        query = self._normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            course = self._courses.get(course_id)
+            if not course or not course.entries:
+                self.misses += 1
+                return None
+
+            keys, matrix, created_at = course.matrix()
+            expired = now - created_at > self.ttl_seconds
+            similarities = matrix @ query
+            if expired.any():
+                # Expired entries never answer, and are evicted while we are here
+                similarities[expired] = -np.inf
+                for row in np.flatnonzero(expired):
+                    del course.entries[keys[row]]
+                course.invalidate_matrix()
+
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            value = course.entries[key][1]
+            course.entries.move_to_end(key)
+            self._courses.move_to_end(course_id)
+            self.hits += 1
+            return copy.deepcopy(value)
+
+    def store(self, course_id: str, question: str, embedding: np.ndarray, value: Dict[str, Any]):
+        """Cache an answer, evicting the least recently used entries beyond the bounds"""
+        if not self.enabled:
+            return
+
+        key = " ".join(question.lower().split())
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            course = self._courses.get(course_id)
+            if course is None:
+                course = _CourseCache()
+                self._courses[course_id] = course
+            self._courses.move_to_end(course_id)
+
+            course.entries[key] = (vector, copy.deepcopy(value), time.monotonic())
+            course.entries.move_to_end(key)
+            while len(course.entries) > self.max_entries_per_course:
+                course.entries.popitem(last=False)
+            course.invalidate_matrix()
+
+            while len(self._courses) > self.max_courses:
+                self._courses.popitem(last=False)
+
+    def invalidate(self, course_id: str):
+        """Drop all cached answers for a course (e.g. after re-ingestion)"""
+        with self._lock:
+            if self._courses.pop(course_id, None) is not None:
+                logger.info(f"Invalidated semantic answer cache for course {course_id}")
+
+    def clear(self):
+        with self._lock:
+            self._courses.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "courses": len(self._courses),
+                "entries": sum(len(c.entries) for c in self._courses.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "threshold": self.threshold
+            }
+
+
+# Singleton instance
+semantic_answer_cache = SemanticAnswerCache(
+    threshold=settings.semantic_cache_threshold,
+    max_entries_per_course=settings.semantic_cache_max_entries,
+    max_courses=settings.semantic_cache_max_courses,
+    ttl_seconds=settings.semantic_cache_ttl,
+    enabled=settings.semantic_cache_enabled
+)
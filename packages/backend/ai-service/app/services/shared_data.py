@@ -0,0 +1,292 @@
+"""
+Read-mostly data shared by the workers of a multi-worker deployment.
+
+The launcher (app/launcher.py) builds every version of the data once, into a
+directory under the shared data path:
+- v<N>/manifest.json: version number, build time and contents
+- v<N>/vectors/: vector index snapshot (see vector_snapshot.py)
+- v<N>/catalog.json: published course catalog
+- v<N>/completion_model.npz: completion model, when one has been trained
+- CURRENT: name of the live version directory
+
+A version is written to a temporary directory and renamed into place before
+CURRENT is replaced (os.replace), so workers never see a partial build. The
+manifest records a fingerprint of each content: a build where none changed
+publishes nothing, and vectors whose collection is unchanged are hard-linked
+from the current version instead of being exported again.
+Workers memory-map the embeddings, whose pages the OS shares between every
+process mapping them, and poll CURRENT to swap in new versions: services get
+whole new objects, so a request sees either the previous or the new version.
+Older versions are pruned by the builder; files still mapped by a worker stay
+readable until it releases them.
+"""
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+import hashlib
+from app.config import settings
+from app.services.completion_model import completion_predictor
+from app.services.learning_path import learning_path_service
+from app.services.response_cache import response_cache, CATALOG
+from app.services.vector_db_service import vector_db_service
+from app.services.vector_snapshot import SnapshotError
+import json
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+POINTER_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+VECTORS_DIR = "vectors"
+CATALOG_FILE = "catalog.json"
+MODEL_FILE = "completion_model.npz"
+VERSION_PREFIX = "v"
+
+
+class SharedDataError(Exception):
+    """Raised when shared data cannot be built or attached"""
+
+
+def _version_number(name: str) -> Optional[int]:
+    if name.startswith(VERSION_PREFIX) and name[len(VERSION_PREFIX):].isdigit():
+        return int(name[len(VERSION_PREFIX):])
+    return None
+
+
+def list_versions(root: str) -> List[int]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in map(_version_number, os.listdir(root)) if v is not None)
+
+
+def read_current(root: str) -> Optional[str]:
+    """Name of the live version directory (None before the first build)"""
+    try:
+        with open(os.path.join(root, POINTER_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(root: str, version_dir: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Manifest of a version directory (None if missing or unreadable)"""
+    if not version_dir:
+        return None
+    try:
+        with open(os.path.join(root, version_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _file_fingerprint(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_version(
+    root: str,
+    courses: Optional[List[Dict[str, Any]]],
+    export_vectors: bool = True,
+    model_path: str = "",
+    keep_versions: int = 2,
+    force: bool = False
+) -> Dict[str, Any]:
+    """
+    Build the next version of the shared data and make it current. Returns
+    the manifest of the current version, unchanged when the vectors, catalog
+    and model are the same as in it (unless `force`).
+
+    `courses` is the published catalog; when it could not be fetched (None or
+    empty), the catalog of the current version is carried over.
+    """
+    root = os.path.abspath(root)
+    os.makedirs(root, exist_ok=True)
+    current = read_current(root)
+    current_manifest = read_manifest(root, current)
+    previous = (current_manifest or {}).get("fingerprints", {})
+
+    fingerprints: Dict[str, str] = {}
+    if export_vectors and vector_db_service.collection is not None:
+        fingerprints[VECTORS_DIR] = vector_db_service.fingerprint()
+    if courses:
+        fingerprints[CATALOG_FILE] = hashlib.sha256(
+            json.dumps(courses, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+    elif CATALOG_FILE in previous:
+        fingerprints[CATALOG_FILE] = previous[CATALOG_FILE]
+    if model_path and os.path.exists(model_path):
+        fingerprints[MODEL_FILE] = _file_fingerprint(model_path)
+
+    if current_manifest and fingerprints == previous and not force:
+        logger.info(f"Shared data unchanged, {current} stays current")
+        return current_manifest
+
+    tmp_path = os.path.join(root, f".build-{os.getpid()}")
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    try:
+        contents = []
+        if VECTORS_DIR in fingerprints:
+            current_vectors = os.path.join(root, current, VECTORS_DIR) if current else ""
+            if previous.get(VECTORS_DIR) == fingerprints[VECTORS_DIR] and os.path.isdir(current_vectors):
+                # Snapshot files are never modified in place: link them instead of exporting again
+                shutil.copytree(current_vectors, os.path.join(tmp_path, VECTORS_DIR), copy_function=os.link)
+            else:
+                vector_db_service.export_snapshot(os.path.join(tmp_path, VECTORS_DIR))
+            contents.append(VECTORS_DIR)
+
+        catalog_path = os.path.join(tmp_path, CATALOG_FILE)
+        if courses:
+            with open(catalog_path, "w", encoding="utf-8") as f:
+                json.dump(courses, f, ensure_ascii=False, default=str)
+            contents.append(CATALOG_FILE)
+        elif current and os.path.exists(os.path.join(root, current, CATALOG_FILE)):
+            logger.warning(f"Course catalog unavailable, carrying over the catalog of {current}")
+            shutil.copyfile(os.path.join(root, current, CATALOG_FILE), catalog_path)
+            contents.append(CATALOG_FILE)
+
+        if model_path and os.path.exists(model_path):
+            shutil.copyfile(model_path, os.path.join(tmp_path, MODEL_FILE))
+            contents.append(MODEL_FILE)
+
+        # Version numbers are claimed by the rename, so concurrent builders never share one
+        version = (list_versions(root) or [0])[-1] + 1
+        while True:
+            manifest = {
+                "version": version,
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "contents": contents,
+                "fingerprints": fingerprints
+            }
+            with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            try:
+                os.rename(tmp_path, os.path.join(root, f"{VERSION_PREFIX}{version}"))
+                break
+            except OSError:
+                if not os.path.exists(os.path.join(root, f"{VERSION_PREFIX}{version}")):
+                    raise
+                version += 1
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    pointer_tmp = os.path.join(root, f"{POINTER_FILE}.tmp-{os.getpid()}")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(f"{VERSION_PREFIX}{version}\n")
+    os.replace(pointer_tmp, os.path.join(root, POINTER_FILE))
+    logger.info(f"Published shared data v{version} ({', '.join(contents) or 'empty'}) in {root}")
+
+    for old in list_versions(root)[:-max(keep_versions, 1)]:
+        shutil.rmtree(os.path.join(root, f"{VERSION_PREFIX}{old}"), ignore_errors=True)
+    return manifest
+
+
+class SharedData:
+    """
+    Worker side: attaches the services to the live version of the shared
+    data and checks CURRENT every `poll_interval` seconds for a newer one.
+    Disabled when `path` is empty (single-process deployments).
+    """
+
+    def __init__(self, path: str = "", poll_interval: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.version: Optional[int] = None
+        self.catalog: Optional[List[Dict[str, Any]]] = None  # Published courses, None if not shared
+        self._current: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.swaps = 0
+        self.errors = 0
+
+    def start(self):
+        """Attach to the current version and start watching for new ones"""
+        if not self.path or (self._thread and self._thread.is_alive()):
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Failed to attach shared data in {self.path}: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="shared-data-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Failed to refresh shared data from {self.path}: {e}")
+
+    def refresh(self) -> bool:
+        """Attach to the version named by CURRENT if it changed; True if swapped"""
+        current = read_current(self.path)
+        if current is None or current == self._current:
+            return False
+        self._attach(os.path.join(self.path, current))
+        self._current = current
+        return True
+
+    def _attach(self, version_path: str):
+        with open(os.path.join(version_path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        contents = manifest.get("contents", [])
+        version = manifest["version"]
+
+        # Read the catalog before swapping anything, so a malformed version leaves the previous one serving
+        snapshot_path = os.path.join(version_path, VECTORS_DIR)
+        catalog = None
+        if CATALOG_FILE in contents:
+            with open(os.path.join(version_path, CATALOG_FILE), "r", encoding="utf-8") as f:
+                catalog = json.load(f)
+        if VECTORS_DIR in contents:
+            try:
+                vector_db_service.load_snapshot(snapshot_path)
+            except SnapshotError as e:
+                raise SharedDataError(f"Shared data v{version} has an unusable vector snapshot: {e}")
+
+        if catalog is not None:
+            learning_path_service.use_catalog(catalog, version)
+            self.catalog = catalog
+        if MODEL_FILE in contents:
+            completion_predictor.load(os.path.join(version_path, MODEL_FILE))
+        # Catalog responses are rendered again from the new version
+        response_cache.set_version(CATALOG, version)
+
+        self.version = version
+        self.swaps += 1
+        logger.info(f"Attached shared data v{version} from {version_path}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "courses": len(self.catalog) if self.catalog is not None else None,
+            "swaps": self.swaps,
+            "errors": self.errors
+        }
+
+
+# Singleton instance
+shared_data = SharedData(
+    path=settings.shared_data_path,
+    poll_interval=settings.shared_data_poll_interval
+)
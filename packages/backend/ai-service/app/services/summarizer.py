@@ -0,0 +1,205 @@
+from typing import List, Dict, Any, Tuple, Iterable
+from app.config import settings
+from app.services.answer_assembler import SENTENCE_PATTERN, STOP_WORDS
+from app.services.text_stream import iter_segments
+from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
+import numpy as np
+import heapq
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Streamed content is cut where SENTENCE_PATTERN ends a sentence
+SEGMENT_BOUNDARY = re.compile(r"[.!?]+|\n")
+
+
+class TextRankSummarizer:
+    """
+    Extractive summarization with TextRank.
+
+    Sentences are embedded as L2-normalized TF-IDF rows, so a row-wise product
+    is their cosine similarity. The similarity graph only links sentences at
+    most `window` positions apart: each offset is one vectorized pass over the
+    sparse matrix, keeping the graph (and the whole run) linear in the number
+    of sentences on long transcripts. Sentences are ranked by power iteration
+    on the damped, row-normalized graph.
+    """
+
+    def __init__(
+        self,
+        window: int = 40,
+        damping: float = 0.85,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        min_sentence_chars: int = 20
+    ):
+        self.window = window
+        self.damping = damping
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.min_sentence_chars = min_sentence_chars
+
+    def split_sentences(self, text: str) -> List[str]:
+        sentences = (m.group(0).strip() for m in SENTENCE_PATTERN.finditer(text))
+        return [s for s in sentences if len(s) >= self.min_sentence_chars]
+
+    def similarity_graph(self, matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Symmetric sentence graph, weighted by cosine, within the window"""
+        n = matrix.shape[0]
+        rows, cols, weights = [], [], []
+        for offset in range(1, min(self.window, n - 1) + 1):
+            # Similarity of every sentence i with sentence i + offset
+            sims = np.asarray(matrix[:-offset].multiply(matrix[offset:]).sum(axis=1)).ravel()
+            linked = np.flatnonzero(sims > 0)
+            rows.append(linked)
+            cols.append(linked + offset)
+            weights.append(sims[linked])
+
+        if not rows:
+            return sparse.csr_matrix((n, n))
+        rows, cols, weights = np.concatenate(rows), np.concatenate(cols), np.concatenate(weights)
+        return sparse.csr_matrix(
+            (np.concatenate([weights, weights]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+            shape=(n, n)
+        )
+
+    def rank(self, graph: sparse.csr_matrix) -> Tuple[np.ndarray, int]:
+        """TextRank scores of the graph's nodes, and the number of iterations"""
+        n = graph.shape[0]
+        out_weight = np.asarray(graph.sum(axis=1)).ravel()
+        dangling = out_weight == 0
+        # Column-stochastic transition matrix: scores flow along normalized edges
+        inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+        transition = (sparse.diags(inverse) @ graph).T.tocsr()
+
+        scores = np.full(n, 1.0 / n)
+        iterations = 0
+        while iterations < self.max_iterations:
+            iterations += 1
+            # Isolated sentences spread their score uniformly
+            spread = scores[dangling].sum() / n
+            updated = (1 - self.damping) / n + self.damping * (transition @ scores + spread)
+            delta = np.abs(updated - scores).sum()
+            scores = updated
+            if delta < self.tolerance:
+                break
+        return scores, iterations
+
+    def score_sentences(self, sentences: List[str]) -> Tuple[np.ndarray, Dict[str, int]]:
+        """TextRank scores of the sentences, and graph statistics"""
+        if len(sentences) <= 1:
+            return np.ones(len(sentences)), {"edges": 0, "iterations": 0}
+        try:
+            matrix = TfidfVectorizer(stop_words=STOP_WORDS, sublinear_tf=True).fit_transform(sentences)
+        except ValueError:
+            # Only stop words: every sentence ranks the same
+            matrix = sparse.csr_matrix((len(sentences), 1))
+        graph = self.similarity_graph(matrix.tocsr())
+        scores, iterations = self.rank(graph)
+        return scores, {"edges": graph.nnz // 2, "iterations": iterations}
+
+    def compose(self, ranked: List[Tuple[int, str]], max_length: int, num_key_points: int) -> Dict[str, Any]:
+        """
+        Summary and key points from (position, sentence) pairs in rank order.
+        The summary holds the best ranked sentences that fit in `max_length`, in
+        reading order, truncating the best one if none does.
+        """
+        selected, length = [], 0
+        for position, sentence in ranked:
+            added = len(sentence) + (1 if selected else 0)
+            if length + added > max_length:
+                continue
+            selected.append((position, sentence))
+            length += added
+            if max_length - length <= self.min_sentence_chars:
+                break
+        if not selected and ranked:
+            selected = ranked[:1]
+        summary = " ".join(sentence for _, sentence in sorted(selected))
+        return {
+            "summary": summary[:max_length],
+            "keyPoints": [sentence for _, sentence in ranked[:num_key_points]]
+        }
+
+    def summarize(self, content: str, max_length: int = 200, num_key_points: int = 3) -> Dict[str, Any]:
+        """
+        Summary of at most `max_length` characters made of the best ranked
+        sentences in reading order, and the `num_key_points` best sentences.
+        """
+        started = time.perf_counter()
+        sentences = self.split_sentences(content)
+        scores, stats = self.score_sentences(sentences)
+        # Stable on ties: earlier sentences first
+        order = np.argsort(-scores, kind="stable").tolist()
+        result = self.compose([(i, sentences[i]) for i in order], max_length, num_key_points)
+
+        stats = {"sentences": len(sentences), **stats}
+        return self._finish(result, stats, started)
+
+    def summarize_stream(
+        self,
+        texts: Iterable[str],
+        max_length: int = 200,
+        num_key_points: int = 3,
+        block_sentences: int = 2000,
+        max_candidates: int = 64
+    ) -> Dict[str, Any]:
+        """
+        Same as summarize, for content arriving as a stream of text chunks.
+
+        Sentences are ranked by blocks of `block_sentences` (much larger than the
+        graph window, so only links across block edges are lost). Scores are
+        scaled by the block size (1 on average) and only the best
+        `max_candidates` sentences overall are kept: memory is bounded by one
+        block whatever the input size.
+        """
+        started = time.perf_counter()
+        candidates: List[Tuple[float, int, str]] = []  # Min-heap of (score, -position, sentence)
+        stats = {"sentences": 0, "blocks": 0, "edges": 0, "iterations": 0}
+        block: List[str] = []
+
+        def rank_block():
+            scores, block_stats = self.score_sentences(block)
+            offset = stats["sentences"]
+            for i in np.argsort(-scores, kind="stable")[:max_candidates].tolist():
+                candidate = (float(scores[i]) * len(block), -(offset + i), block[i])
+                if len(candidates) < max_candidates:
+                    heapq.heappush(candidates, candidate)
+                elif candidate > candidates[0]:
+                    heapq.heapreplace(candidates, candidate)
+                else:
+                    break
+            stats["sentences"] += len(block)
+            stats["blocks"] += 1
+            stats["edges"] += block_stats["edges"]
+            stats["iterations"] = max(stats["iterations"], block_stats["iterations"])
+            block.clear()
+
+        for segment in iter_segments(texts, SEGMENT_BOUNDARY):
+            sentence = segment.strip()
+            if len(sentence) < self.min_sentence_chars:
+                continue
+            block.append(sentence)
+            if len(block) == block_sentences:
+                rank_block()
+        if block:
+            rank_block()
+
+        ranked = [(-negative_position, sentence) for _, negative_position, sentence in sorted(candidates, reverse=True)]
+        result = self.compose(ranked, max_length, num_key_points)
+        return self._finish(result, stats, started)
+
+    def _finish(self, result: Dict[str, Any], stats: Dict[str, Any], started: float) -> Dict[str, Any]:
+        stats["processingTimeMs"] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(
+            f"Summarized {stats['sentences']} sentences ({stats['edges']} edges, "
+            f"{stats['iterations']} iterations) in {stats['processingTimeMs']} ms"
+        )
+        return {**result, "stats": stats}
+
+
+# Singleton instance
+summarizer = TextRankSummarizer(window=settings.summary_similarity_window)
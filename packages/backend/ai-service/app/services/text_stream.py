@@ -0,0 +1,47 @@
+from typing import Iterable, Iterator, Pattern
+import codecs
+
+# Longest text kept waiting for a sentence boundary; longer runs are cut
+MAX_SEGMENT_CHARS = 20_000
+
+
+def decode_chunks(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """Decode a byte stream incrementally (characters split across chunks included)"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_segments(
+    texts: Iterable[str],
+    boundary: Pattern,
+    max_segment_chars: int = MAX_SEGMENT_CHARS
+) -> Iterator[str]:
+    """
+    Split a text stream into segments, each ending with its boundary match.
+
+    Only the text after the last complete boundary is buffered. A boundary
+    touching the end of the buffer is held back, as the next chunk may extend
+    it ("." followed by ".."), so segments are the same as splitting the whole
+    text at once (except runs longer than `max_segment_chars`, which are cut).
+    """
+    pending = ""
+    for text in texts:
+        pending += text
+        start = 0
+        for match in boundary.finditer(pending):
+            if match.end() == len(pending):
+                break
+            yield pending[start:match.end()]
+            start = match.end()
+        pending = pending[start:]
+        while len(pending) > max_segment_chars:
+            yield pending[:max_segment_chars]
+            pending = pending[max_segment_chars:]
+    if pending:
+        yield pending
@@ -0,0 +1,151 @@
+from typing import Dict, Any, Optional, Callable
+from app.config import settings
+from app.services.vector_db_service import vector_db_service
+from sklearn.cluster import KMeans
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Marks courses with no embeddings, so they are not reloaded on every question
+_NO_CENTROIDS = np.empty((0, 0), dtype=np.float32)
+
+
+class TopicGate:
+    """
+    Embedding-centroid topic filter for course questions.
+
+    For each course, the normalized mean of its chunk embeddings plus a few
+    k-means cluster centroids are computed at ingest time (or on first use) and
+    cached. A question is on-topic when its best cosine similarity with those
+    centroids reaches the course threshold: a single small matrix-vector product.
+
+    Centroids are computed by a background thread, never on the request path or
+    in the ingestion listener: until a course's centroids are ready, the gate
+    cannot decide for it, and its previous centroids (if any) keep serving.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Optional[np.ndarray]],
+        default_threshold: float = 0.2,
+        num_clusters: int = 4,
+        course_thresholds: Optional[Dict[str, float]] = None
+    ):
+        self.loader = loader
+        self.default_threshold = default_threshold
+        self.num_clusters = num_clusters
+        self.course_thresholds: Dict[str, float] = dict(course_thresholds or {})
+        self._centroids: Dict[str, np.ndarray] = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="topic-gate")
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+    def compute_centroids(self, embeddings: np.ndarray) -> np.ndarray:
+        """Mean centroid plus up to `num_clusters` k-means centroids, all L2-normalized"""
+        embeddings = self._normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        centroids = [embeddings.mean(axis=0, keepdims=True)]
+
+        k = min(self.num_clusters, len(embeddings) // 4)
+        if k >= 2:
+            kmeans = KMeans(n_clusters=k, n_init=3, random_state=0).fit(embeddings)
+            centroids.append(kmeans.cluster_centers_)
+
+        return self._normalize_rows(np.vstack(centroids))
+
+    def refresh(self, course_id: str):
+        """Recompute a course's centroids from its current embeddings"""
+        embeddings = self.loader(course_id)
+        if embeddings is None or len(embeddings) == 0:
+            centroids = _NO_CENTROIDS
+        else:
+            centroids = self.compute_centroids(embeddings)
+
+        with self._lock:
+            self._centroids[course_id] = centroids
+        logger.info(f"Topic centroids for course {course_id}: {len(centroids)}")
+
+    def schedule_refresh(self, course_id: str):
+        """Recompute a course's centroids in the background (once, however many times it is asked)"""
+        with self._lock:
+            if course_id in self._pending:
+                return
+            self._pending.add(course_id)
+        self._executor.submit(self._background_refresh, course_id)
+
+    def _background_refresh(self, course_id: str):
+        # Changes arriving while this refresh runs schedule another one
+        with self._lock:
+            self._pending.discard(course_id)
+        try:
+            self.refresh(course_id)
+        except Exception as e:
+            logger.error(f"Failed to compute topic centroids for course {course_id}: {e}")
+
+    def invalidate(self, course_id: str):
+        with self._lock:
+            self._centroids.pop(course_id, None)
+
+    def on_course_changed(self, course_id: str):
+        """Recompute the centroids of a changed course if they were computed (or found empty); others wait for first use"""
+        with self._lock:
+            cached = course_id in self._centroids
+        if cached:
+            self.schedule_refresh(course_id)
+
+    def get_threshold(self, course_id: str) -> float:
+        return self.course_thresholds.get(course_id, self.default_threshold)
+
+    def set_threshold(self, course_id: str, threshold: float):
+        self.course_thresholds[course_id] = threshold
+
+    def score(self, course_id: str, embedding: np.ndarray) -> Optional[float]:
+        """Best cosine similarity between the question and the course centroids (None if unknown)"""
+        centroids = self._centroids.get(course_id)
+        if centroids is None:
+            self.schedule_refresh(course_id)
+            return None
+        if not len(centroids):
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        return float((centroids @ query).max() / norm)
+
+    def is_on_topic(self, course_id: str, embedding: np.ndarray) -> Optional[bool]:
+        """True/False when the course has centroids, None when it cannot decide"""
+        score = self.score(course_id, embedding)
+        if score is None:
+            return None
+        return score >= self.get_threshold(course_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "courses": len(self._centroids),
+                "pending": len(self._pending),
+                "defaultThreshold": self.default_threshold,
+                "courseThresholds": dict(self.course_thresholds)
+            }
+
+
+# Singleton instance
+topic_gate = TopicGate(
+    loader=vector_db_service.get_course_embeddings,
+    default_threshold=settings.topic_gate_threshold,
+    num_clusters=settings.topic_gate_clusters,
+    course_thresholds=settings.topic_gate_course_thresholds_map
+)
+
+# Centroids are recomputed whenever a course is (re-)ingested, deleted or changed by a snapshot swap
+vector_db_service.register_course_listener(topic_gate.on_course_changed)
@@ -1,7 +1,8 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 try:
     import chromadb
     from chromadb.config import Settings as ChromaSettings
+    from chromadb.utils import embedding_functions
     CHROMA_AVAILABLE = True
 except ImportError:
     CHROMA_AVAILABLE = False
@@ -9,21 +10,41 @@ except ImportError:
 
 from app.config import settings
 from app.services.backend_client import backend_client
+from app.services.vector_snapshot import (
+    VectorSnapshot, SnapshotError, write_snapshot, content_hash, records_fingerprint
+)
+import numpy as np
 import logging
 import os
 
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
 logger = logging.getLogger(__name__)
 
 class VectorDBService:
     """
     Vector database service using ChromaDB for RAG (Retrieval-Augmented Generation).
     Stores course content as embeddings for semantic search.
+    
+    Read-only instances (the workers of a multi-worker deployment) do not open
+    the persistent collection: they only embed queries and search the shared
+    snapshot, and ingestion goes through the launcher, the single writer.
     """
     
-    def __init__(self):
+    def __init__(self, read_only: bool = False):
+        self.read_only = read_only
         self.client = None
         self.collection = None
+        self.embedding_function = None
+        self.snapshot: Optional[VectorSnapshot] = None
+        self._course_listeners: List[Callable[[str], None]] = []
         self._initialize_db()
+
+        if settings.vector_snapshot_path:
+            try:
+                self.load_snapshot(settings.vector_snapshot_path)
+            except SnapshotError as e:
+                logger.error(f"Failed to load vector snapshot: {e}")
     
     def _initialize_db(self):
         """Initialize ChromaDB client and collection"""
@@ -32,6 +53,13 @@ class VectorDBService:
             return
 
         try:
+            # Same model Chroma uses by default, kept here to embed queries for snapshots
+            self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            
+            if self.read_only:
+                logger.info("Vector DB opened read-only: searches are served from the shared snapshot")
+                return
+            
             # Create data directory if it doesn't exist
             os.makedirs(settings.vector_db_path, exist_ok=True)
             
@@ -47,13 +75,15 @@ class VectorDBService:
             # Get or create collection
             try:
                 self.collection = self.client.get_collection(
-                    name=settings.vector_db_collection
+                    name=settings.vector_db_collection,
+                    embedding_function=self.embedding_function
                 )
                 logger.info(f"Loaded existing collection: {settings.vector_db_collection}")
             except:
                 self.collection = self.client.create_collection(
                     name=settings.vector_db_collection,
-                    metadata={"description": "HAR Academy course content"}
+                    metadata={"description": "HAR Academy course content"},
+                    embedding_function=self.embedding_function
                 )
                 logger.info(f"Created new collection: {settings.vector_db_collection}")
                 
@@ -66,7 +96,12 @@ class VectorDBService:
         """
         Ingest a course's content into the vector database.
         Fetches course data from backend and stores as embeddings.
+        Only documents whose content changed are embedded again, and documents
+        the course no longer has are removed. Returns False if nothing changed.
         """
+        if self.read_only:
+            logger.error(f"Cannot ingest course {course_id} in a read-only worker: courses are ingested by the launcher")
+            return False
         if not self.collection:
             logger.error("ChromaDB not initialized")
             return False
@@ -128,12 +163,35 @@ class VectorDBService:
             
             # Add to collection
             if documents:
-                self.collection.add(
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-                logger.info(f"Ingested {len(documents)} documents for course {course_id}")
+                for document, metadata in zip(documents, metadatas):
+                    metadata["content_hash"] = content_hash(document)
+                
+                existing = self.collection.get(where={"course_id": course_id}, include=["metadatas"])
+                existing_hashes = {
+                    record_id: (metadata or {}).get("content_hash")
+                    for record_id, metadata in zip(existing["ids"], existing["metadatas"])
+                }
+                changed = [i for i, record_id in enumerate(ids) if existing_hashes.get(record_id) != metadatas[i]["content_hash"]]
+                stale = sorted(set(existing_hashes) - set(ids))
+                if not changed and not stale:
+                    logger.debug(f"Course {course_id} is unchanged")
+                    return False
+                
+                if changed:
+                    self.collection.upsert(
+                        documents=[documents[i] for i in changed],
+                        metadatas=[metadatas[i] for i in changed],
+                        ids=[ids[i] for i in changed]
+                    )
+                if stale:
+                    self.collection.delete(ids=stale)
+                
+                # The live collection now owns this course
+                if self.snapshot:
+                    self.snapshot.exclude_course(course_id)
+                
+                logger.info(f"Ingested {len(changed)} documents for course {course_id} ({len(stale)} removed)")
+                self._notify_course_changed(course_id)
                 return True
             else:
                 logger.warning(f"No content found for course {course_id}")
@@ -143,11 +201,24 @@ class VectorDBService:
             logger.error(f"Error ingesting course {course_id}: {e}")
             return False
     
+    def register_course_listener(self, callback: Callable[[str], None]):
+        """Register a callback invoked with the course ID whenever a course is (re-)ingested or deleted, or changes with a new snapshot"""
+        self._course_listeners.append(callback)
+    
+    def _notify_course_changed(self, course_id: str):
+        for callback in self._course_listeners:
+            try:
+                callback(course_id)
+            except Exception as e:
+                logger.error(f"Course listener failed for {course_id}: {e}")
+    
     def search(
         self, 
         query: str, 
         course_id: Optional[str] = None,
-        top_k: int = 3
+        top_k: int = 3,
+        query_embedding: Optional[np.ndarray] = None,
+        include_embeddings: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Search for relevant content using semantic similarity.
@@ -156,26 +227,78 @@ class VectorDBService:
             query: Search query
             course_id: Optional course ID to filter results
             top_k: Number of results to return
+            query_embedding: Precomputed embedding of the query (skips re-embedding)
+            include_embeddings: Also return each document's embedding (as "embedding")
             
         Returns:
             List of relevant documents with metadata
         """
+        if self.snapshot and (course_id is None or self.snapshot.has_course(course_id)):
+            if query_embedding is None:
+                embedded = self.embed([query])
+                query_embedding = embedded[0] if embedded is not None else None
+            if query_embedding is not None:
+                results = self.snapshot.search(
+                    query_embedding,
+                    course_id=course_id,
+                    top_k=top_k,
+                    include_embeddings=include_embeddings
+                )
+                # Courses added or re-ingested since the snapshot are only in the live collection
+                live_courses = self.snapshot.excluded_courses if course_id is None else []
+                if live_courses and self.collection:
+                    where_filter = (
+                        {"course_id": live_courses[0]} if len(live_courses) == 1
+                        else {"course_id": {"$in": live_courses}}
+                    )
+                    results += self._query_collection(query, query_embedding, where_filter, top_k, include_embeddings)
+                    results.sort(key=lambda doc: doc["distance"])
+                    results = results[:top_k]
+                return results
+        
         if not self.collection:
-            logger.error("ChromaDB not initialized")
+            # Read-only workers only have the snapshot: courses missing from it have no content yet
+            if not self.read_only:
+                logger.error("ChromaDB not initialized")
             return []
         
+        return self._query_collection(
+            query,
+            query_embedding,
+            {"course_id": course_id} if course_id else None,
+            top_k,
+            include_embeddings
+        )
+    
+    def _query_collection(
+        self,
+        query: str,
+        query_embedding: Optional[np.ndarray],
+        where_filter: Optional[Dict[str, Any]],
+        top_k: int,
+        include_embeddings: bool
+    ) -> List[Dict[str, Any]]:
+        """Nearest documents in the live collection"""
         try:
-            # Build filter
-            where_filter = None
-            if course_id:
-                where_filter = {"course_id": course_id}
+            include = ["documents", "metadatas", "distances"]
+            if include_embeddings:
+                include.append("embeddings")
             
             # Query collection
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k,
-                where=where_filter
-            )
+            if query_embedding is not None:
+                results = self.collection.query(
+                    query_embeddings=[np.asarray(query_embedding, dtype=np.float32).tolist()],
+                    n_results=top_k,
+                    where=where_filter,
+                    include=include
+                )
+            else:
+                results = self.collection.query(
+                    query_texts=[query],
+                    n_results=top_k,
+                    where=where_filter,
+                    include=include
+                )
             
             # Format results
             documents = []
@@ -186,6 +309,8 @@ class VectorDBService:
                         "metadata": results["metadatas"][0][i] if results.get("metadatas") else {},
                         "distance": results["distances"][0][i] if results.get("distances") else 0
                     })
+                    if include_embeddings and results.get("embeddings"):
+                        documents[-1]["embedding"] = np.asarray(results["embeddings"][0][i], dtype=np.float32)
             
             return documents
             
@@ -195,6 +320,12 @@ class VectorDBService:
     
     def delete_course(self, course_id: str) -> bool:
         """Delete all content for a specific course"""
+        if self.read_only:
+            logger.error(f"Cannot delete course {course_id} in a read-only worker: courses are managed by the launcher")
+            return False
+        if self.snapshot:
+            self.snapshot.exclude_course(course_id)
+        
         if not self.collection:
             return False
         
@@ -207,6 +338,7 @@ class VectorDBService:
             if results and results.get("ids"):
                 self.collection.delete(ids=results["ids"])
                 logger.info(f"Deleted {len(results['ids'])} documents for course {course_id}")
+                self._notify_course_changed(course_id)
                 return True
             
             return False
@@ -215,21 +347,197 @@ class VectorDBService:
             logger.error(f"Error deleting course {course_id}: {e}")
             return False
     
+    def get_course_embeddings(self, course_id: str) -> Optional[np.ndarray]:
+        """All stored embeddings for a course (from the snapshot or the live collection)"""
+        if self.snapshot and self.snapshot.has_course(course_id):
+            return self.snapshot.get_course_embeddings(course_id)
+        
+        if not self.collection:
+            return None
+        
+        try:
+            results = self.collection.get(
+                where={"course_id": course_id},
+                include=["embeddings"]
+            )
+            if not results or not results.get("embeddings"):
+                return None
+            return np.asarray(results["embeddings"], dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error fetching embeddings for course {course_id}: {e}")
+            return None
+    
+    def get_course_documents(self, course_id: str) -> List[str]:
+        """All stored document texts for a course (from the snapshot or the live collection)"""
+        if self.snapshot and self.snapshot.has_course(course_id):
+            return self.snapshot.get_course_documents(course_id)
+        
+        if not self.collection:
+            return []
+        
+        try:
+            results = self.collection.get(
+                where={"course_id": course_id},
+                include=["documents"]
+            )
+            return list(results.get("documents") or []) if results else []
+        except Exception as e:
+            logger.error(f"Error fetching documents for course {course_id}: {e}")
+            return []
+    
+    def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embed texts with the collection's embedding model (None if unavailable)"""
+        if not self.embedding_function:
+            return None
+        
+        try:
+            return np.asarray(self.embedding_function(texts), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error embedding texts: {e}")
+            return None
+    
+    def fingerprint(self, batch_size: int = 5000) -> str:
+        """Fingerprint of the collection's records (IDs and content hashes), changed by any ingestion or deletion"""
+        if not self.collection:
+            raise SnapshotError("ChromaDB not initialized")
+        
+        records = []
+        total = self.collection.count()
+        for offset in range(0, total, batch_size):
+            batch = self.collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            records.extend(
+                (record_id, (metadata or {}).get("content_hash") or "")
+                for record_id, metadata in zip(batch["ids"], batch["metadatas"])
+            )
+        return records_fingerprint(records)
+    
+    def export_snapshot(self, path: str, batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        Export the collection (embeddings, documents, metadata and content hashes)
+        to a versioned snapshot directory.
+        """
+        if not self.collection:
+            raise SnapshotError("ChromaDB not initialized")
+        
+        ids, documents, metadatas, embeddings = [], [], [], []
+        total = self.collection.count()
+        for offset in range(0, total, batch_size):
+            batch = self.collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            ids.extend(batch["ids"])
+            documents.extend(batch["documents"])
+            metadatas.extend(batch["metadatas"])
+            embeddings.extend(batch["embeddings"])
+        
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            matrix = matrix.reshape(0, 0)
+        
+        return write_snapshot(
+            path,
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=matrix,
+            collection_name=settings.vector_db_collection,
+            embedding_model=DEFAULT_EMBEDDING_MODEL
+        )
+    
+    def load_snapshot(self, path: str, verify: bool = False) -> VectorSnapshot:
+        """
+        Memory-map a snapshot and serve searches from it.
+        Courses re-ingested afterwards are served from the live collection instead.
+        Course listeners are notified of the courses whose content differs
+        from the previous snapshot (added, edited or removed).
+        """
+        snapshot = VectorSnapshot.load(path, verify=verify)
+        
+        model = snapshot.manifest.get("embedding_model")
+        if model and model != DEFAULT_EMBEDDING_MODEL:
+            raise SnapshotError(
+                f"Snapshot was built with {model}, this service embeds queries with {DEFAULT_EMBEDDING_MODEL}"
+            )
+        
+        previous = self.snapshot.course_fingerprints if self.snapshot else {}
+        current = snapshot.course_fingerprints
+        self.snapshot = snapshot
+        
+        for course_id in sorted(set(previous) | set(current)):
+            if previous.get(course_id) != current.get(course_id):
+                self._notify_course_changed(course_id)
+        return snapshot
+    
+    def import_snapshot(self, path: str, verify: bool = True, batch_size: int = 512) -> int:
+        """
+        Copy a snapshot into the persistent collection using the stored embeddings.
+        Records whose content hash is unchanged are skipped.
+        """
+        if not self.collection:
+            raise SnapshotError("ChromaDB not initialized")
+        
+        snapshot = VectorSnapshot.load(path, verify=verify)
+        imported = 0
+        
+        for batch in snapshot.iter_batches(batch_size):
+            existing = self.collection.get(ids=batch["ids"], include=["metadatas"])
+            existing_hashes = {
+                record_id: (metadata or {}).get("content_hash")
+                for record_id, metadata in zip(existing["ids"], existing["metadatas"])
+            }
+            
+            keep = [
+                i for i, record_id in enumerate(batch["ids"])
+                if existing_hashes.get(record_id) != batch["metadatas"][i]["content_hash"]
+            ]
+            if not keep:
+                continue
+            
+            self.collection.upsert(
+                ids=[batch["ids"][i] for i in keep],
+                documents=[batch["documents"][i] for i in keep],
+                metadatas=[batch["metadatas"][i] for i in keep],
+                embeddings=[batch["embeddings"][i] for i in keep]
+            )
+            imported += len(keep)
+        
+        logger.info(f"Imported {imported} of {snapshot.count} snapshot records into {settings.vector_db_collection}")
+        return imported
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector database"""
+        if self.read_only:
+            return {
+                "collection_name": settings.vector_db_collection,
+                "status": "read-only",
+                "snapshot": {
+                    "path": self.snapshot.path,
+                    "document_count": self.snapshot.count,
+                    "created_at": self.snapshot.manifest.get("created_at")
+                } if self.snapshot else None
+            }
         if not self.collection:
             return {"error": "ChromaDB not initialized"}
         
         try:
             count = self.collection.count()
-            return {
+            stats = {
                 "collection_name": settings.vector_db_collection,
                 "document_count": count,
                 "status": "active"
             }
+            if self.snapshot:
+                stats["snapshot"] = {
+                    "path": self.snapshot.path,
+                    "document_count": self.snapshot.count,
+                    "created_at": self.snapshot.manifest.get("created_at")
+                }
+            return stats
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
             return {"error": str(e)}
 
 # Singleton instance
-vector_db_service = VectorDBService()
+vector_db_service = VectorDBService(read_only=settings.vector_db_read_only)
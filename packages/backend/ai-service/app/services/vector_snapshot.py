@@ -0,0 +1,336 @@
+"""
+Versioned snapshot format for the vector index.
+
+A snapshot is a directory containing:
+- manifest.json: format name, version, dimensions, record count and checksum
+- embeddings.npy: float32 matrix (count x dim), memory-mapped on load
+- sq_norms.npy: squared L2 norm of every embedding (avoids touching all pages on load)
+- records.jsonl: one line per row with id, document, metadata and content hash
+
+Usage:
+    python -m app.services.vector_snapshot export ./snapshots/latest
+    python -m app.services.vector_snapshot import ./snapshots/latest
+    python -m app.services.vector_snapshot info ./snapshots/latest
+"""
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Tuple
+from datetime import datetime
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "har-vector-snapshot"
+SNAPSHOT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+NORMS_FILE = "sq_norms.npy"
+RECORDS_FILE = "records.jsonl"
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupted or of an unsupported version"""
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of a document's text, used to skip unchanged records"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def records_fingerprint(records: Iterable[Tuple[str, str]]) -> str:
+    """Hash of (record ID, content hash) pairs, in any order: changes when a record is added, removed or edited"""
+    digest = hashlib.sha256()
+    for record_id, record_hash in sorted(records):
+        digest.update(f"{record_id}\0{record_hash}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_snapshot(
+    path: str,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    embeddings: np.ndarray,
+    collection_name: str = "",
+    embedding_model: str = ""
+) -> Dict[str, Any]:
+    """
+    Write a snapshot directory atomically.
+
+    Files are written to a temporary sibling directory which then replaces
+    `path`, so readers never observe a half-written snapshot.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(ids):
+        raise SnapshotError(
+            f"Embeddings shape {embeddings.shape} does not match {len(ids)} records"
+        )
+
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, EMBEDDINGS_FILE), embeddings)
+    np.save(
+        os.path.join(tmp_path, NORMS_FILE),
+        np.einsum("ij,ij->i", embeddings, embeddings).astype(np.float32)
+    )
+
+    with open(os.path.join(tmp_path, RECORDS_FILE), "w", encoding="utf-8") as f:
+        for record_id, document, metadata in zip(ids, documents, metadatas):
+            metadata = dict(metadata or {})
+            record = {
+                "id": record_id,
+                "document": document,
+                "metadata": metadata,
+                "hash": metadata.get("content_hash") or content_hash(document or "")
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "collection": collection_name,
+        "embedding_model": embedding_model,
+        "count": int(embeddings.shape[0]),
+        "dim": int(embeddings.shape[1]) if embeddings.shape[0] else 0,
+        "dtype": "float32",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "embeddings_sha256": _file_sha256(os.path.join(tmp_path, EMBEDDINGS_FILE))
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote vector snapshot with {manifest['count']} records to {path}")
+    return manifest
+
+
+class VectorSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot.
+    Serves brute-force nearest-neighbour queries without re-embedding documents.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        manifest: Dict[str, Any],
+        embeddings: np.ndarray,
+        sq_norms: np.ndarray,
+        records: List[Dict[str, Any]]
+    ):
+        self.path = path
+        self.manifest = manifest
+        self.embeddings = embeddings
+        self.sq_norms = sq_norms
+        self.records = records
+        self._excluded_courses = set()
+
+        rows_by_course: Dict[str, List[int]] = {}
+        for i, record in enumerate(records):
+            course_id = record["metadata"].get("course_id")
+            if course_id is not None:
+                rows_by_course.setdefault(str(course_id), []).append(i)
+        self._rows_by_course = {
+            course_id: np.asarray(rows, dtype=np.int64)
+            for course_id, rows in rows_by_course.items()
+        }
+        # Compared between snapshots to find the courses whose content changed
+        self.course_fingerprints: Dict[str, str] = {
+            course_id: records_fingerprint((records[row]["id"], records[row]["hash"]) for row in rows)
+            for course_id, rows in rows_by_course.items()
+        }
+
+    @classmethod
+    def load(cls, path: str, verify: bool = False) -> "VectorSnapshot":
+        """
+        Load a snapshot. Embeddings are memory-mapped, so only the pages touched
+        by queries are read from disk.
+        """
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise SnapshotError(f"No snapshot manifest found in {path}")
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"Unknown snapshot format: {manifest.get('format')}")
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(
+                f"Unsupported snapshot version {manifest.get('version')} "
+                f"(expected {SNAPSHOT_VERSION})"
+            )
+
+        embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+        if verify and _file_sha256(embeddings_path) != manifest.get("embeddings_sha256"):
+            raise SnapshotError(f"Embeddings checksum mismatch in {path}")
+
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        sq_norms = np.load(os.path.join(path, NORMS_FILE), mmap_mode="r")
+
+        records = []
+        with open(os.path.join(path, RECORDS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+
+        if len(records) != manifest.get("count") or embeddings.shape[0] != len(records):
+            raise SnapshotError(
+                f"Snapshot {path} is inconsistent: {len(records)} records, "
+                f"{embeddings.shape[0]} embeddings, manifest count {manifest.get('count')}"
+            )
+
+        logger.info(f"Loaded vector snapshot ({len(records)} records) from {path}")
+        return cls(path, manifest, embeddings, sq_norms, records)
+
+    @property
+    def count(self) -> int:
+        return len(self.records)
+
+    def has_course(self, course_id: str) -> bool:
+        return course_id in self._rows_by_course and course_id not in self._excluded_courses
+
+    def exclude_course(self, course_id: str):
+        """Stop serving a course, e.g. once it has been re-ingested into the live collection"""
+        self._excluded_courses.add(course_id)
+
+    @property
+    def excluded_courses(self) -> List[str]:
+        return sorted(self._excluded_courses)
+
+    def get_course_embeddings(self, course_id: str) -> Optional[np.ndarray]:
+        if not self.has_course(course_id):
+            return None
+        return np.asarray(self.embeddings[self._rows_by_course[course_id]])
+
+    def get_course_documents(self, course_id: str) -> List[str]:
+        if not self.has_course(course_id):
+            return []
+        return [self.records[row]["document"] for row in self._rows_by_course[course_id]]
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        course_id: Optional[str] = None,
+        top_k: int = 3,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the top_k nearest records using squared L2 distance,
+        matching the distances reported by the Chroma collection.
+        """
+        if course_id is not None:
+            if not self.has_course(course_id):
+                return []
+            rows = self._rows_by_course[course_id]
+        elif self._excluded_courses:
+            # Records without a course_id are never excluded
+            keep = np.ones(len(self.records), dtype=bool)
+            for excluded in self._excluded_courses:
+                if excluded in self._rows_by_course:
+                    keep[self._rows_by_course[excluded]] = False
+            rows = np.flatnonzero(keep)
+        else:
+            rows = None
+
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        if rows is None:
+            distances = self.sq_norms - 2.0 * (self.embeddings @ query) + query @ query
+        else:
+            if len(rows) == 0:
+                return []
+            distances = self.sq_norms[rows] - 2.0 * (self.embeddings[rows] @ query) + query @ query
+
+        k = min(top_k, len(distances))
+        if k == 0:
+            return []
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+
+        results = []
+        for i in best:
+            row = int(rows[i]) if rows is not None else int(i)
+            record = self.records[row]
+            results.append({
+                "content": record["document"],
+                "metadata": record["metadata"],
+                "distance": float(max(distances[i], 0.0))
+            })
+            if include_embeddings:
+                results[-1]["embedding"] = np.array(self.embeddings[row], dtype=np.float32)
+        return results
+
+    def iter_batches(self, batch_size: int = 512) -> Iterator[Dict[str, Any]]:
+        """Yield records in batches, ready to be upserted into a collection"""
+        for start in range(0, self.count, batch_size):
+            batch = self.records[start:start + batch_size]
+            yield {
+                "ids": [r["id"] for r in batch],
+                "documents": [r["document"] for r in batch],
+                "metadatas": [dict(r["metadata"], content_hash=r["hash"]) for r in batch],
+                "embeddings": np.asarray(self.embeddings[start:start + len(batch)]).tolist()
+            }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export or import vector index snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export the Chroma collection to a snapshot")
+    export_parser.add_argument("path")
+
+    import_parser = subparsers.add_parser("import", help="Import a snapshot into the Chroma collection")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--skip-verify", action="store_true", help="Skip the checksum verification")
+
+    info_parser = subparsers.add_parser("info", help="Print a snapshot manifest")
+    info_parser.add_argument("path")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        if args.command == "info":
+            snapshot = VectorSnapshot.load(args.path)
+            print(json.dumps(snapshot.manifest, indent=2))
+            return 0
+
+        from app.services.vector_db_service import vector_db_service
+
+        if args.command == "export":
+            manifest = vector_db_service.export_snapshot(args.path)
+            print(json.dumps(manifest, indent=2))
+            return 0
+
+        imported = vector_db_service.import_snapshot(args.path, verify=not args.skip_verify)
+        print(f"Imported {imported} records from {args.path}")
+        return 0
+
+    except SnapshotError as e:
+        logger.error(str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+from typing import Dict, Any, Optional, Callable, List
+from collections import OrderedDict
+from app.config import settings
+from app.services.course_vocabulary import CourseVocabulary, build_vocabulary
+from app.services.vector_db_service import vector_db_service
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VocabularyIndex:
+    """
+    Per-course vocabularies for quiz distractors.
+    Built from the course's stored documents by a background thread when a
+    course is (re-)ingested, or on first use by `get` (called from worker
+    threads, not the event loop). The number of courses held is LRU-bounded.
+    """
+
+    def __init__(self, loader: Callable[[str], List[str]], max_courses: int = 200):
+        self.loader = loader
+        self.max_courses = max_courses
+        self._vocabularies: "OrderedDict[str, Optional[CourseVocabulary]]" = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vocabulary-index")
+
+    def refresh(self, course_id: str):
+        """Rebuild a course's vocabulary from its current documents"""
+        vocabulary = build_vocabulary(self.loader(course_id))
+        with self._lock:
+            self._vocabularies[course_id] = vocabulary
+            self._vocabularies.move_to_end(course_id)
+            while len(self._vocabularies) > self.max_courses:
+                self._vocabularies.popitem(last=False)
+        logger.info(f"Vocabulary for course {course_id}: {len(vocabulary) if vocabulary else 0} terms")
+
+    def schedule_refresh(self, course_id: str):
+        """Rebuild a course's vocabulary in the background (once, however many times it is asked)"""
+        with self._lock:
+            if course_id in self._pending:
+                return
+            self._pending.add(course_id)
+        self._executor.submit(self._background_refresh, course_id)
+
+    def _background_refresh(self, course_id: str):
+        # Changes arriving while this refresh runs schedule another one
+        with self._lock:
+            self._pending.discard(course_id)
+        try:
+            self.refresh(course_id)
+        except Exception as e:
+            logger.error(f"Failed to build vocabulary for course {course_id}: {e}")
+
+    def on_course_changed(self, course_id: str):
+        """Rebuild the vocabulary of a changed course if it is held; others are built on first use"""
+        with self._lock:
+            cached = course_id in self._vocabularies
+        if cached:
+            self.schedule_refresh(course_id)
+
+    def get(self, course_id: str) -> Optional[CourseVocabulary]:
+        """The course vocabulary (None if the course has no indexed content)"""
+        with self._lock:
+            if course_id in self._vocabularies:
+                self._vocabularies.move_to_end(course_id)
+                return self._vocabularies[course_id]
+        self.refresh(course_id)
+        with self._lock:
+            return self._vocabularies.get(course_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "courses": len(self._vocabularies),
+                "terms": sum(len(v) for v in self._vocabularies.values() if v)
+            }
+
+
+# Singleton instance
+vocabulary_index = VocabularyIndex(
+    loader=vector_db_service.get_course_documents,
+    max_courses=settings.vocabulary_max_courses
+)
+
+# Vocabularies are rebuilt whenever a course is (re-)ingested, deleted or changed by a snapshot swap
+vector_db_service.register_course_listener(vocabulary_index.on_course_changed)
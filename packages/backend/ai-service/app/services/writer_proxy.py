@@ -0,0 +1,118 @@
+"""
+Forwarding of write-side requests from launcher workers to the single writer.
+
+Launcher workers (see app/launcher.py) only serve the read-mostly shared
+data: they do not start the services owning write-side state (learner events,
+engagement rollups, conversations, chatbot feedback, quiz banks). Requests
+served by that state are proxied to the single-process instance at
+`writer_url`, which owns it:
+- every path under one of `prefixes` (WriterForwardMiddleware)
+- chatbot requests carrying a conversation (checked by the chatbot routes)
+
+The writer sees the worker as its client: list the workers' address in the
+writer's RATE_LIMIT_TRUSTED_PROXIES so that it keys rate limits on the
+forwarded client instead.
+"""
+from typing import List, Optional
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from app.config import settings
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Paths served by write-side state (or reads of it), forwarded as a whole
+WRITER_PREFIXES = [
+    "/api/v1/analytics/",  # Learner events, and the rollups and predictions built from them
+    "/api/v1/chatbot/feedback",
+    "/api/v1/chatbot/history/",
+    "/api/v1/content/quiz-bank/"
+]
+
+# Connection-level headers, not forwarded in either direction
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "host", "content-length"
+}
+
+
+class WriterProxy:
+    """
+    Proxies requests to the writer instance at `base_url`. Responses are
+    streamed back as they arrive (server-sent events included). Inactive
+    (`enabled` False) outside launcher workers.
+    """
+
+    def __init__(self, base_url: str, enabled: bool, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.enabled = enabled
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.forwarded = 0
+        self.errors = 0
+
+    async def forward(self, request: Request) -> Response:
+        """The writer's response to the request (503 if no writer is configured, 502 if it is unreachable)"""
+        if not self.base_url:
+            return ORJSONResponse(
+                {"detail": "This worker serves reads only and no writer instance is configured (WRITER_URL)"},
+                status_code=503
+            )
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout, connect=5.0))
+
+        headers = [(k, v) for k, v in request.headers.items() if k not in HOP_BY_HOP_HEADERS and k != "x-forwarded-for"]
+        # The worker is one more proxy hop: append its client to X-Forwarded-For
+        hops = [request.headers.get("x-forwarded-for"), request.client.host if request.client else None]
+        forwarded_for = ", ".join(hop for hop in hops if hop)
+        if forwarded_for:
+            headers.append(("x-forwarded-for", forwarded_for))
+
+        url = self.base_url + request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        upstream = self._client.build_request(request.method, url, headers=headers, content=await request.body())
+        try:
+            response = await self._client.send(upstream, stream=True)
+        except httpx.HTTPError as e:
+            self.errors += 1
+            logger.error(f"Failed to forward {request.method} {request.url.path} to the writer: {e}")
+            return ORJSONResponse({"detail": "Writer instance unavailable"}, status_code=502)
+
+        self.forwarded += 1
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k not in HOP_BY_HOP_HEADERS - {"content-length"}},
+            background=BackgroundTask(response.aclose)
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class WriterForwardMiddleware:
+    """ASGI middleware forwarding the requests under `prefixes` to the writer"""
+
+    def __init__(self, app, proxy: WriterProxy, prefixes: Optional[List[str]] = None):
+        self.app = app
+        self.proxy = proxy
+        self.prefixes = tuple(prefixes if prefixes is not None else WRITER_PREFIXES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            return await self.app(scope, receive, send)
+        response = await self.proxy.forward(Request(scope, receive))
+        await response(scope, receive, send)
+
+
+# Singleton instance
+writer_proxy = WriterProxy(
+    base_url=settings.writer_url,
+    enabled=settings.read_only_worker,
+    timeout=settings.writer_timeout
+)
@@ -0,0 +1,144 @@
+"""
+Benchmark the quiz generator's sentence selection against the previous implementation.
+
+Generates synthetic course texts of the requested size in two styles: "terms"
+(dense in capitalized terms and numbers) and "prose" (few of them, so the
+selection pass cannot stop early). For each, checks that generate_quiz returns
+the same questions as the previous implementation (ignoring their random IDs)
+and reports the best time of the text processing of each.
+
+Usage (from packages/backend/ai-service):
+    python -m benchmarks.quiz_tokenizer --size-mb 1 --repeat 5
+"""
+from typing import List
+import argparse
+import random
+import re
+import time
+
+from app.models.schemas import DifficultyLevel
+from app.services.quiz_service import quiz_service
+
+TERMS_VOCABULARY = (
+    "Python liste dictionnaire Fonction variable 1991 Guido algorithme données apprentissage "
+    "Modèle réseau neurones 42 classe objet méthode héritage Paris API HTTP requête serveur "
+    "base de la les des un une est sont pour avec dans React composant état v2 3.14 JavaScript"
+).split()
+PROSE_VOCABULARY = (
+    "le la les un une des est sont pour avec dans données apprentissage modèle réseau fonction "
+    "variable méthode classe objet héritage serveur requête composant état algorithme mémoire"
+).split()
+PROSE_TERMS = ["Python", "React", "HTTP", "2024"]
+ENDINGS = [". ", "! ", "? ", "... ", ".\n", ".\n\n"]
+
+
+def make_sentence(rng: random.Random, style: str) -> str:
+    if style == "terms":
+        words = [rng.choice(TERMS_VOCABULARY) for _ in range(rng.randint(2, 35))]
+    else:
+        words = [rng.choice(PROSE_VOCABULARY) for _ in range(rng.randint(4, 30))]
+        if rng.random() < 0.3:
+            words[rng.randrange(len(words))] = rng.choice(PROSE_TERMS)
+        words[0] = words[0].capitalize()
+    return " ".join(words) + rng.choice(ENDINGS)
+
+
+def make_text(size_bytes: int, style: str, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < size_bytes:
+        sentence = make_sentence(rng, style)
+        parts.append(sentence)
+        size += len(sentence.encode("utf-8"))
+    return "".join(parts)
+
+
+# ---------- Previous implementation (reference output) ----------
+
+def reference_questions(content: str, num_questions: int) -> List[str]:
+    sentences = re.split(r'[.!?]+', content)
+    sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
+    num_questions = min(num_questions, len(sentences))
+
+    scored = []
+    for sentence in sentences:
+        score = 0
+        words = sentence.split()
+        if 10 <= len(words) <= 25:
+            score += 2
+        if re.search(r'\d+', sentence):
+            score += 1
+        score += min(sum(1 for w in words if w[0].isupper() and len(w) > 1), 3)
+        scored.append((sentence, score))
+    scored.sort(key=lambda x: x[1], reverse=True)
+
+    texts = []
+    for sentence in [s[0] for s in scored[:num_questions]]:
+        tokens = list(re.finditer(r"\S+", sentence))
+        words = [t.group() for t in tokens]
+        blank = -1
+        for i, word in enumerate(words):
+            if len(word) > 3 and word[0].isupper() and word.isalpha():
+                blank = i
+                break
+        if blank < 0:
+            for i, word in enumerate(words):
+                if re.search(r'\d', word):
+                    blank = i
+                    break
+        if blank < 0:
+            long_words = [i for i, w in enumerate(words) if len(w) > 6 and w.isalpha()]
+            blank = long_words[0] if long_words else len(words) // 2
+        # Only the chosen word is blanked (the previous implementation replaced every occurrence of it)
+        start, end = tokens[blank].span()
+        texts.append(f"{sentence[:start]}______{sentence[end:]}|{words[blank]}")
+    return texts
+
+
+def generated_questions(content: str, num_questions: int) -> List[str]:
+    questions = quiz_service.generate_quiz(content, num_questions, DifficultyLevel.MEDIUM, "fr")
+    return [f"{q.text}|{q.options[0].text}" for q in questions]
+
+
+def current_questions(content: str, num_questions: int) -> List[str]:
+    """Text processing of generate_quiz, without building the question models"""
+    texts = []
+    for sentence, words, spans in quiz_service._select_important_sentences(content, num_questions):
+        index = quiz_service._find_blank_index(words)
+        start, end = spans[index if index >= 0 else len(words) // 2]
+        texts.append(f"{sentence[:start]}______{sentence[end:]}|{sentence[start:end]}")
+    return texts
+
+
+def best_time(func, *args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=1.0)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for style in ("terms", "prose"):
+        text = make_text(int(args.size_mb * 1024 * 1024), style, args.seed)
+        expected = reference_questions(text, args.questions)
+        if generated_questions(text, args.questions) != expected or current_questions(text, args.questions) != expected:
+            raise SystemExit(f"Generated questions differ from the reference implementation ({style})")
+
+        reference = best_time(reference_questions, text, args.questions, repeat=args.repeat)
+        current = best_time(current_questions, text, args.questions, repeat=args.repeat)
+        print(f"{style}: {len(text.encode('utf-8')) / 1024 / 1024:.2f} MB, {args.questions} questions (identical output)")
+        print(f"  Reference: {reference * 1000:8.1f} ms")
+        print(f"  Current:   {current * 1000:8.1f} ms  ({reference / current:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark the overhead of the token-bucket rate limiting middleware.
+
+Measures the cost of a bucket update (one hot client, and requests spread over
+many clients) and the throughput of a minimal ASGI app called directly, with
+and without RateLimitMiddleware in front of it, so the numbers isolate the
+middleware from the server and the network.
+
+Usage (from packages/backend/ai-service):
+    python -m benchmarks.rate_limiter --requests 200000 --clients 10000
+"""
+import argparse
+import asyncio
+import time
+
+from app.config import settings
+from app.services.rate_limiter import RateLimitMiddleware, TokenBucketLimiter
+
+
+async def plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+def make_scopes(clients: int):
+    return [
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/api/v1/chatbot/ask",
+            "client": ("10.0.0.1", 50000),
+            "headers": [
+                (b"host", b"ai-service:8001"),
+                (b"content-type", b"application/json"),
+                (b"accept", b"*/*"),
+                (b"x-forwarded-for", f"192.168.{i // 256 % 256}.{i % 256}, 10.0.0.1".encode()),
+                (b"x-user-id", f"user-{i}".encode())
+            ]
+        }
+        for i in range(clients)
+    ]
+
+
+def bench_acquire(limiter: TokenBucketLimiter, keys, requests: int) -> float:
+    """Nanoseconds per bucket update"""
+    count = len(keys)
+    start = time.perf_counter()
+    for i in range(requests):
+        limiter.acquire(keys[i % count], 1.0)
+    return (time.perf_counter() - start) / requests * 1e9
+
+
+async def bench_app(app, scopes, requests: int) -> float:
+    """Requests per second through the ASGI app"""
+    count = len(scopes)
+    start = time.perf_counter()
+    for i in range(requests):
+        await app(scopes[i % count], receive, send)
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=10_000)
+    args = parser.parse_args()
+
+    # A capacity high enough that no request is rejected: rejections are cheaper and would flatter the numbers
+    unlimited = dict(capacity=args.requests * 10, window=60)
+
+    hot = bench_acquire(TokenBucketLimiter(**unlimited), [b"user:1"], args.requests)
+    spread = bench_acquire(TokenBucketLimiter(**unlimited), [f"user:{i}".encode() for i in range(args.clients)], args.requests)
+    print(f"Bucket update: {hot:6.0f} ns (1 client), {spread:6.0f} ns ({args.clients} clients)")
+
+    scopes = make_scopes(args.clients)
+    # Requests come from a trusted proxy, so client keys are read from the headers
+    middleware = RateLimitMiddleware(
+        plain_app, TokenBucketLimiter(**unlimited), settings.rate_limit_route_costs_map, trusted_proxies=["10.0.0.0/8"]
+    )
+    start = time.perf_counter()
+    for i in range(args.requests):
+        middleware.route_cost(scopes[i % len(scopes)]["path"])
+        middleware.client_key(scopes[i % len(scopes)])
+    lookup = (time.perf_counter() - start) / args.requests * 1e9
+    print(f"Route cost + client key: {lookup:6.0f} ns")
+
+    baseline = asyncio.run(bench_app(plain_app, scopes, args.requests))
+    limited = asyncio.run(bench_app(middleware, scopes, args.requests))
+    overhead_us = (1 / limited - 1 / baseline) * 1e6
+    print(f"ASGI app alone:      {baseline:10,.0f} req/s")
+    print(f"With rate limiting:  {limited:10,.0f} req/s  ({overhead_us:.2f} us/request)")
+
+
+if __name__ == "__main__":
+    main()
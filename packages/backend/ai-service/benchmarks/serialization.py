@@ -0,0 +1,117 @@
+"""
+Benchmark response serialization of the hot endpoints.
+
+For each endpoint, serializes a representative payload the way it was done
+before (Pydantic models, validated and dumped by FastAPI against the route's
+response model, then encoded by the default JSONResponse) and the way it is
+done now (plain dicts encoded by ORJSONResponse), checks that both produce the
+same JSON, and reports the time per response.
+
+Usage (from packages/backend/ai-service):
+    python -m benchmarks.serialization --repeat 2000
+"""
+from typing import Any, Callable, List, Tuple
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+
+from app.api import chatbot, content_generation, recommendations
+from app.models.schemas import ChatSource
+
+
+def route_field(router, path: str, method: str = "POST"):
+    for route in router.routes:
+        if route.path == path and method in route.methods:
+            return route.response_field
+    raise SystemExit(f"No {method} {path} route")
+
+
+def recommendation_payloads(count: int) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+    items = [(str(i), f"Course {i}", round(0.6 + i / 1000, 2), "Matches your interests: web, react") for i in range(count)]
+    models = lambda: [
+        recommendations.CourseRecommendation(courseId=c, title=t, score=s, reason=r) for c, t, s, r in items
+    ]
+    dicts = lambda: [{"courseId": c, "title": t, "score": s, "reason": r} for c, t, s, r in items]
+    return models, dicts
+
+
+def chatbot_payloads() -> Tuple[Callable[[], Any], Callable[[], Any]]:
+    answer = "To enroll in a course: 1) Browse the course catalog, 2) Click on a course you're interested in. " * 3
+    models = lambda: chatbot.ChatResponse(message=answer, sources=["Enrollment Guide"], confidence=0.92, messageId="m" * 32, conversationId="c" * 32)
+    dicts = lambda: {"message": answer, "sources": ["Enrollment Guide"], "confidence": 0.92, "messageId": "m" * 32, "conversationId": "c" * 32}
+    return models, dicts
+
+
+def source_payloads(count: int) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+    items = [(f"lesson-{i}", f"Lesson {i}", "Une fonction est un bloc de code réutilisable qui effectue une tâche. " * 2) for i in range(count)]
+    models = lambda: {"sources": [
+        ChatSource(lessonId=l, lessonTitle=t, excerpt=e).model_dump(by_alias=True) for l, t, e in items
+    ]}
+    dicts = lambda: {"sources": [{"lessonId": l, "lessonTitle": t, "excerpt": e} for l, t, e in items]}
+    return models, dicts
+
+
+def quiz_payloads(count: int) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+    items = [
+        (f"La ______ est un bloc de code réutilisable numéro {i}.", ["fonction", "variable", "classe", "boucle"], i % 4, "La fonction")
+        for i in range(count)
+    ]
+    models = lambda: [
+        content_generation.QuizQuestion(question=q, options=o, correctAnswer=a, explanation=e) for q, o, a, e in items
+    ]
+    dicts = lambda: [{"question": q, "options": o, "correctAnswer": a, "explanation": e} for q, o, a, e in items]
+    return models, dicts
+
+
+async def per_call_us(func: Callable[[], Any], repeat: int) -> float:
+    """Best average time of `await func()` (awaited in one loop, as FastAPI does)"""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1e6
+
+
+async def run(repeat: int):
+    cases: List[Tuple[str, Any, Tuple[Callable[[], Any], Callable[[], Any]]]] = [
+        ("POST /recommendations/personalized (5)", route_field(recommendations.router, "/personalized"), recommendation_payloads(5)),
+        ("GET /recommendations/trending (10)", route_field(recommendations.router, "/trending", "GET"), recommendation_payloads(10)),
+        ("POST /chatbot/ask", route_field(chatbot.router, "/ask"), chatbot_payloads()),
+        ("chatbot sources (5)", None, source_payloads(5)),
+        ("POST /content/quiz (20)", route_field(content_generation.router, "/quiz"), quiz_payloads(20))
+    ]
+
+    print(f"{'Endpoint':42} {'Before':>10} {'After':>10} {'Speedup':>8} {'Bytes':>7}")
+    for name, field, (models, dicts) in cases:
+        async def before():
+            content = models()
+            if field is not None:
+                content = await serialize_response(field=field, response_content=content)
+            return JSONResponse(content).body
+
+        async def after():
+            return ORJSONResponse(dicts()).body
+
+        if json.loads(await before()) != json.loads(await after()):
+            raise SystemExit(f"{name}: responses differ")
+        old = await per_call_us(before, repeat)
+        new = await per_call_us(after, repeat)
+        print(f"{name:42} {old:8.1f}us {new:8.1f}us {old / new:7.1f}x {len(await after()):7d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Tests of the completion features and predictions, over an in-memory event store"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.services.completion_model import FEATURE_NAMES, CompletionModel, CompletionPredictor, build_features
+from app.services.learning_events import LearningEventStore
+
+AS_OF = datetime(2024, 3, 10, 12, tzinfo=timezone.utc)
+
+
+def make_store(tmp_path) -> LearningEventStore:
+    store = LearningEventStore(str(tmp_path / "events"))
+    start = AS_OF - timedelta(days=3)
+    store.ingest([
+        {"type": "lesson_view", "userId": "u1", "courseId": "python", "lessonId": "l1", "timestamp": start},
+        {"type": "lesson_view", "userId": "u1", "courseId": "python", "lessonId": "l1", "timestamp": start, "completed": True},
+        {"type": "lesson_view", "userId": "u1", "courseId": "python", "lessonId": "l2", "timestamp": start + timedelta(days=1)},
+        {"type": "quiz_score", "userId": "u1", "courseId": "python", "lessonId": "l1", "score": 0.9, "timestamp": start},
+        {"type": "time_spent", "userId": "u1", "courseId": "python", "durationSeconds": 3600, "timestamp": start},
+        {"type": "quiz_score", "userId": "u1", "courseId": "python", "score": 0.5, "timestamp": start},
+        {"type": "lesson_view", "userId": "u1", "courseId": "python", "timestamp": start, "completed": True},
+        {"type": "lesson_view", "userId": "u2", "courseId": "python", "lessonId": "l1", "timestamp": AS_OF + timedelta(days=1)}
+    ])
+    return store
+
+
+def features_of(store: LearningEventStore, user_ids, as_of: datetime = AS_OF):
+    columns = store.get_events(course_id="python")
+    features = build_features(columns, store.user_codes(user_ids), int(as_of.timestamp() * 1000))
+    return [dict(zip(FEATURE_NAMES, row)) for row in features.matrix.tolist()], features.first_activity_ms
+
+
+def test_events_without_lesson_are_activity_not_lessons(tmp_path):
+    store = make_store(tmp_path)
+    (row,), first_activity = features_of(store, ["u1"])
+
+    assert row["lessons_viewed"] == np.log1p(2)
+    assert row["lessons_completed"] == np.log1p(1)
+    assert row["completion_ratio"] == 0.5
+    assert row["quizzes_taken"] == np.log1p(2)
+    assert row["average_score"] == pytest.approx(0.7)
+    assert row["time_spent_hours"] == np.log1p(1)
+    assert row["active_days"] == np.log1p(2)
+    assert first_activity[0] == int((AS_OF - timedelta(days=3)).timestamp() * 1000)
+
+    performance = store.get_performance(user_id="u1")
+    assert (performance["lessonsViewed"], performance["lessonsCompleted"]) == (2, 1)
+    assert performance["lessonScores"] == {"l1": 0.9}
+
+
+def test_learners_without_events_before_as_of(tmp_path):
+    store = make_store(tmp_path)
+    rows, first_activity = features_of(store, ["u2", "unknown"])
+
+    for row in rows:
+        assert row["lessons_viewed"] == 0
+        assert row["days_since_last_activity"] == 90.0
+    assert first_activity.tolist() == [-1, -1]
+
+
+def make_predictor(tmp_path) -> CompletionPredictor:
+    predictor = CompletionPredictor("", make_store(tmp_path))
+    n = len(FEATURE_NAMES)
+    coef = np.zeros(n)
+    coef[FEATURE_NAMES.index("lessons_completed")] = 2.0
+    predictor.model = CompletionModel(
+        feature_names=FEATURE_NAMES,
+        mean=np.full(n, 0.5),
+        scale=np.ones(n),
+        coef=coef,
+        intercept=0.0,
+        median_completion_days=30.0
+    )
+    return predictor
+
+
+def test_naive_as_of_is_utc(tmp_path):
+    predictor = make_predictor(tmp_path)
+    naive = predictor.predict_cohort({"python": None}, as_of=AS_OF.replace(tzinfo=None))
+    aware = predictor.predict_cohort({"python": None}, as_of=AS_OF)
+
+    assert naive == aware
+    # u2's only event is after as_of
+    assert [(p["userId"], p["atRisk"]) for p in naive] == [("u1", False)]
+    assert naive[0]["estimatedCompletionDate"] == AS_OF - timedelta(days=3) + timedelta(days=30)
+
+
+def test_predictions_are_ordered_by_risk(tmp_path):
+    predictor = make_predictor(tmp_path)
+    predictions = predictor.predict_cohort({"python": ["u1", "u2"]}, as_of=AS_OF)
+
+    assert [p["userId"] for p in predictions] == ["u2", "u1"]
+    assert predictions[0]["atRisk"]
+    assert predictions[0]["estimatedCompletionDate"] is None
+    assert predictions[0]["riskFactors"] == ["Few lessons completed"]
+
+
+def test_model_round_trip(tmp_path):
+    model = make_predictor(tmp_path).model
+    path = str(tmp_path / "model.npz")
+    model.save(path)
+
+    predictor = CompletionPredictor(path, LearningEventStore(str(tmp_path / "other")))
+    assert predictor.load()
+    assert np.array_equal(predictor.model.coef, model.coef)
+    assert predictor.model.median_completion_days == 30.0
@@ -0,0 +1,87 @@
+"""Tests of the conversation log: paging, compaction and reload"""
+from app.services.conversation_store import ConversationStore
+
+
+def make_store(tmp_path, **kwargs) -> ConversationStore:
+    store = ConversationStore(str(tmp_path / "conversations.log"), **kwargs)
+    store.start()
+    return store
+
+
+def contents(page):
+    return [turn["content"] for turn in page["turns"]]
+
+
+def test_turns_are_paged_newest_first_past_the_ring_buffer(tmp_path):
+    store = make_store(tmp_path, max_turns_in_memory=3)
+    for i in range(10):
+        store.append("c1", "u1", "user", f"turn {i}")
+
+    assert contents(store.get_turns("c1", limit=2)) == ["turn 9", "turn 8"]
+    # Older than the ring buffer: read from the log
+    page = store.get_turns("c1", limit=3, offset=6)
+    assert contents(page) == ["turn 3", "turn 2", "turn 1"]
+    assert page["totalCount"] == 10
+    assert [turn["content"] for turn in store.get_recent("c1")] == ["turn 7", "turn 8", "turn 9"]
+    store.close()
+
+
+def test_compaction_keeps_retained_turns_and_remaps_offsets(tmp_path):
+    store = make_store(tmp_path, max_turns_in_memory=2, retained_turns=4, compact_threshold_bytes=2048)
+    for i in range(40):
+        store.append("c1", "u1", "user", f"first {i}")
+        store.append("c2", "u2", "assistant", f"second {i}")
+    store.close()
+
+    assert store.compactions >= 1
+    store = make_store(tmp_path, max_turns_in_memory=2, retained_turns=4, compact_threshold_bytes=2048)
+    first = store.get_turns("c1", limit=50)
+    # Turns appended after the last compaction are carried over after the retained ones
+    assert first["totalCount"] < 40
+    assert contents(first) == [f"first {i}" for i in range(39, 39 - first["totalCount"], -1)]
+    assert contents(store.get_turns("c2", limit=2, offset=2)) == ["second 37", "second 36"]
+    store.close()
+
+
+def test_compaction_reads_back_turns_from_the_rewritten_log(tmp_path):
+    store = make_store(tmp_path, max_turns_in_memory=1, max_conversations=1, retained_turns=3, compact_threshold_bytes=1024)
+    for i in range(30):
+        store.append("c1", "u1", "user", f"turn {i}")
+    store._compactor.join()
+    # The buffer of c1 is dropped, so its turns come from the remapped offsets
+    store.append("c2", "u1", "user", "other")
+
+    page = store.get_turns("c1", limit=3)
+    assert contents(page) == ["turn 29", "turn 28", "turn 27"]
+    assert all(turn["conversationId"] == "c1" for turn in page["turns"])
+    store.close()
+
+
+def test_reload_rebuilds_conversations_and_sequence(tmp_path):
+    store = make_store(tmp_path)
+    store.append("c1", "u1", "user", "hello")
+    store.append("c1", "u1", "assistant", "hi")
+    store.append("c2", "u1", "user", "again")
+    store.close()
+    # An interrupted write leaves a partial last line
+    with open(tmp_path / "conversations.log", "ab") as f:
+        f.write(b'{"conversationId": "c1"')
+
+    store = make_store(tmp_path)
+    assert store.get_owner("c1") == "u1"
+    assert store.list_conversations("u1")["totalCount"] == 2
+    assert store.append("c1", "u1", "user", "next")["seq"] == 2
+    assert contents(store.get_turns("c1")) == ["next", "hi", "hello"]
+    store.close()
+
+
+def test_least_recently_updated_conversations_are_forgotten(tmp_path):
+    store = make_store(tmp_path, max_stored=2)
+    for conversation_id in ("c1", "c2", "c3"):
+        store.append(conversation_id, "u1", "user", "text")
+
+    assert store.get_owner("c1") is None
+    assert store.get_turns("c1")["totalCount"] == 0
+    assert store.list_conversations("u1")["totalCount"] == 2
+    assert store.forgotten == 1
+    store.close()
@@ -0,0 +1,140 @@
+"""Tests of the engagement rollups and of the engagement route, naive dates included"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import analytics
+from app.services.engagement_rollups import EngagementRollups
+from app.services.response_cache import ResponseCache
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc).replace(second=0, microsecond=0)
+
+
+def event(user_id: str, course_id: str, timestamp: datetime, duration: float = 60.0) -> dict:
+    return {"userId": user_id, "courseId": course_id, "timestamp": timestamp, "durationSeconds": duration}
+
+
+@pytest.fixture
+def rollups(monkeypatch) -> EngagementRollups:
+    rollups = EngagementRollups(session_gap=1800)
+    monkeypatch.setattr(analytics, "engagement_rollups", rollups)
+    monkeypatch.setattr(analytics, "response_cache", ResponseCache())
+    return rollups
+
+
+@pytest.fixture
+def client(rollups) -> TestClient:
+    app = FastAPI()
+    app.include_router(analytics.router, prefix="/api/v1/analytics")
+    return TestClient(app)
+
+
+def test_sessions_are_split_by_the_session_gap():
+    rollups = EngagementRollups(session_gap=1800)
+    start = now() - timedelta(hours=3)
+    rollups.record([
+        event("u1", "python", start),
+        event("u1", "python", start + timedelta(minutes=10)),
+        event("u1", "sql", start + timedelta(hours=1)),
+        event("u2", "python", start + timedelta(minutes=5))
+    ])
+
+    engagement = rollups.get_engagement(start - timedelta(minutes=1), now())
+    assert engagement["granularity"] == "minute"
+    assert (engagement["events"], engagement["sessions"], engagement["activeUsers"]) == (4, 3, 2)
+    assert engagement["averageSessionDuration"] == round(240 / 3 / 60, 2)
+    assert engagement["mostPopularCourses"][0] == "python"
+
+    # Events outside the window are not counted
+    later = rollups.get_engagement(start + timedelta(minutes=30), now())
+    assert later["events"] == 1
+
+
+def test_naive_timestamps_are_utc():
+    rollups = EngagementRollups()
+    aware = now() - timedelta(hours=2)
+    rollups.record([event("u1", "python", aware.replace(tzinfo=None))])
+
+    naive = rollups.get_engagement(aware.replace(tzinfo=None), (aware + timedelta(minutes=1)).replace(tzinfo=None))
+    assert naive == rollups.get_engagement(aware, aware + timedelta(minutes=1))
+    assert naive["events"] == 1
+    assert naive["peakUsageHours"] == [aware.hour]
+
+
+def test_future_and_expired_events_are_rejected():
+    rollups = EngagementRollups(max_future_skew=300)
+    rollups.record([
+        event("u1", "python", now() + timedelta(days=1)),
+        event("u1", "python", now() - timedelta(days=400)),
+        event("u1", "python", now() - timedelta(minutes=1))
+    ])
+
+    assert rollups.rejected == 2
+    assert rollups.get_engagement(now() - timedelta(days=1), now())["events"] == 1
+
+
+def test_long_windows_read_coarser_buckets():
+    rollups = EngagementRollups()
+    rollups.record([event("u1", "python", now() - timedelta(days=20))])
+
+    engagement = rollups.get_engagement(now() - timedelta(days=60), now())
+    assert engagement["granularity"] == "day"
+    assert engagement["events"] == 1
+
+
+def test_rollups_survive_a_restart(tmp_path):
+    path = str(tmp_path / "engagement.npz")
+    rollups = EngagementRollups(snapshot_path=path)
+    rollups.record([event("u1", "python", now() - timedelta(minutes=5))])
+    rollups.save()
+
+    reloaded = EngagementRollups(snapshot_path=path)
+    reloaded.load()
+    window = (now() - timedelta(hours=1), now())
+    assert reloaded.get_engagement(*window) == rollups.get_engagement(*window)
+    # The user's session goes on after the restart
+    reloaded.record([event("u1", "python", now() - timedelta(minutes=1))])
+    assert reloaded.get_engagement(*window)["sessions"] == 1
+
+
+def test_route_accepts_naive_dates_as_utc(client, rollups):
+    aware = now() - timedelta(hours=1)
+    rollups.record([event("u1", "python", aware)])
+    naive_params = {
+        "startDate": (aware - timedelta(minutes=5)).replace(tzinfo=None).isoformat(),
+        "endDate": (aware + timedelta(minutes=5)).replace(tzinfo=None).isoformat()
+    }
+    aware_params = {key: value + "Z" for key, value in naive_params.items()}
+
+    naive = client.get("/api/v1/analytics/engagement", params=naive_params)
+    assert naive.status_code == 200
+    assert naive.json()["events"] == 1
+    aware_response = client.get("/api/v1/analytics/engagement", params=aware_params)
+    assert aware_response.json() == naive.json()
+    assert aware_response.headers["etag"] == naive.headers["etag"]
+
+    mixed = client.get("/api/v1/analytics/engagement", params={**naive_params, "endDate": aware_params["endDate"]})
+    assert mixed.status_code == 200
+
+
+def test_route_rejects_inverted_windows(client):
+    response = client.get(
+        "/api/v1/analytics/engagement",
+        params={"startDate": "2024-03-02T00:00:00", "endDate": "2024-03-01T00:00:00+00:00"}
+    )
+    assert response.status_code == 422
+
+
+def test_route_etag_changes_with_recorded_events(client, rollups):
+    first = client.get("/api/v1/analytics/engagement")
+    assert first.status_code == 200
+    assert client.get("/api/v1/analytics/engagement", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    rollups.record([event("u1", "python", now() - timedelta(minutes=1))])
+    changed = client.get("/api/v1/analytics/engagement", headers={"If-None-Match": first.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.json()["events"] == 1
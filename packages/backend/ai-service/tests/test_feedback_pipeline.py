@@ -0,0 +1,99 @@
+"""Tests of the feedback pipeline: day partitioning, compaction and bounded aggregates"""
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app.services.feedback_pipeline import FeedbackPipeline
+
+
+def record(message_id: str, helpful: bool, created_at: datetime) -> dict:
+    return {"messageId": message_id, "userId": "u1", "helpful": helpful, "comment": None, "createdAt": created_at}
+
+
+def day_parts(store_path) -> dict:
+    return {
+        day: sorted(os.listdir(os.path.join(store_path, day)))
+        for day in sorted(os.listdir(store_path))
+    }
+
+
+def test_batch_spanning_midnight_is_split_by_created_at(tmp_path):
+    pipeline = FeedbackPipeline(str(tmp_path), compact_interval=0)
+    midnight = datetime(2024, 3, 2)
+    pipeline._flush([
+        record("a", True, midnight - timedelta(seconds=1)),
+        record("b", False, midnight),
+        record("a", False, midnight + timedelta(minutes=5))
+    ])
+
+    parts = day_parts(tmp_path)
+    assert list(parts) == ["day=2024-03-01", "day=2024-03-02"]
+    assert all(len(names) == 1 for names in parts.values())
+    later = pd.read_parquet(os.path.join(tmp_path, "day=2024-03-02", parts["day=2024-03-02"][0]))
+    assert sorted(later["messageId"]) == ["a", "b"]
+
+    assert pipeline.get_answer_stats("a") == {"messageId": "a", "helpfulCount": 1, "totalCount": 2, "helpfulRate": 0.5}
+    assert pipeline.get_metrics()["flushed"] == 3
+
+
+def test_compaction_merges_past_days_and_keeps_aggregates(tmp_path):
+    pipeline = FeedbackPipeline(str(tmp_path), compact_interval=0)
+    day = datetime(2024, 3, 1, 12)
+    pipeline._flush([record("a", True, day)])
+    pipeline._flush([record("a", True, day + timedelta(hours=1)), record("b", True, day)])
+    pipeline._flush([record("c", True, datetime.utcnow())])
+    pipeline.compact()
+
+    parts = day_parts(tmp_path)
+    assert parts["day=2024-03-01"] == ["feedback-2024-03-01-compacted.parquet"]
+    assert pipeline.get_metrics()["compactedParts"] == 2
+
+    reloaded = FeedbackPipeline(str(tmp_path), compact_interval=0)
+    reloaded._load_aggregates()
+    assert reloaded.get_answer_stats("a")["helpfulCount"] == 2
+    assert reloaded.get_answer_stats("c")["totalCount"] == 1
+
+
+def test_interrupted_day_swap_is_rolled_back(tmp_path):
+    pipeline = FeedbackPipeline(str(tmp_path), compact_interval=0)
+    pipeline._flush([record("a", True, datetime(2024, 3, 1))])
+    os.replace(tmp_path / "day=2024-03-01", tmp_path / "day=2024-03-01.old")
+    os.makedirs(tmp_path / "day=2024-03-01.compacting")
+
+    pipeline._recover_compactions()
+    assert list(day_parts(tmp_path)) == ["day=2024-03-01"]
+
+
+def test_aggregates_keep_the_most_recently_rated_answers(tmp_path):
+    pipeline = FeedbackPipeline(str(tmp_path), compact_interval=0, max_tracked_answers=2)
+    start = datetime(2024, 3, 1)
+    pipeline._flush([record("old", True, start), record("mid", True, start + timedelta(minutes=1))])
+    pipeline._flush([record("old", False, start + timedelta(minutes=2)), record("new", True, start + timedelta(minutes=3))])
+
+    assert pipeline.get_answer_stats("mid")["helpfulRate"] is None
+    assert pipeline.get_answer_stats("old")["totalCount"] == 2
+    assert pipeline.get_metrics()["answersEvicted"] == 1
+
+    # Reloading replays the answers in rating order, so the same ones are kept
+    reloaded = FeedbackPipeline(str(tmp_path), compact_interval=0, max_tracked_answers=2)
+    reloaded._load_aggregates()
+    assert set(reloaded._aggregates) == {"old", "new"}
+
+
+def test_full_queue_drops_feedback(tmp_path):
+    pipeline = FeedbackPipeline(str(tmp_path), max_queue_size=1)
+    assert pipeline.submit("a", "u1", True)
+    assert not pipeline.submit("b", "u1", True)
+    assert pipeline.get_metrics()["dropped"] == 1
+
+
+def test_submitted_feedback_is_flushed_on_stop(tmp_path):
+    pipeline = FeedbackPipeline(str(tmp_path), flush_interval=60, compact_interval=0)
+    pipeline.start()
+    pipeline.submit("a", "u1", True, "clear")
+    pipeline.stop()
+
+    assert pipeline.get_answer_stats("a")["helpfulCount"] == 1
+    today = f"day={datetime.utcnow().date().isoformat()}"
+    assert len(day_parts(tmp_path)[today]) == 1
@@ -0,0 +1,180 @@
+"""Offline tests of the LLM provider layer, with the local stand-in provider"""
+import asyncio
+import json
+
+import pytest
+
+from app.models.schemas import DifficultyLevel
+from app.services import quiz_service as quiz_module
+from app.services.llm_provider import LLMProvider, LLMService, LocalProvider
+
+SYSTEM = "Answer from the course content."
+CONTEXT = ["Python lists are mutable sequences.", "Tuples are immutable sequences."]
+
+
+def make_service(provider=None, **kwargs) -> LLMService:
+    kwargs.setdefault("batch_window_ms", 0)
+    return LLMService(provider=provider or LocalProvider(), **kwargs)
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+class FailingProvider(LocalProvider):
+    name = "failing"
+
+    async def stream(self, system, prefix, prompt, max_tokens):
+        yield "partial "
+        raise RuntimeError("provider down")
+
+
+def test_provider_base_is_abstract():
+    with pytest.raises(TypeError):
+        LLMProvider()
+
+    class CompleteOnly(LLMProvider):
+        async def complete(self, system, prefix, prompt, max_tokens):
+            return {"text": ""}
+
+    with pytest.raises(TypeError):
+        CompleteOnly()
+
+
+def test_local_provider_answers_from_context():
+    service = make_service()
+    result = asyncio.run(service.complete(SYSTEM, CONTEXT, "Are lists mutable?"))
+
+    assert result["text"].startswith("Python lists are mutable sequences.")
+    assert result["prompt_tokens"] > 0 and result["completion_tokens"] > 0
+    stats = service.get_stats()["providers"]["local"]
+    assert stats["requests"] == 1 and stats["errors"] == 0
+
+
+def test_prefix_cache_reuses_rendered_context():
+    service = make_service()
+    assert service.render_prefix(CONTEXT) is service.render_prefix(list(CONTEXT))
+    assert service.render_prefix(CONTEXT[:1]) != service.render_prefix(CONTEXT)
+
+    cache = service.get_stats()["prefixCache"]
+    assert (cache["size"], cache["hits"], cache["misses"]) == (2, 2, 2)
+
+
+def test_prefix_cache_is_bounded():
+    service = make_service(prefix_cache_size=2)
+    for i in range(5):
+        service.render_prefix([f"chunk {i}"])
+    assert service.get_stats()["prefixCache"]["size"] == 2
+
+
+def test_concurrent_requests_are_micro_batched():
+    seen_batches = []
+
+    class RecordingProvider(LocalProvider):
+        async def complete_batch(self, requests):
+            seen_batches.append(len(requests))
+            return await super().complete_batch(requests)
+
+    service = make_service(
+        RecordingProvider(responder=lambda system, prefix, prompt: f"answer to {prompt}"),
+        batch_window_ms=20,
+        max_batch_size=4
+    )
+
+    async def run():
+        return await asyncio.gather(*(service.complete(SYSTEM, CONTEXT, f"q{i}") for i in range(6)))
+
+    results = asyncio.run(run())
+
+    assert [r["text"] for r in results] == [f"answer to q{i}" for i in range(6)]
+    assert seen_batches == [4, 2]
+    stats = service.get_stats()["providers"]["local"]
+    assert (stats["batches"], stats["batchedRequests"], stats["requests"]) == (2, 6, 6)
+
+
+def test_provider_concurrency_is_limited():
+    active = 0
+    peak = 0
+
+    class SlowProvider(LocalProvider):
+        supports_batching = False
+
+        async def complete(self, system, prefix, prompt, max_tokens):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return await super().complete(system, prefix, prompt, max_tokens)
+
+    service = make_service(SlowProvider(), max_concurrency=8, provider_max_concurrency=2)
+
+    async def run():
+        await asyncio.gather(*(service.complete(SYSTEM, CONTEXT, f"q{i}") for i in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_stream_yields_the_completion():
+    service = make_service(LocalProvider(responder=lambda system, prefix, prompt: "one two three"))
+    chunks = asyncio.run(collect(service.stream(SYSTEM, CONTEXT, "count")))
+
+    assert "".join(chunks) == "one two three"
+    assert len(chunks) == 3
+    assert service.get_stats()["providers"]["local"]["requests"] == 1
+
+
+def test_failed_stream_counts_an_error_only():
+    service = make_service(FailingProvider())
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect(service.stream(SYSTEM, CONTEXT, "anything")))
+
+    stats = service.get_stats()["providers"]["failing"]
+    assert stats["errors"] == 1
+    assert stats["requests"] == 0 and stats["completionTokens"] == 0
+
+
+def test_quiz_generation_goes_through_the_provider(monkeypatch):
+    reply = json.dumps([{
+        "question": "Which sequences are mutable?",
+        "options": ["Tuples", "Lists", "Strings", "Ranges"],
+        "correct": 1,
+        "explanation": "Lists can be modified in place."
+    }])
+    service = make_service(LocalProvider(responder=lambda system, prefix, prompt: reply))
+    monkeypatch.setattr(quiz_module, "llm_service", service)
+
+    questions = asyncio.run(quiz_module.quiz_service.generate_quiz_with_llm(
+        " ".join(CONTEXT), num_questions=1, difficulty=DifficultyLevel.BEGINNER, language="en"
+    ))
+
+    assert len(questions) == 1
+    assert questions[0].text == "Which sequences are mutable?"
+    assert [o.text for o in questions[0].options if o.is_correct] == ["Lists"]
+    assert service.get_stats()["providers"]["local"]["requests"] == 1
+
+
+def test_quiz_route_uses_the_provider(monkeypatch):
+    from app.api import content_generation
+
+    reply = json.dumps([{
+        "question": "Which sequences are immutable?",
+        "options": ["Lists", "Dicts", "Tuples", "Sets"],
+        "correct": 2,
+        "explanation": ""
+    }])
+    service = make_service(LocalProvider(responder=lambda system, prefix, prompt: reply))
+    monkeypatch.setattr(quiz_module, "llm_service", service)
+    monkeypatch.setattr(content_generation, "llm_service", service)
+    monkeypatch.setattr(
+        content_generation, "load_course_content", lambda request: (" ".join(CONTEXT), None)
+    )
+
+    request = content_generation.QuizGenerationRequest(courseId="c1", topic="sequences", numQuestions=1)
+    questions = asyncio.run(content_generation.generate_course_quiz(request))
+
+    assert len(questions) == 1
+    question = questions[0]
+    assert question["options"][question["correctAnswer"]] == "Tuples"
+    assert sorted(question["options"]) == ["Dicts", "Lists", "Sets", "Tuples"]
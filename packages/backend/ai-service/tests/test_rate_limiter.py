@@ -0,0 +1,133 @@
+"""Tests of the token bucket limiter and of client identification behind trusted proxies"""
+import asyncio
+
+import pytest
+
+from app.services import rate_limiter as limiter_module
+from app.services.rate_limiter import RateLimitMiddleware, TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(limiter_module.time, "monotonic", clock)
+    return clock
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def make_middleware(**kwargs) -> RateLimitMiddleware:
+    kwargs.setdefault("trusted_proxies", ["10.0.0.0/8"])
+    return RateLimitMiddleware(ok_app, TokenBucketLimiter(10, 60), **kwargs)
+
+
+def scope(host, headers=None, path="/api/v1/chatbot/ask") -> dict:
+    return {
+        "type": "http",
+        "path": path,
+        "client": (host, 50000),
+        "headers": [(name.encode(), value.encode()) for name, value in (headers or {}).items()]
+    }
+
+
+def call(middleware, request_scope) -> list:
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(request_scope, None, send))
+    return sent
+
+
+def test_bucket_allows_capacity_then_reports_retry_after(clock):
+    limiter = TokenBucketLimiter(capacity=3, window=30)
+    assert [limiter.acquire(b"k") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire(b"k") == pytest.approx(10.0)
+    assert limiter.acquire(b"other") == 0.0
+
+    clock.now += 10
+    assert limiter.acquire(b"k") == 0.0
+    assert limiter.acquire(b"k") > 0
+    assert limiter.get_stats()["limited"] == 2
+
+
+def test_rejected_requests_consume_no_tokens(clock):
+    limiter = TokenBucketLimiter(capacity=10, window=10)
+    assert limiter.acquire(b"k", cost=8) == 0.0
+    assert limiter.acquire(b"k", cost=5) == pytest.approx(3.0)
+    assert limiter.acquire(b"k", cost=2) == 0.0
+
+
+def test_cost_above_capacity_needs_a_full_bucket(clock):
+    limiter = TokenBucketLimiter(capacity=5, window=5)
+    assert limiter.acquire(b"k", cost=20) == 0.0
+    assert limiter.acquire(b"k", cost=20) == pytest.approx(5.0)
+    clock.now += 5
+    assert limiter.acquire(b"k", cost=20) == 0.0
+
+
+def test_idle_buckets_are_swept(clock):
+    limiter = TokenBucketLimiter(capacity=5, window=5)
+    limiter.acquire(b"a")
+    limiter.acquire(b"b")
+    clock.now += 6
+    limiter.acquire(b"c")
+    assert limiter.get_stats()["buckets"] == 1
+    assert limiter.swept == 2
+
+
+def test_untrusted_peers_are_keyed_on_their_address():
+    middleware = make_middleware()
+    spoofed = scope("203.0.113.5", {"x-user-id": "admin", "x-forwarded-for": "1.2.3.4"})
+    assert middleware.client_key(spoofed) == b"ip:203.0.113.5"
+    assert make_middleware(trusted_proxies=[]).client_key(spoofed) == b"ip:203.0.113.5"
+
+
+def test_trusted_proxies_forward_the_client_identity():
+    middleware = make_middleware()
+    headers = {"x-forwarded-for": "1.2.3.4", "authorization": "Bearer t", "x-user-id": "u1"}
+    assert middleware.client_key(scope("10.1.2.3", headers)) == b"user:u1"
+    del headers["x-user-id"]
+    assert middleware.client_key(scope("10.1.2.3", headers)) == b"key:Bearer t"
+    del headers["authorization"]
+    assert middleware.client_key(scope("10.1.2.3", headers)) == b"ip:1.2.3.4"
+    assert middleware.client_key(scope("10.1.2.3")) == b"ip:10.1.2.3"
+
+
+def test_forwarded_client_is_the_rightmost_untrusted_hop():
+    middleware = make_middleware()
+    # The leftmost hops are set by the client and cannot be trusted
+    forwarded = {"x-forwarded-for": "6.6.6.6, 1.2.3.4, 10.0.0.7"}
+    assert middleware.client_key(scope("10.0.0.1", forwarded)) == b"ip:1.2.3.4"
+    assert middleware._forwarded_client(b"10.0.0.8, 10.0.0.7") == b"10.0.0.8"
+    assert middleware._forwarded_client(b"not-an-ip") == b"not-an-ip"
+
+
+def test_missing_client_host_is_keyed_as_unknown():
+    middleware = make_middleware()
+    assert middleware.client_key({"type": "http", "client": (None, 0), "headers": []}) == b"ip:unknown"
+    assert middleware.client_key({"type": "http", "client": None, "headers": []}) == b"ip:unknown"
+
+
+def test_middleware_rejects_with_retry_after_and_exempts_free_routes(clock):
+    middleware = make_middleware(route_costs={"/api/v1/chatbot/": 5, "/health": 0})
+    request = scope("203.0.113.5")
+    assert call(middleware, request)[0]["status"] == 200
+    assert call(middleware, request)[0]["status"] == 200
+
+    rejected = call(middleware, request)[0]
+    assert rejected["status"] == 429
+    assert dict(rejected["headers"])[b"retry-after"] == b"30"
+    assert all(call(middleware, scope("203.0.113.5", path="/health"))[0]["status"] == 200 for _ in range(20))
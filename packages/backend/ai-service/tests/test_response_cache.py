@@ -0,0 +1,92 @@
+"""Tests of HTTP response caching: ETags, 304 answers and data versions"""
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.services.response_cache import ResponseCache, etag_matches
+
+
+def make_client(cache: ResponseCache, data: dict) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/items")
+    async def items(request: Request):
+        def render():
+            data["renders"] += 1
+            return {"items": data["items"]}
+        return cache.respond(request, key="items", version=data["version"], render=render, max_age=60)
+
+    return TestClient(app)
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_etag_is_a_hash_of_the_body():
+    assert ResponseCache.etag(b"{}") == ResponseCache.etag(b"{}")
+    assert ResponseCache.etag(b"{}") != ResponseCache.etag(b"[]")
+
+
+def test_if_none_match_is_answered_not_modified_without_rendering():
+    cache = ResponseCache()
+    data = {"items": [1, 2], "version": 1, "renders": 0}
+    client = make_client(cache, data)
+
+    first = client.get("/items")
+    assert first.status_code == 200
+    assert first.json() == {"items": [1, 2]}
+    assert first.headers["cache-control"] == "public, max-age=60"
+    etag = first.headers["etag"]
+
+    second = client.get("/items", headers={"If-None-Match": f"W/{etag}"})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert data["renders"] == 1
+    assert cache.get_stats()["notModified"] == 1
+
+
+def test_new_version_renders_again_and_changes_the_etag():
+    cache = ResponseCache()
+    data = {"items": [1], "version": 1, "renders": 0}
+    client = make_client(cache, data)
+    etag = client.get("/items").headers["etag"]
+
+    data["items"], data["version"] = [1, 2], 2
+    changed = client.get("/items", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json() == {"items": [1, 2]}
+    assert changed.headers["etag"] != etag
+    assert data["renders"] == 2
+
+    # Unchanged content under a new version keeps its ETag
+    data["items"], data["version"] = [1], 3
+    assert client.get("/items", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_bodies_are_evicted_least_recently_used_first():
+    cache = ResponseCache(max_entries=1)
+    data = {"items": [], "version": 1, "renders": 0}
+    client = make_client(cache, data)
+    client.get("/items")
+    data["version"] = 2
+    client.get("/items")
+    data["version"] = 1
+    client.get("/items")
+
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 0, 3)
+
+
+def test_namespace_versions():
+    cache = ResponseCache()
+    assert cache.version("catalog") == 0
+    cache.bump("catalog")
+    cache.bump("catalog")
+    cache.set_version("shared", 7)
+    assert cache.get_stats()["versions"] == {"catalog": 2, "shared": 7}
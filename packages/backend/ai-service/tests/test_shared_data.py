@@ -0,0 +1,142 @@
+"""Tests of shared data versions: publishing only changes, and attaching snapshots in workers"""
+import os
+
+import numpy as np
+import pytest
+
+from app.services import shared_data as shared_data_module
+from app.services.response_cache import ResponseCache
+from app.services.shared_data import SharedData, build_version, read_current
+from app.services.vector_db_service import DEFAULT_EMBEDDING_MODEL, VectorDBService
+from app.services.vector_snapshot import write_snapshot
+
+
+def write_records(path: str, records: dict):
+    """Snapshot of {record ID: (course ID, document)}"""
+    ids = sorted(records)
+    write_snapshot(
+        path,
+        ids=ids,
+        documents=[records[i][1] for i in ids],
+        metadatas=[{"course_id": records[i][0]} for i in ids],
+        embeddings=np.eye(len(ids), 4, dtype=np.float32),
+        embedding_model=DEFAULT_EMBEDDING_MODEL
+    )
+
+
+class Collection:
+    """Vector service side of `build_version`: the fingerprint and export of a set of records"""
+
+    def __init__(self):
+        self.collection = object()
+        self.records = {}
+        self.exports = 0
+
+    def fingerprint(self) -> str:
+        return repr(sorted(self.records.items()))
+
+    def export_snapshot(self, path: str):
+        self.exports += 1
+        write_records(path, self.records)
+
+
+def publish(monkeypatch, root: str, collection: Collection, courses=None):
+    """Build a version as the launcher does, from the collection"""
+    with monkeypatch.context() as patch:
+        patch.setattr(shared_data_module, "vector_db_service", collection)
+        build_version(root, courses)
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Read-only vector service of a worker, recording the courses it is notified of"""
+    service = VectorDBService(read_only=True)
+    changed = []
+    service.register_course_listener(changed.append)
+    monkeypatch.setattr(shared_data_module, "vector_db_service", service)
+    monkeypatch.setattr(shared_data_module, "response_cache", ResponseCache())
+    return service, changed
+
+
+@pytest.fixture
+def collection() -> Collection:
+    collection = Collection()
+    collection.records = {"c1-0": ("c1", "Lists are mutable."), "c2-0": ("c2", "SELECT reads rows.")}
+    return collection
+
+
+@pytest.fixture
+def builder(monkeypatch, collection) -> Collection:
+    monkeypatch.setattr(shared_data_module, "vector_db_service", collection)
+    return collection
+
+
+def test_unchanged_data_is_not_published_again(tmp_path, builder):
+    collection = builder
+    first = build_version(str(tmp_path), None)
+    assert build_version(str(tmp_path), None) == first
+    assert collection.exports == 1
+
+    assert build_version(str(tmp_path), None, force=True)["version"] == first["version"] + 1
+    assert read_current(str(tmp_path)) == f"v{first['version'] + 1}"
+
+
+def test_catalog_change_links_unchanged_vectors(tmp_path, builder):
+    collection = builder
+    build_version(str(tmp_path), [{"id": "c1"}])
+    manifest = build_version(str(tmp_path), [{"id": "c1"}, {"id": "c2"}])
+
+    assert manifest["version"] == 2
+    assert collection.exports == 1
+    records = os.path.join("vectors", "records.jsonl")
+    assert os.path.samefile(tmp_path / "v1" / records, tmp_path / "v2" / records)
+
+    collection.records["c1-0"] = ("c1", "Lists are mutable sequences.")
+    assert build_version(str(tmp_path), [{"id": "c1"}, {"id": "c2"}])["version"] == 3
+    assert collection.exports == 2
+
+
+def test_attach_notifies_only_changed_courses(tmp_path, collection, worker, monkeypatch):
+    service, changed = worker
+    root = str(tmp_path)
+    shared = SharedData(root)
+    publish(monkeypatch, root, collection)
+    assert shared.refresh()
+    assert changed == ["c1", "c2"]
+    assert service.snapshot.count == 2
+
+    # Edited, added and removed courses are notified; unchanged ones are not
+    changed.clear()
+    collection.records = {
+        "c1-0": ("c1", "Lists are mutable sequences."),
+        "c2-0": ("c2", "SELECT reads rows."),
+        "c3-0": ("c3", "Arrays have a fixed size.")
+    }
+    publish(monkeypatch, root, collection)
+    assert shared.refresh()
+    assert changed == ["c1", "c3"]
+
+    changed.clear()
+    del collection.records["c3-0"]
+    publish(monkeypatch, root, collection)
+    shared.refresh()
+    assert changed == ["c3"]
+    assert not shared.refresh()
+    assert shared.get_stats()["swaps"] == 3
+
+
+def test_catalog_only_versions_notify_no_course(tmp_path, collection, worker, monkeypatch):
+    service, changed = worker
+    catalogs = []
+    monkeypatch.setattr(shared_data_module.learning_path_service, "use_catalog", lambda catalog, version: catalogs.append(version))
+    root = str(tmp_path)
+    shared = SharedData(root)
+    publish(monkeypatch, root, collection, [{"id": "c1"}])
+    shared.refresh()
+    changed.clear()
+
+    publish(monkeypatch, root, collection, [{"id": "c1"}, {"id": "c2"}])
+    assert shared.refresh()
+    assert changed == []
+    assert catalogs == [1, 2]
+    assert shared.get_stats()["courses"] == 2